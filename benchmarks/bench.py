@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY = os.path.join(ROOT, 'benchmarks', 'history.json')
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+# Registered parts (see pipeline.registry) that get benchmarked
+CASES = ['core', 'pressable-core', 'battery-holder', 'core-socket', 'thermal-cutoff-holder', 'wire-sizer', 'mvp']
+
+# Differences smaller than this are noise no matter what the percentage says
+MIN_SECONDS = 0.05
+MIN_RSS_MB = 20
+
+
+def run_case(name: str, repeat: int) -> dict:
+    # Runs inside a fresh child process so nothing is warm that shouldn't be and peak RSS is per part
+    from parts import cache
+    from pipeline.export import export
+    from pipeline.registry import PARTS
+
+    part = PARTS[name]
+    result = {}
+
+    os.environ['MCWEED_NO_CACHE'] = '1'
+    cold = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        built = part.build()
+        cold.append(time.perf_counter() - start)
+    result['cold_build'] = min(cold)
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        for fmt in ('stl', 'step'):
+            report = export(built, os.path.join(out_dir, f'{name}.{fmt}'))
+            result[f'export_{fmt}'] = report.tessellate_seconds + report.write_seconds
+
+    # warm means everything is already in the on disk cache, like a rerun after an unrelated edit
+    os.environ['MCWEED_NO_CACHE'] = '0'
+    part.build()
+    warm = []
+    for _ in range(repeat):
+        cache.clear_memory()
+        start = time.perf_counter()
+        part.build()
+        warm.append(time.perf_counter() - start)
+    result['warm_build'] = min(warm)
+
+    result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def run_all(names: list[str], repeat: int) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = {**os.environ, 'MCWEED_CACHE_DIR': cache_dir, 'PYTHONPATH': ROOT}
+        for name in names:
+            completed = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench', '--case', name, '--repeat', str(repeat)],
+                cwd=ROOT, env=env, capture_output=True, text=True)
+            if completed.returncode:
+                lines = completed.stderr.strip().splitlines()
+                results[name] = {'error': lines[-1] if lines else f'exit code {completed.returncode}'}
+            else:
+                results[name] = json.loads(completed.stdout.strip().splitlines()[-1])
+            print(f'{name:<24}{format_result(results[name])}', flush=True)
+    return results
+
+
+def format_result(result: dict) -> str:
+    if 'error' in result:
+        return f"failed: {result['error']}"
+    return (f"cold {result['cold_build']:7.3f}s  warm {result['warm_build']:6.3f}s  "
+            f"stl {result['export_stl']:6.3f}s  step {result['export_step']:6.3f}s  rss {result['peak_rss_mb']:6.0f}MB")
+
+
+def git_commit() -> str | None:
+    completed = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True)
+    return completed.stdout.strip() or None
+
+
+def regressions(results: dict, baseline: dict, threshold: float) -> list[str]:
+    found = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before or 'error' in before:
+            continue
+        if 'error' in result:
+            found.append(f"{name}: failed to build ({result['error']})")
+            continue
+        for metric, value in result.items():
+            if metric not in before:
+                continue
+            slack = MIN_RSS_MB if metric == 'peak_rss_mb' else MIN_SECONDS
+            if value > before[metric] * (1 + threshold) and value - before[metric] > slack:
+                # a zero baseline (something too fast to time) has no meaningful percentage
+                change = f'+{(value / before[metric] - 1) * 100:.0f}%' if before[metric] else 'was 0'
+                found.append(f'{name} {metric}: {before[metric]:.3f} -> {value:.3f} ({change})')
+    return found
+
+
+def load_json(path: str, default):
+    if not os.path.exists(path):
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        usage="Time cold/warm builds and exports of every part, keep a history and fail on regressions against "
+              "the stored baseline, e.g. python -m benchmarks.bench --save-baseline")
+    parser.add_argument('names', nargs='*', default=CASES, help='Parts to benchmark, defaults to all of them')
+    parser.add_argument('--repeat', type=int, default=1, help='Builds per measurement, the fastest one counts')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Fail when a measurement is this much slower than the baseline, 0.2 is 20%%')
+    parser.add_argument('--history', default=HISTORY, help='JSON file every run is appended to')
+    parser.add_argument('--baseline', default=BASELINE, help='JSON file with the results to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the new baseline')
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args.repeat)))
+        sys.exit()
+
+    results = run_all(args.names, args.repeat)
+    run = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.node(),
+        'results': results,
+    }
+    history = load_json(args.history, [])
+    history.append(run)
+    with open(args.history, 'w') as f:
+        json.dump(history, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f'Saved baseline to {args.baseline}')
+        sys.exit()
+
+    baseline = load_json(args.baseline, None)
+    if baseline is None:
+        print(f'No baseline at {args.baseline}, run with --save-baseline to make one')
+        sys.exit()
+    found = regressions(results, baseline['results'], args.threshold)
+    if found:
+        print(f"Regressions against {baseline['commit']} ({baseline['time']}):")
+        for line in found:
+            print(f'  {line}')
+        sys.exit(1)
+    print(f"No regressions against {baseline['commit']} ({baseline['time']})")
@@ -0,0 +1,79 @@
+import argparse
+import os
+import tempfile
+import time
+
+from cadquery import exporters
+
+from pipeline.export import export, tessellate, to_shape
+from pipeline.mesh import decimate, triangulated, write_ply, write_stl
+from pipeline.quality import QUALITIES
+from pipeline.registry import PARTS
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def compare(name: str, quality: str, budgets: list[int], out_dir: str) -> list[tuple[str, int, float, int]]:
+    # (how, triangles, seconds, bytes) for every way of getting the part into a mesh file. Every row includes
+    # tessellating, that's the same for all of them and most of the time
+    shape = to_shape(PARTS[name].build())
+    profile = QUALITIES[quality]
+    rows = []
+
+    path = os.path.join(out_dir, 'cadquery.stl')
+    seconds = timed(lambda: exporters.export(shape, path, tolerance=profile.linear_deflection,
+                                             angularTolerance=profile.angular_deflection))
+    rows.append(('cadquery exporters stl', None, seconds, os.path.getsize(path)))
+    path = os.path.join(out_dir, 'cadquery.3mf')
+    seconds = timed(lambda: exporters.export(shape, path, tolerance=profile.linear_deflection,
+                                             angularTolerance=profile.angular_deflection))
+    rows.append(('cadquery exporters 3mf', None, seconds, os.path.getsize(path)))
+
+    report = export(shape, os.path.join(out_dir, 'current.stl'), quality)
+    rows.append(('pipeline.export stl', report.triangles, report.tessellate_seconds + report.write_seconds,
+                 report.size))
+
+    start = time.perf_counter()
+    tessellate(shape, profile)
+    tessellate_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    full = triangulated(shape)
+    extract_seconds = time.perf_counter() - start
+    for fmt, write in (('stl', write_stl), ('ply', write_ply)):
+        path = os.path.join(out_dir, f'numpy.{fmt}')
+        seconds = timed(lambda: write(full, path))
+        rows.append((f'numpy {fmt}', len(full.triangles), tessellate_seconds + extract_seconds + seconds,
+                     os.path.getsize(path)))
+
+    for budget in budgets:
+        start = time.perf_counter()
+        small = decimate(full, budget)
+        decimate_seconds = time.perf_counter() - start
+        path = os.path.join(out_dir, f'decimated_{budget}.ply')
+        seconds = timed(lambda: write_ply(small, path))
+        rows.append((f'numpy ply <= {budget}', len(small.triangles),
+                     tessellate_seconds + extract_seconds + decimate_seconds + seconds, os.path.getsize(path)))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        usage="Compare export time and file size of cadquery's exporters, the current STL export and the numpy "
+              "STL/PLY writers with and without decimation, e.g. python -m benchmarks.mesh_export core --quality archival")
+    parser.add_argument('names', nargs='*', default=['core'], choices=PARTS, help='Registered parts to export')
+    parser.add_argument('--quality', default='print', choices=QUALITIES, help='Tessellation quality')
+    parser.add_argument('--budget', dest='budgets', type=int, action='append',
+                        help='Triangle budget to decimate to, can be repeated, defaults to 50000 and 10000')
+    args = parser.parse_args()
+
+    for name in args.names:
+        with tempfile.TemporaryDirectory() as out_dir:
+            rows = compare(name, args.quality, args.budgets or [50000, 10000], out_dir)
+        print(f'{name} [{args.quality}]')
+        print(f"  {'':<26}{'triangles':>10}{'seconds':>9}{'KiB':>8}")
+        for how, triangles, seconds, size in rows:
+            print(f"  {how:<26}{triangles if triangles is not None else '':>10}{seconds:>9.2f}{size / 1024:>8.0f}")
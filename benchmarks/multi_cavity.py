@@ -0,0 +1,40 @@
+import argparse
+import time
+
+from cadquery import Workplane
+
+from core_press.multi_cavity_mold import MultiCavityMold, multi_cavity_mold
+
+
+# The obvious way, kept around to compare against
+def loop_build(mold: MultiCavityMold) -> Workplane:
+    block = mold.block()
+    for cavity in mold.cavities():
+        block = block.cut(Workplane().add(cavity))
+    return block
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result.val().Volume()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        usage="Compare cutting mold cavities one at a time against a single boolean, "
+              "e.g. python -m benchmarks.multi_cavity 4 16 32 --layout ring")
+    parser.add_argument('counts', type=int, nargs='*', default=[4, 16, 32])
+    parser.add_argument('--layout', default='grid', choices=['grid', 'ring'])
+    args = parser.parse_args()
+
+    print(f"{'count':>6}{'loop s':>10}{'batched s':>11}{'speedup':>9}  volume match")
+    for count in args.counts:
+        mold = multi_cavity_mold(count, args.layout)
+        # the core itself is built once either way, keep it out of the timings
+        mold.core.build()
+        loop_time, loop_volume = timed(lambda: loop_build(mold))
+        batch_time, batch_volume = timed(mold.build)
+        match = abs(loop_volume - batch_volume) <= 1e-6 * max(abs(loop_volume), 1)
+        print(f"{count:>6}{loop_time:>10.3f}{batch_time:>11.3f}{loop_time / batch_time:>8.1f}x  "
+              f"{'yes' if match else f'NO ({loop_volume:.4f} vs {batch_volume:.4f})'}")
@@ -0,0 +1,74 @@
+import argparse
+import time
+
+from cadquery import Workplane
+
+from core_press.mcweed_pressable_core import McWeedPressableCoreAirway
+from parts.shapes.pattern import instances_touch, pattern_cut
+from parts.shared.mcweed_ceramic_filament_printable_core import McWeedBowl, McWeedCoreAirway
+
+
+# The old way, kept around to compare against
+def loop_cut(body: Workplane, tool: Workplane, count: int) -> Workplane:
+    for i in range(count):
+        body = body.cut(tool.rotate((0, 0, 0), (0, 0, 1), i * 360 / count))
+    return body
+
+
+def core_blank(bowl: McWeedBowl, airway_height: float) -> Workplane:
+    height = bowl.height + airway_height
+    return (
+        Workplane()
+        .cylinder(radius=bowl.outer_diameter / 2, height=height)
+        .cut(
+            Workplane()
+            .cylinder(height=bowl.height, radius=bowl.inner_diameter / 2)
+            .translate((0, 0, -(height - bowl.height) / 2))
+        )
+    )
+
+
+def socket_blank(inner_diameter: float, outer_diameter: float, height: float) -> Workplane:
+    return (
+        Workplane()
+        .cylinder(height=height, radius=outer_diameter / 2)
+        .faces('>Z')
+        .workplane()
+        .hole(diameter=inner_diameter, depth=height)
+    )
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result.val().Volume()
+
+
+def cases(count: int):
+    bowl = McWeedBowl(height=11, inner_diameter=15.5, outer_diameter=18)
+    helix = McWeedCoreAirway(inner_diameter=1.75, turns=0.33, height=19, count=count)
+    hole = McWeedPressableCoreAirway(inner_diameter=1.75, turns=0.33, height=19, count=count)
+    vent = (
+        Workplane()
+        .box(length=1.25 * 2.5, width=3.14159 * 18.25 / count / 2, height=31.25)
+        .translate((18.25 / 2, 0))
+    )
+    yield 'printable core airways', core_blank(bowl, helix.height), helix.airway_helix(bowl)
+    yield 'pressable core airways', core_blank(bowl, hole.height), hole.airway_hole(bowl)
+    yield 'core socket vents', socket_blank(18.25, 24, 31.25), vent
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(usage="Compare cutting airways/vents one at a time against a single batched cut")
+    parser.add_argument('counts', type=int, nargs='*', default=[8, 16, 32, 64])
+    args = parser.parse_args()
+
+    print(f"{'feature':<24}{'count':>6}{'overlap':>9}{'loop s':>10}{'batched s':>11}{'speedup':>9}  volume match")
+    for count in args.counts:
+        for name, body, tool in cases(count):
+            loop_time, loop_volume = timed(lambda: loop_cut(body, tool, count))
+            batch_time, batch_volume = timed(lambda: pattern_cut(body, tool, count))
+            match = abs(loop_volume - batch_volume) <= 1e-6 * max(abs(loop_volume), 1)
+            overlap = 'yes' if instances_touch(tool, count) else 'no'
+            print(f"{name:<24}{count:>6}{overlap:>9}{loop_time:>10.3f}{batch_time:>11.3f}{loop_time / batch_time:>8.1f}x  "
+                  f"{'yes' if match else f'NO ({loop_volume:.4f} vs {batch_volume:.4f})'}")
@@ -1,7 +1,11 @@
+import math
 from dataclasses import dataclass
 
 from cadquery import Workplane, Wire
 
+from parts.cache import cached
+from parts.shapes.instance import Instance
+from parts.shapes.pattern import pattern_cut
 from parts.shared.mcweed_ceramic_filament_printable_core import McWeedBowl
 from parts.shared.thermal_cutoff import ThermalCutoffSocket
 
@@ -18,14 +22,30 @@ class McWeedPressableCoreAirway:
     def angle(self):
         return 360 / self.count
 
+    def bowl_offset(self, bowl: McWeedBowl):
+        return self.offset(bowl.inner_diameter/2 - (bowl.outer_diameter-bowl.inner_diameter) - .35)
+
+    def profile(self, bowl: McWeedBowl):
+        # The airway's ellipse: how far out from the middle its outermost point is, and its semi axes across
+        # and along the core's circle
+        return self.bowl_offset(bowl) + 0.6, self.inner_diameter * 1.1, self.inner_diameter / 2
+
+    def z_range(self):
+        # where the airway starts and stops, in the core before it's flipped
+        return -self.height / 4, self.height * 3 / 4 + self.inner_diameter
+
+    def pitch(self):
+        # they're straight
+        return math.inf
+
     def airway_hole(self, bowl: McWeedBowl):
-        offset = self.offset(bowl.inner_diameter/2 - (bowl.outer_diameter-bowl.inner_diameter) - .35)
+        outer, x_radius, y_radius = self.profile(bowl)
         return (
             Workplane()
-            .center(offset + 0.6, 0)
-            .ellipseArc(x_radius=self.inner_diameter * 1.1, y_radius=self.inner_diameter / 2, makeWire=True)
+            .center(outer, 0)
+            .ellipseArc(x_radius=x_radius, y_radius=y_radius, makeWire=True)
             .extrude(self.height + self.inner_diameter)
-            .translate((0, 0, -self.height/4))
+            .translate((0, 0, self.z_range()[0]))
         )
 
 
@@ -35,10 +55,47 @@ class McWeedPressableCore:
     bowl: McWeedBowl
     airway: McWeedPressableCoreAirway
     wire_ring_depth: float
+    # where the thermal cutoff sits, x/y from the middle and z from the top of the airways (before the flip)
+    cutoff_offset: tuple[float, float, float] = (-0.5, 0, 3.25)
 
     def height(self):
         return self.bowl.height + self.airway.height
 
+    def airway_tool(self):
+        # One airway, before it's patterned around the core and before the flip
+        return self.airway.airway_hole(self.bowl)
+
+    def thermal_cutoff(self):
+        return ThermalCutoffSocket(height=self.airway.height, fuse_radius=2.5, wire_radius=0.6)
+
+    def cutoff_level(self):
+        # where the middle of the cutoff socket goes, before the flip
+        return (self.height() - self.airway.height) / 2 + self.cutoff_offset[2]
+
+    def cutoff_socket(self):
+        # The hole with a dome to stuff the thermal fuse in, placed in the core before it gets flipped
+        x, y, _ = self.cutoff_offset
+        return (
+            Instance(self.thermal_cutoff().build())
+            .rotateAboutCenter((0, 1, 0), 180)
+            .translate((x, y, self.cutoff_level()))
+            .workplane()
+        )
+
+    def wire_ring_radius(self):
+        return (self.airway.offset(self.bowl.inner_diameter) - (self.airway.inner_diameter * 2.75)) / 2
+
+    def wire_ring_levels(self):
+        # the middle of the bottom and bowl side countersinks, in the flipped core
+        return (-(self.airway.height / 2) + self.wire_ring_depth * 0.65,
+                (self.airway.height / 2) - self.wire_ring_depth * 0.25)
+
+    def wire_rings(self):
+        # Countersinks for the heater wire, bottom and bowl side, placed in the flipped core
+        ring = Instance(wire_ring(self))
+        return [ring.translate((0, 0, level)).workplane() for level in self.wire_ring_levels()]
+
+    @cached
     def build(self):
         # Make the main body and cut the bowl hole
         core = (
@@ -51,32 +108,19 @@ class McWeedPressableCore:
         )
 
         # Cut the airways
-        for i in range(self.airway.count):
-            core = core.cut(
-                self.airway.airway_hole(self.bowl)
-                .rotate((0, 0, 0), (0, 0, 1), i * self.airway.angle())
-            )
+        core = pattern_cut(core, self.airway_tool(), self.airway.count)
 
         # Cut the bottom hole with a dome to stuff the thermal fuse in
-        core = core.cut(
-            ThermalCutoffSocket(height=self.airway.height, fuse_radius=2.5, wire_radius=0.6).build()
-            .rotateAboutCenter((0, 1, 0), 180)
-            .translate((-0.5, 0, (self.height() - self.airway.height) / 2 + 3.25))
-        )
+        core = core.cut(self.cutoff_socket())
 
         # Flip it over and cut countersinks for the wires
-        return (
-            core.rotateAboutCenter((0, 1, 0), 180)
-            # bottom ring
-            .cut(wire_ring(self).translate((0, 0, -(self.airway.height / 2) + self.wire_ring_depth * 0.65)))
-            # bowl side ring
-            .cut(wire_ring(self).translate((0, 0, (self.airway.height / 2) - self.wire_ring_depth * 0.25)))
-        )
+        bottom_ring, bowl_ring = self.wire_rings()
+        return core.rotateAboutCenter((0, 1, 0), 180).cut(bottom_ring).cut(bowl_ring)
 
 
 # noinspection DuplicatedCode
 def wire_ring(core: McWeedPressableCore):
-    radius = (core.airway.offset(core.bowl.inner_diameter) - (core.airway.inner_diameter * 2.75)) / 2
+    radius = core.wire_ring_radius()
     return (
         Workplane()
         .cylinder(height=core.wire_ring_depth, radius=radius)
@@ -0,0 +1,133 @@
+import argparse
+import math
+import time
+from dataclasses import dataclass
+
+from cadquery import Assembly, Location, Shape, Vector, Workplane
+
+from core_press.mcweed_pressable_core import McWeedPressableCore
+from jigs.core_casting_tube import casting_tube
+from parts.shapes.instance import Instance
+
+
+@dataclass
+class MultiCavityMold:
+    # An N-up mold block for casting pressable cores, open at the top with every cavity's bowl end flush with it
+    core: McWeedPressableCore
+    count: int
+    # 'grid' or 'ring'
+    layout: str = 'grid'
+    # floor, outside walls and the least material between two cavities (or their casting tubes)
+    mold_thickness: float = 2.5
+
+    def height(self):
+        return self.core.height() + self.mold_thickness
+
+    def footprint(self):
+        # Every cavity gets a casting tube sitting over it, so whichever is wider sets the spacing
+        tube = casting_tube().val().BoundingBox()
+        return max(self.core.bowl.outer_diameter, tube.xlen, tube.ylen)
+
+    def pitch(self):
+        return self.footprint() + self.mold_thickness
+
+    def columns(self):
+        return math.ceil(math.sqrt(self.count))
+
+    def ring_radius(self):
+        # neighbours on the ring are a chord apart
+        return 0 if self.count < 2 else self.pitch() / 2 / math.sin(math.pi / self.count)
+
+    def positions(self) -> list[tuple[float, float]]:
+        if self.layout == 'ring':
+            radius, angle = self.ring_radius(), 2 * math.pi / self.count
+            return [(radius * math.cos(angle * i), radius * math.sin(angle * i)) for i in range(self.count)]
+        if self.layout != 'grid':
+            raise ValueError(f"layout is 'grid' or 'ring', not {self.layout!r}")
+        columns = self.columns()
+        rows = math.ceil(self.count / columns)
+        pitch = self.pitch()
+        return [
+            ((i % columns - (columns - 1) / 2) * pitch, (i // columns - (rows - 1) / 2) * pitch)
+            for i in range(self.count)
+        ]
+
+    def block(self) -> Workplane:
+        margin = self.footprint() + self.mold_thickness * 2
+        if self.layout == 'ring':
+            return (
+                Workplane()
+                .cylinder(radius=self.ring_radius() + margin / 2, height=self.height(), centered=(True, True, False))
+            )
+        columns = self.columns()
+        rows = math.ceil(self.count / columns)
+        pitch = self.pitch()
+        return Workplane().box((columns - 1) * pitch + margin, (rows - 1) * pitch + margin, self.height(),
+                               centered=(True, True, False))
+
+    def cavity(self) -> Shape:
+        # The core solid with its axis on the origin and its top at the top of the block
+        core = self.core.build().val()
+        bb = core.BoundingBox()
+        return Instance(core).translate((-bb.center.x, -bb.center.y, self.height() - bb.zmax)).val()
+
+    def cavities(self) -> list[Shape]:
+        # Instances only change the location, the core is built (or loaded from the cache) once however many
+        # cavities there are
+        cavity = Instance(self.cavity())
+        return [cavity.translate((x, y, 0)).val() for x, y in self.positions()]
+
+    def build(self):
+        # The cavities never touch, so all of them go into one boolean against the plain block. Cutting them
+        # one at a time means every cut works on a block with all the earlier cavities already in it.
+        return self.block().cut(Workplane().add(self.cavities()))
+
+    def tube_locations(self) -> list[Location]:
+        # One casting tube standing on the mold over every cavity
+        bb = casting_tube().val().BoundingBox()
+        return [Location(Vector(x - bb.center.x, y - bb.center.y, self.height() - bb.zmin)) for x, y in self.positions()]
+
+    def casting_tubes(self):
+        # all instances of the same tube
+        tube = Instance(casting_tube())
+        return Workplane().add([shape for location in self.tube_locations() for shape in tube.moved(location).vals()])
+
+    def tubes_assembly(self):
+        tube = casting_tube()
+        assembly = Assembly(name='casting-tubes')
+        for i, location in enumerate(self.tube_locations()):
+            assembly.add(tube, name=f'casting-tube_{i}', loc=location)
+        return assembly
+
+    def assembly(self):
+        return Assembly(name='mold').add(self.build(), name='mold').add(self.tubes_assembly())
+
+
+def multi_cavity_mold(count: int = 16, layout: str = 'grid') -> MultiCavityMold:
+    from core_press.single_manual_core_press import core, mold_thickness
+
+    return MultiCavityMold(core=core, count=count, layout=layout, mold_thickness=mold_thickness)
+
+
+if __name__ == "__main__":
+    from pipeline.assembly import ASSEMBLY_FORMATS, export_assembly
+    from pipeline.export import export
+
+    parser = argparse.ArgumentParser(
+        usage="Build an N-up pressable core mold and its casting tubes, "
+              "e.g. python -m core_press.multi_cavity_mold 32 --layout ring")
+    parser.add_argument('count', type=int, nargs='?', default=16, help='Number of cavities')
+    parser.add_argument('--layout', default='grid', choices=['grid', 'ring'], help='How the cavities are laid out')
+    parser.add_argument('--format', default='stl', choices=['stl', 'step', '3mf'], help='Output format')
+    args = parser.parse_args()
+
+    mold = multi_cavity_mold(args.count, args.layout)
+    start = time.perf_counter()
+    built = mold.build()
+    print(f'{args.count} cavities in {time.perf_counter() - start:.2f}s')
+    print(export(built, f'mold_{args.count}_{args.layout}.{args.format}'))
+    tubes = f'mold_{args.count}_{args.layout}_tubes.{args.format}'
+    if args.format in ASSEMBLY_FORMATS:
+        print(export_assembly(mold.tubes_assembly(), tubes))
+    else:
+        print(export(mold.casting_tubes(), tubes))
@@ -1,5 +1,4 @@
 from cadquery import Workplane
-from cadquery.vis import show_object
 
 from core_press.mcweed_pressable_core import McWeedPressableCore, McWeedPressableCoreAirway
 from parts.shared.mcweed_ceramic_filament_printable_core import McWeedBowl
@@ -12,22 +11,28 @@ core = McWeedPressableCore(
 
 mold_thickness = 2.5
 
-press_bottom = (
-    Workplane()
-    .add(
-        Workplane()
-        .cylinder(radius=core.bowl.outer_diameter / 2 + mold_thickness, height=core.height() + mold_thickness * 2)
-    )
-    .add(
-        core.build()
-        .translate((0, 0, -(mold_thickness**2)))
-    )
-    .cut(
+
+def press_bottom(core: McWeedPressableCore, mold_thickness: float):
+    return (
         Workplane()
-        .cylinder(radius=core.bowl.outer_diameter / 2, height=core.height()+mold_thickness*2)
-        .translate((0, 0, -0.390625 -mold_thickness - core.bowl.height - core.wire_ring_depth ))
+        .add(
+            Workplane()
+            .cylinder(radius=core.bowl.outer_diameter / 2 + mold_thickness, height=core.height() + mold_thickness * 2)
+        )
+        .add(
+            core.build()
+            .translate((0, 0, -(mold_thickness**2)))
+        )
+        .cut(
+            Workplane()
+            .cylinder(radius=core.bowl.outer_diameter / 2, height=core.height()+mold_thickness*2)
+            .translate((0, 0, -0.390625 -mold_thickness - core.bowl.height - core.wire_ring_depth ))
 
+        )
     )
-)
 
-show_object(press_bottom.wires())
+
+if __name__ == "__main__":
+    from cadquery.vis import show_object
+
+    show_object(press_bottom(core, mold_thickness).wires())
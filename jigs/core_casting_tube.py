@@ -1,5 +1,11 @@
 from cadquery import Workplane
 
 
-Workplane().cylinder(radius=14.5, height=30).faces(">Z").hole(diameter=25, depth=30, clean=True).export('tube.step')
+def casting_tube():
+    return Workplane().cylinder(radius=14.5, height=30).faces(">Z").hole(diameter=25, depth=30, clean=True)
 
+
+if __name__ == "__main__":
+    from pipeline.export import export
+
+    print(export(casting_tube(), 'tube.step'))
@@ -0,0 +1,188 @@
+import ast
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import sys
+from dataclasses import fields, is_dataclass
+from functools import lru_cache, wraps
+
+from cadquery import Compound, Plane, Shape, Vector, Workplane
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Set MCWEED_NO_CACHE=1 to always rebuild, MCWEED_CACHE_DIR to move the cache somewhere else
+CACHE_DIR = os.environ.get('MCWEED_CACHE_DIR', os.path.join(ROOT, '.build_cache'))
+
+# bump this if the on-disk format changes
+CACHE_VERSION = 1
+
+_memory: dict[str, tuple[Plane, list[Shape]]] = {}
+
+
+def cache_enabled() -> bool:
+    return os.environ.get('MCWEED_NO_CACHE', '') in ('', '0')
+
+
+def fingerprint(value) -> str:
+    # Stable text form of build inputs, floats use repr so 0.1 and 0.1000001 don't collide
+    if is_dataclass(value) and not isinstance(value, type):
+        cls = type(value)
+        # pick up class level parts like BatteryHolder.tab as well as the dataclass fields
+        names = sorted(
+            {f.name for f in fields(value)}
+            | {name for name in dir(cls) if not name.startswith('_') and not callable(getattr(cls, name))}
+        )
+        parts = ','.join(f'{name}={fingerprint(getattr(value, name))}' for name in names)
+        return f'{cls.__module__}.{cls.__qualname__}({parts})'
+    if isinstance(value, (list, tuple)):
+        return '[' + ','.join(fingerprint(v) for v in value) + ']'
+    if isinstance(value, dict):
+        return '{' + ','.join(f'{fingerprint(k)}:{fingerprint(value[k])}' for k in sorted(value, key=repr)) + '}'
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return repr(value)
+    raise TypeError(f"Can't fingerprint {type(value).__name__} for the build cache")
+
+
+def _local_module_file(name: str) -> str | None:
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or not spec.origin or not spec.origin.endswith('.py'):
+        return None
+    origin = os.path.abspath(spec.origin)
+    return origin if origin.startswith(ROOT + os.sep) else None
+
+
+@lru_cache(maxsize=None)
+def local_imports(path: str) -> tuple[str, ...]:
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    found = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            # `from parts.shapes import dome` may be importing a submodule
+            names = [node.module] + [f'{node.module}.{alias.name}' for alias in node.names]
+        else:
+            continue
+        for name in names:
+            module_file = _local_module_file(name)
+            if module_file:
+                found.add(module_file)
+    return tuple(sorted(found))
+
+
+@lru_cache(maxsize=None)
+def source_digest(path: str) -> str:
+    # Hash a module and everything it imports from this repo, so editing the code of a part
+    # (or anything it's built from) invalidates its cached solids
+    seen = set()
+    pending = [os.path.abspath(path)]
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        pending.extend(local_imports(current))
+    digest = hashlib.sha256()
+    for module_file in sorted(seen):
+        with open(module_file, 'rb') as f:
+            digest.update(os.path.relpath(module_file, ROOT).encode())
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def forget_sources():
+    # Call after editing code in a long running process, the digests above are only worked out once
+    local_imports.cache_clear()
+    source_digest.cache_clear()
+
+
+def cache_key(fn, *args, **kwargs) -> str:
+    bound = inspect.signature(fn).bind(*args, **kwargs)
+    bound.apply_defaults()
+    module_file = getattr(sys.modules.get(fn.__module__), '__file__', None)
+    digest = hashlib.sha256()
+    digest.update(f'v{CACHE_VERSION}\n{fn.__module__}.{fn.__qualname__}\n'.encode())
+    digest.update(fingerprint(dict(bound.arguments)).encode())
+    if module_file:
+        digest.update(source_digest(module_file).encode())
+    return digest.hexdigest()
+
+
+def _entry_paths(key: str) -> tuple[str, str]:
+    directory = os.path.join(CACHE_DIR, key[:2])
+    return os.path.join(directory, f'{key}.brep'), os.path.join(directory, f'{key}.json')
+
+
+def _plane_record(plane: Plane) -> dict:
+    return {'origin': plane.origin.toTuple(), 'xDir': plane.xDir.toTuple(), 'normal': plane.zDir.toTuple()}
+
+
+def _workplane(plane: Plane, shapes: list[Shape]) -> Workplane:
+    # always hand out a fresh Workplane, .add() mutates the stack in place
+    return Workplane(plane).add(list(shapes))
+
+
+def load(key: str) -> Workplane | None:
+    if key in _memory:
+        return _workplane(*_memory[key])
+    brep_path, meta_path = _entry_paths(key)
+    if not (os.path.exists(brep_path) and os.path.exists(meta_path)):
+        return None
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        compound = Shape.importBrep(brep_path)
+    except (OSError, ValueError):
+        return None
+    shapes = [Shape.cast(child.wrapped) for child in compound]
+    if len(shapes) != meta['count']:
+        return None
+    plane = Plane(Vector(meta['plane']['origin']), Vector(meta['plane']['xDir']), Vector(meta['plane']['normal']))
+    _memory[key] = (plane, shapes)
+    return _workplane(plane, shapes)
+
+
+def store(key: str, result: Workplane):
+    shapes = result.vals()
+    if not all(isinstance(s, Shape) for s in shapes):
+        return
+    _memory[key] = (result.plane, list(shapes))
+    brep_path, meta_path = _entry_paths(key)
+    os.makedirs(os.path.dirname(brep_path), exist_ok=True)
+    # write to temp files and swap them in so a killed build never leaves a half written entry
+    # wrap everything in a compound, even a single compound, so the stack comes back exactly as it was
+    tmp_suffix = f'.{os.getpid()}.tmp'
+    Compound.makeCompound(shapes).exportBrep(brep_path + tmp_suffix)
+    with open(meta_path + tmp_suffix, 'w') as f:
+        json.dump({'count': len(shapes), 'plane': _plane_record(result.plane)}, f)
+    os.replace(brep_path + tmp_suffix, brep_path)
+    os.replace(meta_path + tmp_suffix, meta_path)
+
+
+def cached(fn):
+    # Cache the Workplane returned by a build function/method on disk as BREP, keyed on
+    # the part's dataclass values, the call arguments and the source the part is built from
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not cache_enabled():
+            return fn(*args, **kwargs)
+        key = cache_key(fn, *args, **kwargs)
+        hit = load(key)
+        if hit is not None:
+            return hit
+        result = fn(*args, **kwargs)
+        store(key, result)
+        return result
+
+    wrapper.uncached = fn
+    return wrapper
+
+
+def clear_memory():
+    _memory.clear()
@@ -0,0 +1,181 @@
+import argparse
+import math
+import time
+from dataclasses import dataclass, field
+
+from cadquery import Plane, Shape, Workplane
+
+from wire_sizer.glyphs import make_text
+
+
+@dataclass
+class FitFeature:
+    # Something `size` mm across that goes into a hole `size + clearance` mm across.
+    # nominal is the clearance the real part uses right now.
+    name: str
+    size: float
+    nominal: float
+    # how far apart the coupon's clearances are by default
+    step: float
+    # 'bore' is a round hole through the plate, 'channel' a square tunnel like the wire sizer's
+    kind: str = 'bore'
+    # plate thickness for a bore, tunnel length for a channel
+    depth: float = 5
+
+    def default_clearances(self, steps: int = 10) -> list[float]:
+        start = max(0.0, self.nominal - self.step * (steps // 2))
+        return [round(start + self.step * i, 4) for i in range(steps)]
+
+
+def features() -> dict[str, FitFeature]:
+    # Straight from the parts so the nominal is always what's actually getting printed
+    from parts.mvp.mvp import core, socket
+    from parts.shared.battery_holder import battery_holder_21700
+    from wire_sizer.wire_sizer import WireSizer
+
+    battery = battery_holder_21700()
+    # the wire sizer's wiggle is a fraction of the wire diameter
+    wire = WireSizer(wire_length=200, wire_diameter=1)
+    return {
+        # CoreSocket.inner_diameter = core.bowl.outer_diameter + 0.25
+        'socket': FitFeature('socket', core.bowl.outer_diameter, socket.inner_diameter - core.bowl.outer_diameter,
+                             0.05, 'bore', 6),
+        # WireSizer's channel is wire_diameter * (1 + wiggle)
+        'wire': FitFeature('wire', wire.wire_diameter, wire.wire_diameter * wire.wiggle, 0.025, 'channel', 12),
+        # BatteryHolder.holder_id = battery_diameter + clearance
+        'battery': FitFeature('battery', battery.battery_diameter, battery.clearance, 0.1, 'bore', 6),
+    }
+
+
+def label(clearance: float) -> str:
+    # as short as it'll go, .25 instead of 0.25
+    text = f'{clearance:g}'
+    return text[1:] if text.startswith('0.') else text.replace('-0.', '-.')
+
+
+@dataclass
+class FitCoupon:
+    # One small plate with the feature at every clearance, each labeled with its clearance in mm.
+    # Channels come in two rows with the tunnels opening at the front and back edges.
+    feature: FitFeature
+    clearances: list[float] = field(default_factory=list)
+    wall: float = 1.6
+    fontsize: float = 3
+    text_depth: float = 0.4
+    font: str = 'mono'
+
+    def __post_init__(self):
+        self.clearances = self.clearances or self.feature.default_clearances()
+
+    def span(self):
+        # the widest hole on the plate
+        return self.feature.size + max(self.clearances)
+
+    def thickness(self):
+        if self.feature.kind == 'channel':
+            return self.span() + self.wall * 2
+        return self.feature.depth
+
+    def labels(self) -> list[Shape]:
+        return [make_text(label(c), self.fontsize, self.text_depth, self.font, 'bold') for c in self.clearances]
+
+    def hole_depth(self):
+        # how much of a cell, front to back, the hole (or tunnel and its blind end) takes up
+        if self.feature.kind == 'channel':
+            return self.feature.depth + self.wall
+        return self.span() + self.wall * 2
+
+    def cell(self, labels: list[Shape]) -> tuple[float, float]:
+        widest = max(text.BoundingBox().xlen for text in labels)
+        return max(self.span(), widest) + self.wall * 2, self.hole_depth() + self.fontsize + self.wall
+
+    def grid(self) -> tuple[int, int]:
+        if self.feature.kind == 'channel':
+            rows = min(2, len(self.clearances))
+        else:
+            rows = round(math.sqrt(len(self.clearances)))
+        return math.ceil(len(self.clearances) / rows), rows
+
+    def hole(self, clearance: float, x: float, y: float, outward: int) -> Workplane:
+        width = self.feature.size + clearance
+        if self.feature.kind == 'channel':
+            # runs from just past the plate edge to a wall at the blind end, centered in the plate's thickness
+            overshoot = 0.5
+            return (
+                Workplane()
+                .box(width, self.feature.depth + overshoot, width)
+                .translate((x, y + outward * (self.wall + overshoot) / 2, self.thickness() / 2))
+            )
+        if self.feature.kind != 'bore':
+            raise ValueError(f"fit features are a 'bore' or a 'channel', not {self.feature.kind!r}")
+        return (
+            Workplane()
+            .cylinder(height=self.thickness() + 2, radius=width / 2)
+            .translate((x, y, self.thickness() / 2))
+        )
+
+    def build(self) -> Workplane:
+        # The plate's made once and every hole and label goes in as a tool of a single cut. None of the tools
+        # overlap, so one boolean does the same as cutting them one at a time.
+        labels = self.labels()
+        width, depth = self.cell(labels)
+        columns, rows = self.grid()
+        thickness = self.thickness()
+        tools = []
+        for i, clearance in enumerate(self.clearances):
+            row = i // columns
+            x = (i % columns - (columns - 1) / 2) * width
+            y = (row - (rows - 1) / 2) * depth
+            # holes towards the plate's nearest front/back edge and labels towards the middle
+            outward = 1 if row >= rows / 2 else -1
+            hole_y = y + outward * (depth - self.hole_depth()) / 2
+            label_y = y - outward * (depth - self.fontsize - self.wall) / 2
+            tools.extend(self.hole(clearance, x, hole_y, outward).vals())
+            plane = Plane(origin=(x, label_y, thickness - self.text_depth))
+            tools.append(labels[i].transformShape(plane.rG))
+        return (
+            Workplane()
+            .box(width * columns, depth * rows, thickness, centered=(True, True, False))
+            .cut(Workplane().add(tools))
+        )
+
+
+def fit_coupon(feature: str, clearances: list[float] | None = None, steps: int = 10) -> FitCoupon:
+    fit = features()[feature]
+    return FitCoupon(fit, clearances or fit.default_clearances(steps))
+
+
+if __name__ == "__main__":
+    from pipeline.export import export
+    from pipeline.quality import QUALITIES
+
+    parser = argparse.ArgumentParser(
+        usage="Build one small plate testing a fit at a range of clearances, each labeled in mm, "
+              "e.g. python -m parts.misc.fit_coupon socket --start 0.1 --step 0.05 --steps 20")
+    parser.add_argument('feature', choices=['socket', 'wire', 'battery'], help='Which fit to test')
+    parser.add_argument('--clearances', type=float, nargs='+', help='Exact clearances to test (mm)')
+    parser.add_argument('--start', type=float, help='First clearance (mm), defaults to steps centered on the nominal')
+    parser.add_argument('--step', type=float, help="Clearance added per hole (mm), defaults to the feature's")
+    parser.add_argument('--steps', type=int, default=10, help='Number of holes')
+    parser.add_argument('--format', default='stl', choices=['stl', 'step', '3mf'], help='Output format')
+    parser.add_argument('--quality', default='print', choices=QUALITIES, help='Tessellation quality')
+    args = parser.parse_args()
+
+    fit = features()[args.feature]
+    clearances = args.clearances
+    if clearances is None and (args.start is not None or args.step is not None):
+        step = fit.step if args.step is None else args.step
+        start = fit.default_clearances(args.steps)[0] if args.start is None else args.start
+        clearances = [round(start + step * i, 4) for i in range(args.steps)]
+    coupon = fit_coupon(args.feature, clearances, args.steps)
+
+    start = time.perf_counter()
+    built = coupon.build()
+    box = built.val().BoundingBox()
+    print(f'{args.feature} coupon, {len(coupon.clearances)} clearances in {time.perf_counter() - start:.2f}s, '
+          f'{box.xlen:.1f} x {box.ylen:.1f} x {box.zlen:.1f}mm')
+    print(f'  {fit.size}mm {fit.kind}, currently {fit.nominal:g}mm of clearance')
+    for clearance in coupon.clearances:
+        print(f'  {label(clearance):>6}: {fit.size + clearance:g}mm')
+    print(export(built, f'{args.feature}_fit_coupon_{label(coupon.clearances[0])}-{label(coupon.clearances[-1])}'
+                        f'.{args.format}', args.quality))
@@ -1,10 +1,16 @@
 from cadquery import Workplane
 
-ring = (
-    Workplane()
-    .cylinder(height=45, radius=16.5)
-    .faces('>Z')
-    .hole(diameter=30, depth=45)
-)
-
-ring.export('single_core_mold_ring.stl')
\ No newline at end of file
+
+def mold_ring():
+    return (
+        Workplane()
+        .cylinder(height=45, radius=16.5)
+        .faces('>Z')
+        .hole(diameter=30, depth=45)
+    )
+
+
+if __name__ == "__main__":
+    from pipeline.export import export
+
+    print(export(mold_ring(), 'single_core_mold_ring.stl'))
@@ -1,7 +1,6 @@
 from dataclasses import dataclass
 
-from cadquery import Workplane
-from cadquery.vis import show_object
+from cadquery import Assembly, Location, Vector, Workplane
 
 from parts.mvp.mvp_housing import MVPHousing
 from parts.shapes.oring import Oring
@@ -23,6 +22,13 @@ class MVP:
             .add(self.core.build().translate((0, 50)))
         )
 
+    def assembly(self):
+        return (
+            Assembly(name='mvp')
+            .add(self.housing.assembly(self.wall_thickness))
+            .add(self.core.build(), name='core', loc=Location(Vector(0, 50, 0)))
+        )
+
 wall_thickness=1.25
 
 core = McWeedCeramicFilamentPrintableCore(
@@ -43,8 +49,13 @@ socket = CoreSocket(
 #     wall_thickness=1.25
 # )
 
-# mvp.housing.core_socket.build(mvp.wall_thickness).export('core_socket.stl')
-# show_object(mvp.build())
-socket = socket.build(1.25)
-socket.export('socket.stl')
-show_object(socket)
\ No newline at end of file
+if __name__ == "__main__":
+    from cadquery.vis import show_object
+
+    from pipeline.export import export
+
+    # mvp.housing.core_socket.build(mvp.wall_thickness).export('core_socket.stl')
+    # show_object(mvp.build())
+    built_socket = socket.build(wall_thickness)
+    print(export(built_socket, 'socket.stl'))
+    show_object(built_socket)
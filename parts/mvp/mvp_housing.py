@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 
-from cadquery import Workplane
+from cadquery import Assembly, Location, Vector, Workplane
 
 from parts.shared.battery_holder import BatteryHolder
 from parts.shared.core_socket import CoreSocket
@@ -11,11 +11,23 @@ class MVPHousing:
     core_socket: CoreSocket
     battery_holder: BatteryHolder
 
+    def battery_holder_offset(self, wall_thickness):
+        return -self.core_socket.outer_diameter - wall_thickness*2 - 0.5, 0, -5
+
     def build(self, wall_thickness):
         housing = Workplane()
         housing.add(self.core_socket.build(wall_thickness))
         housing.add(
             self.battery_holder.build(wall_thickness)
-            .translate((-self.core_socket.outer_diameter(wall_thickness) - wall_thickness*2 - 0.5, 0, -5))
+            .translate(self.battery_holder_offset(wall_thickness))
         )
         return housing
+
+    def assembly(self, wall_thickness):
+        # Same as build, but the parts stay separate parts
+        return (
+            Assembly(name='housing')
+            .add(self.core_socket.build(wall_thickness), name='core-socket')
+            .add(self.battery_holder.build(wall_thickness), name='battery-holder',
+                 loc=Location(Vector(*self.battery_holder_offset(wall_thickness))))
+        )
@@ -1,6 +1,9 @@
 from cadquery import Workplane
 
+from parts.cache import cached
 
+
+@cached
 def dome(inner_diameter, outer_diameter):
     return (
         Workplane()
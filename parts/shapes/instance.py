@@ -0,0 +1,61 @@
+from cadquery import Location, Shape, Vector, Workplane
+
+
+def _about(point: Vector, axis: Vector, angle: float) -> Location:
+    # rotation about the line through point along axis
+    return Location(point) * Location(Vector(0, 0, 0), axis, angle) * Location(-point)
+
+
+class Instance:
+    # Shapes built once plus where each of them has been moved to. moved, translate, rotate and rotateAboutCenter
+    # work like Shape's and Workplane's (rotateAboutCenter turns every object about its own center) but only change
+    # locations, a Workplane transform copies all the geometry every time. vals() and workplane() hand out
+    # located references to the same geometry, booleans and exports take them as they are.
+
+    def __init__(self, part: Workplane | Shape | list[Shape], locations: list[Location] | None = None,
+                 centers: dict[int, Vector] | None = None):
+        if isinstance(part, Workplane):
+            part = [o for o in part.vals() if isinstance(o, Shape)]
+        self.shapes = [part] if isinstance(part, Shape) else part
+        self.locations = locations or [Location() for _ in self.shapes]
+        # centers of mass of the original shapes, worked out once for every instance made from this one
+        self._centers = centers if centers is not None else {}
+
+    def _moved(self, locations: list[Location]) -> 'Instance':
+        return Instance(self.shapes, locations, self._centers)
+
+    def center(self, i: int) -> Vector:
+        if i not in self._centers:
+            self._centers[i] = self.shapes[i].Center()
+        return Vector(self._centers[i].toPnt().Transformed(self.locations[i].wrapped.Transformation()))
+
+    def moved(self, location: Location) -> 'Instance':
+        # like Shape.moved, location goes on top of wherever each shape already is
+        return self._moved([location * current for current in self.locations])
+
+    def translate(self, vec) -> 'Instance':
+        return self.moved(Location(Vector(vec)))
+
+    def rotate(self, axisStartPoint, axisEndPoint, angleDegrees: float) -> 'Instance':
+        start = Vector(axisStartPoint)
+        return self.moved(_about(start, Vector(axisEndPoint) - start, angleDegrees))
+
+    def rotateAboutCenter(self, axisEndPoint, angleDegrees: float) -> 'Instance':
+        axis = Vector(axisEndPoint)
+        return self._moved([
+            _about(self.center(i), axis, angleDegrees) * location for i, location in enumerate(self.locations)
+        ])
+
+    def vals(self) -> list[Shape]:
+        return [shape.moved(location) for shape, location in zip(self.shapes, self.locations)]
+
+    def val(self) -> Shape:
+        # The first shape, the same as Workplane.val() on the workplane this came from: with several shapes the
+        # rest are left out, use vals() or workplane() for all of them. Cut with workplane() when there are
+        # several, overlapping tools in one compound don't cut the same as separate ones.
+        if not self.shapes:
+            raise ValueError('An Instance of nothing has no val()')
+        return self.vals()[0]
+
+    def workplane(self) -> Workplane:
+        return Workplane().add(self.vals())
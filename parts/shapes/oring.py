@@ -2,6 +2,8 @@ from dataclasses import dataclass
 
 from cadquery import Workplane
 
+from parts.cache import cached
+
 
 @dataclass
 class Oring:
@@ -9,6 +11,7 @@ class Oring:
     outer_diameter: float
     inner_diameter: float
 
+    @cached
     def build(self):
         return (
             Workplane('XZ')
@@ -0,0 +1,42 @@
+from cadquery import Compound, Workplane
+
+from parts.shapes.instance import Instance
+
+
+def _rotated(tool: Instance, axis, angle: float) -> Instance:
+    # about axis through the origin, only the locations change and the copies share the same underlying geometry
+    return tool.rotate((0, 0, 0), axis, angle)
+
+
+def polar_pattern(tool: Workplane, count: int, axis=(0, 0, 1), start_angle: float = 0) -> Workplane:
+    # Place `count` copies of tool evenly around axis (through the origin), the tool is only ever built once
+    instance = Instance(tool)
+    angle = 360 / count
+    return Workplane().add([
+        shape
+        for i in range(count)
+        for shape in _rotated(instance, axis, start_angle + angle * i).vals()
+    ])
+
+
+def instances_touch(tool: Workplane, count: int, axis=(0, 0, 1), tol: float = 1e-6) -> bool:
+    # Neighbouring copies are the closest ones, if they don't touch nothing does
+    if count < 2:
+        return False
+    instance = Instance(tool)
+    first = Compound.makeCompound(instance.vals())
+    second = Compound.makeCompound(_rotated(instance, axis, 360 / count).vals())
+    return first.distance(second) <= tol
+
+
+def pattern_cut(body: Workplane, tool: Workplane, count: int, axis=(0, 0, 1)) -> Workplane:
+    # Same result as cutting tool rotated by i * 360 / count one at a time, but every copy goes
+    # into a single boolean instead of N booleans against an ever more complex body.
+    # Copies that overlap each other (lots of airways on a small core) break the single boolean
+    # and aren't any faster batched, so those still get cut one at a time.
+    if not instances_touch(tool, count, axis):
+        return body.cut(polar_pattern(tool, count, axis))
+    instance = Instance(tool)
+    for i in range(count):
+        body = body.cut(_rotated(instance, axis, 360 / count * i).workplane())
+    return body
@@ -2,6 +2,8 @@ from dataclasses import dataclass
 
 from cadquery import Workplane
 
+from parts.cache import cached
+from parts.shapes.instance import Instance
 from parts.shared.thermal_cutoff import ThermalCutoffHolder, ThermalCutoffSocket
 
 
@@ -86,12 +88,13 @@ class BMSHolder:
         )
 
     def solder_windows(self, wall_thickness):
+        window = Instance(self.solder_window(wall_thickness))
         return (
             Workplane()
-            .add(self.solder_window(wall_thickness).translate((0, 0, self.length / 2 - self.window_height / 2)))
-            .add(self.solder_window(wall_thickness).translate((0, 0, self.length / 2 - wall_thickness + 0.2)))
-            .add(self.solder_window(wall_thickness).translate((0, 0, -self.length / 2 + self.window_height / 2 + 0.5)))
-            .add(self.solder_window(wall_thickness).translate((0, 0, -(self.length / 2 - 10.5))))
+            .add(window.translate((0, 0, self.length / 2 - self.window_height / 2)).vals())
+            .add(window.translate((0, 0, self.length / 2 - wall_thickness + 0.2)).vals())
+            .add(window.translate((0, 0, -self.length / 2 + self.window_height / 2 + 0.5)).vals())
+            .add(window.translate((0, 0, -(self.length / 2 - 10.5))).vals())
         )
 
     def bms_hole(self, wall_thickness):
@@ -130,38 +133,69 @@ class BatteryHolder:
     battery_diameter: float
     battery_height: float
     thickness: float = 1.25
+    # how much wider than the battery the cavity is
+    clearance: float = 1
     tab = single_strip_spring_contact
 
+    def holder_id(self):
+        return self.battery_diameter + self.clearance
+
+    def holder_od(self):
+        return self.holder_id() + self.thickness * 2
+
+    def cutoff_holder(self):
+        cutoff_holder_height = 15.91
+        return ThermalCutoffHolder(ThermalCutoffSocket(cutoff_holder_height), cutoff_holder_height)
+
+    def place_thermal_cutoff(self, piece, wall_thickness: float):
+        cutoff_holder = self.cutoff_holder()
+        holder_od = self.holder_od()
+        return (
+            Instance(piece)
+            .translate((-cutoff_holder.height / 2, 0))
+            .rotateAboutCenter((1, 0, 0), 90)
+            .translate((
+                holder_od - cutoff_holder.socket.fuse_radius - wall_thickness,
+                -(holder_od / 2 - cutoff_holder.height / 2) - wall_thickness / 2 + 0.203125,
+                BMSHolder().length / 2 + wall_thickness + cutoff_holder.socket.fuse_radius
+            ))
+            .workplane()
+        )
+
+    def thermal_cutoff_hole(self, wall_thickness: float):
+        # Where the thermal fuse goes, cut through the main body so it touches the battery
+        cutoff_holder = self.cutoff_holder()
+        cutoff_holder_od = cutoff_holder.socket.fuse_radius * 2 + wall_thickness * 2
+        return self.place_thermal_cutoff(
+            Workplane()
+            .cylinder(radius=cutoff_holder.socket.fuse_radius, height=cutoff_holder.height,
+                      centered=(True, True, False))
+            .translate((0, wall_thickness, -cutoff_holder_od)),
+            wall_thickness
+        )
+
+    @cached
     def build(self, wall_thickness: float):
-        holder_id = self.battery_diameter + 1
-        holder_od = holder_id + self.thickness * 2
+        holder_id = self.holder_id()
+        holder_od = self.holder_od()
         inner_height = self.battery_height + self.tab.spring_compressed_depth * 2
         outer_height = inner_height + self.thickness * 2
         bms_holder = BMSHolder()
 
         def place_bms(piece):
             return (
-                piece
+                Instance(piece)
                 .translate((holder_od / 2 - 0.125, - bms_holder.width / 2 - wall_thickness / 2,
                             -wall_thickness / 2))
                 .rotateAboutCenter((0, 0, 1), -27)
                 # .translate((-wall_thickness * .66, -wall_thickness * .66))
+                .workplane()
             )
 
-        def place_thermal_cutoff(piece):
-            return (
-                piece.translate((-cutoff_holder.height / 2, 0))
-                .rotateAboutCenter((1, 0, 0), 90)
-                .translate((
-                    holder_od - cutoff_holder.socket.fuse_radius - wall_thickness,
-                    -(holder_od / 2 - cutoff_holder.height / 2) - wall_thickness / 2 + 0.203125,
-                    bms_holder.length / 2 + wall_thickness + cutoff_holder.socket.fuse_radius
-                ))
-            )
-
-        cutoff_holder_height = 15.91
-        cutoff_holder = ThermalCutoffHolder(ThermalCutoffSocket(cutoff_holder_height), cutoff_holder_height)
+        cutoff_holder = self.cutoff_holder()
         cutoff_holder_od = cutoff_holder.socket.fuse_radius * 2 + wall_thickness * 2
+        # both ends get the same tab holder
+        tab = Instance(self.tab.build())
         return (
             Workplane()
             # main battery cylinder
@@ -186,15 +220,17 @@ class BatteryHolder:
             )
             # battery tab holders
             .add(
-                self.tab.build()
+                tab
                 .translate((0, 0, -(inner_height - self.tab.holder_thickness()) / 2))
                 .rotateAboutCenter((0, 0, 1), 45)
+                .vals()
             )
             .add(
-                self.tab.build()
+                tab
                 .rotateAboutCenter((0, 1, 0), 180)
                 .translate((0, 0, (inner_height + self.tab.holder_thickness())/2 - self.tab.holder_thickness()*.75 - 0.05))
                 .rotateAboutCenter((0, 0, 1), 45)
+                .vals()
             )
             # Cut tab holes through main body
             .cut(
@@ -222,25 +258,19 @@ class BatteryHolder:
             )
             # Add the Thermal cutoff holder
             .add(
-                place_thermal_cutoff(
+                self.place_thermal_cutoff(
                     cutoff_holder.build(wall_thickness)
                     # cut the back bit of the holder off to allow close contact to battery
                     .cut(
                         Workplane()
                         .box(cutoff_holder_od, cutoff_holder_od, cutoff_holder.height)
                         .translate((-6.15, 0))
-                    )
+                    ),
+                    wall_thickness
                 )
             )
             # Cut thermal fuse hole through main body
-            .cut(
-                place_thermal_cutoff(
-                    Workplane()
-                    .cylinder(radius=cutoff_holder.socket.fuse_radius, height=cutoff_holder.height,
-                              centered=(True, True, False))
-                    .translate((0, wall_thickness, -cutoff_holder_od))
-                )
-            )
+            .cut(self.thermal_cutoff_hole(wall_thickness))
             # Add the bms holder
             .add(place_bms(bms_holder.build(wall_thickness)))
             # Cut bms hole through main body
@@ -3,6 +3,9 @@ from dataclasses import dataclass
 
 from cadquery import Workplane
 
+from parts.cache import cached
+from parts.shapes.pattern import pattern_cut
+
 
 @dataclass
 class CoreSocket:
@@ -24,9 +27,9 @@ class CoreSocket:
             .translate((0, 0, -((self.height - ring_thickness)/2)))
         )
 
+    @cached
     def build(self, wall_thickness):
         circumference = math.pi * self.inner_diameter
-        vent_angle = 360 / self.vent_count
         vent_width = circumference / self.vent_count / 2
         tube = (
             Workplane()
@@ -36,11 +39,9 @@ class CoreSocket:
             .hole(diameter=self.inner_diameter, depth=self.height)
         )
         tube.add(self.stop_ring(wall_thickness))
-        for i in range(self.vent_count):
-            tube = tube.cut(
-                Workplane()
-                .box(length=wall_thickness*2.5, width=vent_width, height=self.height)
-                .translate((self.inner_diameter/2, 0))
-                .rotate((0,0,0), (0,0,1), vent_angle * i)
-            )
-        return tube
+        vent = (
+            Workplane()
+            .box(length=wall_thickness*2.5, width=vent_width, height=self.height)
+            .translate((self.inner_diameter/2, 0))
+        )
+        return pattern_cut(tube, vent, self.vent_count)
@@ -1,7 +1,11 @@
+import math
 from dataclasses import dataclass
 
-from cadquery import Workplane, Wire
+from cadquery import Edge, Vector, Workplane, Wire
 
+from parts.cache import cached
+from parts.shapes.instance import Instance
+from parts.shapes.pattern import pattern_cut
 from parts.shared.thermal_cutoff import ThermalCutoffSocket
 
 
@@ -18,6 +22,10 @@ class McWeedCoreAirway:
     turns: float
     height: float
     count: int
+    # Set a tolerance (mm) to sweep along a BSpline fitted to the helix instead of the exact helix.
+    # The airways come out a hair different, but lots of overlapping turns cut way faster.
+    path_tolerance: float | None = None
+    path_segments_per_turn: int = 16
 
     def offset(self, bowl_inner_diameter: float):
         return bowl_inner_diameter + self.inner_diameter
@@ -25,18 +33,45 @@ class McWeedCoreAirway:
     def angle(self):
         return 360 / self.count
 
+    def helix_path(self, pitch: float, height: float, radius: float) -> Wire:
+        if self.path_tolerance is None:
+            return Wire.makeHelix(pitch=pitch, height=height, radius=radius)
+        turns = height / pitch
+        segments = max(8, math.ceil(turns * self.path_segments_per_turn))
+        points = [
+            Vector(radius * math.cos(2 * math.pi * turns * i / segments),
+                   radius * math.sin(2 * math.pi * turns * i / segments),
+                   height * i / segments)
+            for i in range(segments + 1)
+        ]
+        return Wire.assembleEdges([Edge.makeSplineApprox(points, tol=self.path_tolerance, minDeg=3, maxDeg=8)])
+
+    def bowl_offset(self, bowl: McWeedBowl):
+        return self.offset(bowl.inner_diameter/2 - (bowl.outer_diameter-bowl.inner_diameter) - .35)
+
+    def profile(self, bowl: McWeedBowl):
+        # The airway's ellipse: how far out from the middle its outermost point is, and its semi axes across
+        # and along the core's circle
+        return self.bowl_offset(bowl) + 0.6, self.inner_diameter * 1.1, self.inner_diameter / 2
+
+    def z_range(self):
+        # where the airway starts and stops, in the core before it's flipped
+        return -self.inner_diameter * 3, self.height - self.inner_diameter * 2
+
+    def pitch(self):
+        return (self.height + self.inner_diameter) / self.turns
+
+    # Every core with the same bowl and airways shares one sweep
+    @cached
     def airway_helix(self, bowl: McWeedBowl):
-        height = self.height + self.inner_diameter
-        pitch = height / self.turns
-        offset = self.offset(bowl.inner_diameter/2 - (bowl.outer_diameter-bowl.inner_diameter) - .35)
+        outer, x_radius, y_radius = self.profile(bowl)
         return (
             Workplane()
-            .center(offset + 0.6, 0)
-            .ellipseArc(x_radius=self.inner_diameter * 1.1, y_radius=self.inner_diameter / 2, makeWire=True)
-            .sweep(Workplane(
-                Wire.makeHelix(pitch=pitch, height=height, radius=offset * 2)
-            ), isFrenet=True)
-            .translate((0, 0, -self.inner_diameter * 3))
+            .center(outer, 0)
+            .ellipseArc(x_radius=x_radius, y_radius=y_radius, makeWire=True)
+            .sweep(Workplane(self.helix_path(self.pitch(), self.height + self.inner_diameter,
+                                             self.bowl_offset(bowl) * 2)), isFrenet=True)
+            .translate((0, 0, self.z_range()[0]))
         )
 
 
@@ -45,10 +80,47 @@ class McWeedCeramicFilamentPrintableCore:
     bowl: McWeedBowl
     airway: McWeedCoreAirway
     wire_ring_depth: float
+    # where the thermal cutoff sits, x/y from the middle and z from the top of the airways (before the flip)
+    cutoff_offset: tuple[float, float, float] = (-0.5, 0, 3.25)
 
     def height(self):
         return self.bowl.height + self.airway.height
 
+    def airway_tool(self):
+        # One airway, before it's patterned around the core and before the flip
+        return self.airway.airway_helix(self.bowl)
+
+    def thermal_cutoff(self):
+        return ThermalCutoffSocket(height=self.airway.height, fuse_radius=2.5, wire_radius=0.6)
+
+    def cutoff_level(self):
+        # where the middle of the cutoff socket goes, before the flip
+        return (self.height() - self.airway.height) / 2 + self.cutoff_offset[2]
+
+    def cutoff_socket(self):
+        # The hole with a dome to stuff the thermal fuse in, placed in the core before it gets flipped
+        x, y, _ = self.cutoff_offset
+        return (
+            Instance(self.thermal_cutoff().build())
+            .rotateAboutCenter((0, 1, 0), 180)
+            .translate((x, y, self.cutoff_level()))
+            .workplane()
+        )
+
+    def wire_ring_radius(self):
+        return (self.bowl.inner_diameter - (self.airway.inner_diameter*2) + 0.5) / 2
+
+    def wire_ring_levels(self):
+        # the middle of the bottom and bowl side countersinks, in the flipped core
+        return (-(self.airway.height / 2) + self.wire_ring_depth * 0.65,
+                (self.airway.height / 2) - self.wire_ring_depth * 0.25)
+
+    def wire_rings(self):
+        # Countersinks for the heater wire, bottom and bowl side, placed in the flipped core
+        ring = Instance(wire_ring(self))
+        return [ring.translate((0, 0, level)).workplane() for level in self.wire_ring_levels()]
+
+    @cached
     def build(self):
         # Make the main body and cut the bowl hole
         core = (
@@ -62,31 +134,18 @@ class McWeedCeramicFilamentPrintableCore:
         )
 
         # Cut the airways
-        for i in range(self.airway.count):
-            core = core.cut(
-                self.airway.airway_helix(self.bowl)
-                .rotate((0, 0, 0), (0, 0, 1), i * self.airway.angle())
-            )
+        core = pattern_cut(core, self.airway_tool(), self.airway.count)
 
         # Cut the bottom hole with a dome to stuff the thermal fuse in
-        core = core.cut(
-            ThermalCutoffSocket(height=self.airway.height, fuse_radius=2.5, wire_radius=0.6).build()
-            .rotateAboutCenter((0, 1, 0), 180)
-            .translate((-0.5, 0, (self.height() - self.airway.height) / 2 + 3.25))
-        )
+        core = core.cut(self.cutoff_socket())
 
         # Flip it over and cut countersinks for the wires
-        return (
-            core.rotateAboutCenter((0, 1, 0), 180)
-            # bottom ring
-            .cut(wire_ring(self).translate((0, 0, -(self.airway.height / 2) + self.wire_ring_depth * 0.65)))
-            # bowl side ring
-            .cut(wire_ring(self).translate((0, 0, (self.airway.height / 2) - self.wire_ring_depth * 0.25)))
-        )
+        bottom_ring, bowl_ring = self.wire_rings()
+        return core.rotateAboutCenter((0, 1, 0), 180).cut(bottom_ring).cut(bowl_ring)
 
 
 def wire_ring(core: McWeedCeramicFilamentPrintableCore):
-    radius = (core.bowl.inner_diameter - (core.airway.inner_diameter*2) + 0.5) / 2
+    radius = core.wire_ring_radius()
     return (
         Workplane()
         .cylinder(height=core.wire_ring_depth, radius=radius)
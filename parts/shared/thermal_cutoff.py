@@ -2,7 +2,9 @@ from dataclasses import dataclass
 
 from cadquery import Workplane
 
+from parts.cache import cached
 from parts.shapes.dome import dome
+from parts.shapes.instance import Instance
 
 
 @dataclass
@@ -11,6 +13,7 @@ class ThermalCutoffSocket:
     fuse_radius: float = 2.5
     wire_radius: float = 0.6
 
+    @cached
     def build(self):
         return (
             Workplane()
@@ -41,13 +44,15 @@ class ThermalCutoffHolder:
     socket: ThermalCutoffSocket
     height: float
 
+    @cached
     def build(self, wall_thickness):
         return (
             Workplane()
             .cylinder(radius=self.socket.fuse_radius + wall_thickness + self.socket.wire_radius, height=self.height)
             .cut(
-                self.socket.build()
+                Instance(self.socket.build())
                 .translate((0, 0, -wall_thickness/2))
+                .workplane()
             )
             # cut a channel to tuck the lower wire into and avoid contact
             .cut(
@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+import time
+
+from pipeline.quality import QUALITIES
+from pipeline.registry import PARTS
+
+FORMATS = ['stl', 'ply', 'step', '3mf']
+
+
+def export_parts(names: list[str], formats: list[str], out_dir: str, quality: str = 'print',
+                 max_triangles: int | None = None, flat: bool = False):
+    from pipeline.assembly import ASSEMBLY_FORMATS, export_assembly
+    from pipeline.export import export
+
+    os.makedirs(out_dir, exist_ok=True)
+    for name in names:
+        part = PARTS[name]
+        start = time.perf_counter()
+        built = part.build()
+        print(f'{name}: built in {time.perf_counter() - start:.2f}s')
+        # parts with an assembly keep their structure in formats that can, repeats are stored once
+        assembly = part.assembly() if part.assembly and not flat and set(formats) & set(ASSEMBLY_FORMATS) else None
+        for fmt in formats:
+            filename = os.path.join(out_dir, f'{part.filename}.{fmt}')
+            if assembly is not None and fmt in ASSEMBLY_FORMATS:
+                print(f'  {export_assembly(assembly, filename, quality)}')
+            else:
+                print(f'  {export(built, filename, quality, max_triangles)}')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog='python -m pipeline', description='List and export registered parts')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='List the parts that can be exported')
+    export = commands.add_parser('export', help='Build and export parts')
+    export.add_argument('names', nargs='*', help='Parts to export, see `list`')
+    export.add_argument('--all', action='store_true', help='Export every registered part')
+    export.add_argument('--format', dest='formats', action='append', choices=FORMATS,
+                        help='Export format, can be repeated, defaults to stl')
+    export.add_argument('--out', default='.', help='Directory to export into')
+    export.add_argument('--quality', default='print', choices=QUALITIES, help='Tessellation quality for meshes')
+    export.add_argument('--max_triangles', type=int,
+                        help='Decimate stl/ply meshes down to this many triangles, for previews and the website')
+    export.add_argument('--flat', action='store_true',
+                        help='Export step/3mf as one flattened shape even for parts that have an assembly')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        width = max(len(name) for name in PARTS)
+        for part in PARTS.values():
+            print(f'{part.name:<{width}}  {part.description}')
+        sys.exit()
+
+    names = list(PARTS) if args.all else args.names
+    if not names:
+        export.error('give some part names or --all')
+    unknown = [name for name in names if name not in PARTS]
+    if unknown:
+        export.error(f"unknown parts: {', '.join(unknown)} (see `python -m pipeline list`)")
+    export_parts(names, args.formats or ['stl'], args.out, args.quality, args.max_triangles, args.flat)
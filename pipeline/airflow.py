@@ -0,0 +1,139 @@
+import argparse
+import math
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import open3d as o3d
+from cadquery import Workplane
+
+from pipeline.clearance import fused, raycasting_scene
+from pipeline.mesh import mesh, unflipped
+from pipeline.quality import QUALITIES
+
+
+@dataclass
+class AirflowReport:
+    # Slices through the airway section of a built core, z in the built core's coordinates (bowl on top)
+    levels: list[float]
+    # per level area open through the airways, other holes in the section don't count
+    open_area: list[float]
+    # per level thinnest material between an airway and the outside, None where nothing's open
+    outer_wall: list[float | None]
+    # per level thinnest material between an airway and the inside corner of the bowl, only airways that run
+    # out under the bowl's wall count, the ones under its floor are meant to open into it
+    bowl_wall: list[float | None]
+    resolution: float
+    seconds: float = 0.0
+    throat_level: float = field(init=False)
+    throat_area: float = field(init=False)
+    min_outer_wall: float | None = field(init=False)
+    min_bowl_wall: float | None = field(init=False)
+
+    def __post_init__(self):
+        throat = int(np.argmin(self.open_area))
+        self.throat_level, self.throat_area = self.levels[throat], self.open_area[throat]
+        self.min_outer_wall = min((w for w in self.outer_wall if w is not None), default=None)
+        self.min_bowl_wall = min((w for w in self.bowl_wall if w is not None), default=None)
+
+    def passes(self, min_throat_area: float = 0, min_wall: float = 0) -> bool:
+        walls = [w for w in (self.min_outer_wall, self.min_bowl_wall) if w is not None]
+        return self.throat_area >= min_throat_area and all(w >= min_wall for w in walls)
+
+    def summary(self) -> dict:
+        return {'throat_level': self.throat_level, 'throat_area': self.throat_area,
+                'min_outer_wall': self.min_outer_wall, 'min_bowl_wall': self.min_bowl_wall}
+
+    def __str__(self):
+        def mm(value):
+            return '-' if value is None else f'{value:.2f}'
+
+        lines = [f"{'z':>7}{'open mm^2':>11}{'outer wall':>12}{'bowl wall':>11}"]
+        for z, area, outer, bowl in zip(self.levels, self.open_area, self.outer_wall, self.bowl_wall):
+            throat = '  <- throat' if z == self.throat_level else ''
+            lines.append(f'{z:>7.2f}{area:>11.2f}{mm(outer):>12}{mm(bowl):>11}{throat}')
+        lines.append(f'throat {self.throat_area:.2f}mm^2 at z={self.throat_level:.2f}, thinnest walls '
+                     f'{mm(self.min_outer_wall)}mm to the outside and {mm(self.min_bowl_wall)}mm to the bowl '
+                     f'(+-{self.resolution:.2f}mm, {self.seconds * 1000:.0f}ms)')
+        return '\n'.join(lines)
+
+
+def in_airways(core, points: np.ndarray, quality: str = 'preview') -> np.ndarray:
+    # Which points (in the core before the flip) are in one of its airways. The thermal cutoff's socket and the
+    # heater wire's countersinks are open too but the air doesn't go through them. One airway gets meshed and the
+    # points are turned back by each copy's angle instead.
+    scene = raycasting_scene(mesh(fused(core.airway_tool()), quality))
+    result = np.zeros(len(points), bool)
+    for i in range(core.airway.count):
+        angle = -math.radians(core.airway.angle() * i)
+        turned = points @ np.array([[math.cos(angle), math.sin(angle), 0], [-math.sin(angle), math.cos(angle), 0],
+                                    [0, 0, 1]])
+        tensor = o3d.core.Tensor(turned, dtype=o3d.core.float32)
+        result |= scene.compute_occupancy(tensor, nsamples=3).numpy() > 0.5
+    return result
+
+
+def analyze(core, built: Workplane | None = None, levels: int = 40, resolution: float = 0.2,
+            quality: str = 'preview') -> AirflowReport:
+    # Works for McWeedCeramicFilamentPrintableCore and McWeedPressableCore, anything with a bowl and an airway.
+    # Every level is a grid of points across the core's circle, one batched inside test for all of them, and the
+    # open ones get another against the airways so only the airways count as open.
+    start = time.perf_counter()
+    built = built if built is not None else core.build()
+    part_mesh = mesh(fused(built), quality)
+    scene = raycasting_scene(part_mesh)
+    low, high = part_mesh.vertices.min(axis=0), part_mesh.vertices.max(axis=0)
+    center = (low + high) / 2
+    radius, bowl_radius = core.bowl.outer_diameter / 2, core.bowl.inner_diameter / 2
+    # build() flips the core over, the airways are the bottom airway.height of it with the bowl sitting on top
+    floor = low[2] + core.airway.height
+    zs = low[2] + (np.arange(levels) + 0.5) * core.airway.height / levels
+
+    axis = np.arange(-radius + resolution / 2, radius, resolution)
+    x, y = np.meshgrid(axis, axis, indexing='ij')
+    r = np.hypot(x, y).ravel()
+    # a pixel's worth in from the outside so the edge of the circle doesn't count as open
+    in_core = r < radius - resolution / 2
+    xy = np.stack([x.ravel() + center[0], y.ravel() + center[1]], axis=1)[in_core]
+    r = r[in_core]
+    points = np.concatenate([np.column_stack([xy, np.full(len(xy), z)]) for z in zs])
+    solid = scene.compute_occupancy(o3d.core.Tensor(points, dtype=o3d.core.float32), nsamples=3).numpy() > 0.5
+    airway = np.zeros(len(points), bool)
+    airway[~solid] = in_airways(core, unflipped(points[~solid], built), quality)
+    airway = airway.reshape(levels, len(xy))
+
+    open_area, outer_wall, bowl_wall = [], [], []
+    for z, level_airway in zip(zs, airway):
+        open_r = r[level_airway]
+        open_area.append(float(len(open_r) * resolution ** 2))
+        # walls are measured from the edge of the outermost open pixel, not its middle
+        outer_wall.append(float(radius - open_r.max() - resolution / 2) if len(open_r) else None)
+        under_wall = open_r[open_r >= bowl_radius]
+        bowl_wall.append(float(math.hypot(under_wall.min() - bowl_radius, floor - z) - resolution / 2)
+                         if len(under_wall) else None)
+    return AirflowReport([float(z) for z in zs], open_area, outer_wall, bowl_wall, resolution,
+                         time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    from pipeline.sweep import DEFAULTS, make_core, parse_grid_arg
+
+    parser = argparse.ArgumentParser(
+        usage="Slice a core's airway section and report open area per level, the throat and the thinnest walls, "
+              "e.g. python -m pipeline.airflow --set airway.count=12 --set airway.inner_diameter=2")
+    parser.add_argument('--set', dest='params', type=parse_grid_arg, action='append', default=[],
+                        help='Change a core parameter from the MVP defaults, key=value using dotted names')
+    parser.add_argument('--levels', type=int, default=40, help='Number of slices through the airway section')
+    parser.add_argument('--resolution', type=float, default=0.2, help='Grid size within a slice in mm')
+    parser.add_argument('--quality', default='preview', choices=QUALITIES, help='Tessellation quality')
+    args = parser.parse_args()
+
+    params = {key: values[0] for key, values in args.params}
+    unknown = set(params) - set(DEFAULTS)
+    if unknown:
+        parser.error(f"unknown core parameters: {', '.join(sorted(unknown))}")
+    core = make_core(params)
+    start = time.perf_counter()
+    built = core.build()
+    print(f'Built in {time.perf_counter() - start:.2f}s')
+    print(analyze(core, built, args.levels, args.resolution, args.quality))
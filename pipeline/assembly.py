@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import time
+import zipfile
+
+import numpy as np
+from cadquery import Assembly, Location
+
+from pipeline.clearance import matrix
+from pipeline.export import (FINGERPRINT_TOLERANCE, ExportReport, geometry_fingerprint, previous_export,
+                             quality_record, save_export, skipped, to_shape)
+from pipeline.mesh import mesh
+
+# Formats that keep an assembly's structure, everything else gets the flattened part
+ASSEMBLY_FORMATS = ('step', '3mf')
+
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>'
+    '</Types>'
+)
+RELATIONSHIPS = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Target="/3D/3dmodel.model" Id="rel0" '
+    'Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>'
+    '</Relationships>'
+)
+
+
+def leaves(assembly: Assembly, location: Location | None = None):
+    # (name, object, location in the top assembly's coordinates) for everything that's got a part in it
+    location = assembly.loc if location is None else location * assembly.loc
+    if assembly.obj is not None:
+        yield assembly.name, assembly.obj, location
+    for child in assembly.children:
+        yield from leaves(child, location)
+
+
+def _object(object_id: int, name: str, part_mesh) -> str:
+    vertices = ''.join('<vertex x="%.5f" y="%.5f" z="%.5f"/>' % tuple(v) for v in part_mesh.vertices.tolist())
+    triangles = ''.join('<triangle v1="%d" v2="%d" v3="%d"/>' % tuple(t) for t in part_mesh.triangles.tolist())
+    return (f'<object id="{object_id}" name="{name}" type="model"><mesh>'
+            f'<vertices>{vertices}</vertices><triangles>{triangles}</triangles></mesh></object>')
+
+
+def _transform(location: Location) -> str:
+    # 3MF matrices act on row vectors, so it's the transpose with the translation last
+    transform = matrix(location)
+    return ' '.join(f'{v:.6g}' for v in [*transform[:3, :3].T.ravel(), *transform[:3, 3]])
+
+
+def write_3mf(assembly: Assembly, filename: str, quality: str = 'print') -> tuple[int, float]:
+    # Every distinct part is meshed and written once, each place it's used is a build item pointing at it.
+    # Returns the triangles written and the seconds spent tessellating.
+    objects, items, meshed = [], [], {}
+    triangles, tessellate_seconds = 0, 0.0
+    for name, obj, location in leaves(assembly):
+        if id(obj) not in meshed:
+            start = time.perf_counter()
+            part_mesh = mesh(obj, quality)
+            tessellate_seconds += time.perf_counter() - start
+            meshed[id(obj)] = len(meshed) + 1
+            objects.append(_object(meshed[id(obj)], name, part_mesh))
+            triangles += len(part_mesh.triangles)
+        items.append(f'<item objectid="{meshed[id(obj)]}" transform="{_transform(location)}"/>')
+    model = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<model unit="millimeter" xml:lang="en-US" '
+        'xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">'
+        f'<resources>{"".join(objects)}</resources><build>{"".join(items)}</build></model>'
+    )
+    with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', CONTENT_TYPES)
+        archive.writestr('_rels/.rels', RELATIONSHIPS)
+        archive.writestr('3D/3dmodel.model', model)
+    return triangles, tessellate_seconds
+
+
+def assembly_fingerprint(assembly: Assembly) -> str:
+    # Every part's geometry once, plus the name and rounded placement of everything in the assembly
+    parts, placements = {}, []
+    for name, obj, location in leaves(assembly):
+        if id(obj) not in parts:
+            parts[id(obj)] = geometry_fingerprint(to_shape(obj))
+        placements.append([name, parts[id(obj)], np.round(matrix(location) / FINGERPRINT_TOLERANCE).tolist()])
+    return hashlib.sha256(json.dumps(placements).encode()).hexdigest()
+
+
+def export_assembly(assembly: Assembly, filename: str, quality: str = 'print',
+                    fingerprint: bool = True) -> ExportReport:
+    # STEP goes through OCCT's XCAF document, a part added to the assembly more than once is one definition
+    # with several placements. The 3MF writer does the same with meshes. Unchanged files are skipped like export's.
+    fmt = os.path.splitext(filename)[1][1:].lower()
+    if fmt not in ASSEMBLY_FORMATS:
+        raise ValueError(f"assemblies export to {', '.join(ASSEMBLY_FORMATS)}, not {fmt}")
+    if fingerprint:
+        start = time.perf_counter()
+        record = {'geometry': assembly_fingerprint(assembly), **quality_record(quality), 'max_triangles': None}
+        fingerprint_seconds = time.perf_counter() - start
+        previous = previous_export(filename, record)
+        if previous is not None:
+            return skipped(filename, quality, previous, fingerprint_seconds)
+        report = export_assembly(assembly, filename, quality, fingerprint=False)
+        report.fingerprint_seconds = fingerprint_seconds
+        save_export(filename, record, report)
+        return report
+    start = time.perf_counter()
+    if fmt == 'step':
+        assembly.export(filename, 'STEP')
+        triangles, tessellate_seconds = 0, 0.0
+    else:
+        triangles, tessellate_seconds = write_3mf(assembly, filename, quality)
+    write_seconds = time.perf_counter() - start - tessellate_seconds
+    return ExportReport(filename, quality, triangles, os.path.getsize(filename), tessellate_seconds, write_seconds)
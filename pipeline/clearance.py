@@ -0,0 +1,263 @@
+import argparse
+import itertools
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import open3d as o3d
+from cadquery import Location, Shape, Vector, Workplane
+
+from pipeline.export import to_shape
+from pipeline.mesh import Mesh, mesh
+from pipeline.quality import QUALITIES
+
+# Most points the grid says are close that get an exact distance query on every check
+REFINED_POINTS = 512
+
+
+@dataclass
+class Body:
+    # A part tessellated once, with a BVH for exact queries and a signed distance grid around it for fast ones,
+    # both in the part's own frame. Placements are just matrices, a new placement never touches the B-rep again.
+    name: str
+    mesh: Mesh
+    samples: np.ndarray
+    spacing: float
+    scene: o3d.t.geometry.RaycastingScene
+    sdf: np.ndarray
+    origin: np.ndarray
+    step: float
+    padding: float
+
+    def signed_distance(self, points: np.ndarray) -> np.ndarray:
+        # exact, negative inside the part. nsamples is a majority vote of rays, one grazing an edge can get it wrong
+        points = o3d.core.Tensor(points, dtype=o3d.core.float32)
+        return self.scene.compute_signed_distance(points, nsamples=3).numpy()
+
+    def inside(self, points: np.ndarray) -> np.ndarray:
+        points = o3d.core.Tensor(points, dtype=o3d.core.float32)
+        return self.scene.compute_occupancy(points, nsamples=3).numpy() > 0.5
+
+    def approximate_distance(self, points: np.ndarray) -> np.ndarray:
+        # Trilinear lookup in the grid, anything off the grid is at least `padding` away
+        position = (points - self.origin) / self.step
+        corner = np.floor(position).astype(int)
+        on_grid = ((corner >= 0) & (corner < np.array(self.sdf.shape) - 1)).all(axis=1)
+        result = np.full(len(points), self.padding)
+        corner, t = corner[on_grid], position[on_grid] - corner[on_grid]
+        value = 0
+        for offset in itertools.product((0, 1), repeat=3):
+            weight = np.prod(np.where(offset, t, 1 - t), axis=1)
+            value = value + weight * self.sdf[tuple((corner + offset).T)]
+        result[on_grid] = value
+        return result
+
+
+def fused(part: Workplane | Shape) -> Shape:
+    shape = to_shape(part)
+    solids = shape.Solids()
+    if len(solids) > 1:
+        # touching solids leave faces inside the part that throw off the inside/outside ray tests
+        shape = solids[0].fuse(*solids[1:]).clean()
+    return shape
+
+
+def raycasting_scene(part_mesh: Mesh) -> o3d.t.geometry.RaycastingScene:
+    scene = o3d.t.geometry.RaycastingScene()
+    scene.add_triangles(o3d.core.Tensor(part_mesh.vertices, dtype=o3d.core.float32),
+                        o3d.core.Tensor(part_mesh.triangles, dtype=o3d.core.uint32))
+    return scene
+
+
+def prepare(name: str, part: Workplane | Shape, quality: str = 'print', spacing: float = 1,
+            resolution: float = 0.5, padding: float = 2) -> Body:
+    part_mesh = mesh(fused(part), quality)
+    scene = raycasting_scene(part_mesh)
+    body = Body(name, part_mesh, part_mesh.sample(spacing), spacing, scene, np.zeros((0, 0, 0)),
+                part_mesh.vertices.min(axis=0) - padding, resolution, padding)
+    high = part_mesh.vertices.max(axis=0) + padding
+    axes = [np.arange(low, top + resolution, resolution) for low, top in zip(body.origin, high)]
+    grid = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1)
+    body.sdf = body.signed_distance(grid.reshape(-1, 3)).reshape(grid.shape[:3])
+    return body
+
+
+@dataclass
+class Region:
+    # A cluster of surface points that are too close to (or inside) the other part, in assembly coordinates
+    center: tuple[float, float, float]
+    size: tuple[float, float, float]
+    points: int
+    worst: float
+
+
+@dataclass
+class Clearance:
+    a: str
+    b: str
+    # smallest gap between the surfaces, negative is how deep they overlap
+    min_clearance: float
+    interference_volume: float
+    regions: list[Region] = field(default_factory=list)
+
+    def fits(self, required: float = 0, max_interference: float = 0) -> bool:
+        return self.interference_volume <= max_interference and self.min_clearance >= required
+
+    def __str__(self):
+        lines = [f'{self.a} <-> {self.b}: min clearance {self.min_clearance:.3f}mm, '
+                 f'interference {self.interference_volume:.3f}mm^3']
+        for region in self.regions:
+            center = ', '.join(f'{v:.2f}' for v in region.center)
+            size = 'x'.join(f'{v:.2f}' for v in region.size)
+            lines.append(f'  ({center}) {size}mm, {region.points} points, worst {region.worst:.3f}mm')
+        return '\n'.join(lines)
+
+
+def matrix(location: Location | None) -> np.ndarray:
+    result = np.eye(4)
+    if location is not None:
+        transform = location.wrapped.Transformation()
+        result[:3] = [[transform.Value(i, j) for j in range(1, 5)] for i in range(1, 4)]
+    return result
+
+
+def _apply(points: np.ndarray, transform: np.ndarray) -> np.ndarray:
+    return points @ transform[:3, :3].T + transform[:3, 3]
+
+
+def _world_bounds(body: Body, transform: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    low, high = body.mesh.vertices.min(axis=0), body.mesh.vertices.max(axis=0)
+    corners = np.array(list(itertools.product(*zip(low, high))))
+    placed = _apply(corners, transform)
+    return placed.min(axis=0), placed.max(axis=0)
+
+
+def _regions(points: np.ndarray, distances: np.ndarray, spacing: float, limit: int = 10) -> list[Region]:
+    if not len(points):
+        return []
+    cloud = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(points))
+    labels = np.asarray(cloud.cluster_dbscan(eps=spacing * 3, min_points=1))
+    regions = []
+    for label in range(labels.max() + 1):
+        members = labels == label
+        low, high = points[members].min(axis=0), points[members].max(axis=0)
+        regions.append(Region(tuple((low + high) / 2), tuple(high - low), int(members.sum()),
+                              float(distances[members].min())))
+    return sorted(regions, key=lambda region: region.worst)[:limit]
+
+
+def _closest(body: Body, points: np.ndarray) -> tuple[np.ndarray, float]:
+    # Grid distances of points to body, plus the exact distance of the closest point. The grid is off by up
+    # to about a cell around sharp or thin features, so everything within a cell of the closest gets checked.
+    approximate = body.approximate_distance(points)
+    candidates = np.flatnonzero(approximate < approximate.min() + body.step)
+    if len(candidates) > REFINED_POINTS:
+        candidates = candidates[np.argpartition(approximate[candidates], REFINED_POINTS)[:REFINED_POINTS]]
+    return approximate, float(body.signed_distance(points[candidates]).min())
+
+
+def check(a: Body, b: Body, a_location: Location | None = None, b_location: Location | None = None,
+          required: float = 0) -> Clearance:
+    a_matrix, b_matrix = matrix(a_location), matrix(b_location)
+    a_low, a_high = _world_bounds(a, a_matrix)
+    b_low, b_high = _world_bounds(b, b_matrix)
+    # Parts further apart than their bounding boxes are done without a single distance query
+    gap = np.maximum(0, np.maximum(a_low - b_high, b_low - a_high))
+    if np.linalg.norm(gap) > max(required, 0):
+        return Clearance(a.name, b.name, float(np.linalg.norm(gap)), 0.0)
+
+    # b's surface against a and a's surface against b, both ways so thin features of either get seen
+    b_in_a = np.linalg.inv(a_matrix) @ b_matrix
+    a_distances, a_closest = _closest(a, _apply(b.samples, b_in_a))
+    b_distances, b_closest = _closest(b, _apply(a.samples, np.linalg.inv(b_in_a)))
+    min_clearance = min(a_closest, b_closest)
+    a_world, b_world = _apply(a.samples, a_matrix), _apply(b.samples, b_matrix)
+
+    interference = 0.0
+    step = min(a.step, b.step)
+    if min_clearance < 0:
+        # The overlap is walled in by the bits of each surface inside the other part, so only the box around
+        # those gets filled with cells. The distance grids rule out most cells, the rest get an exact inside test.
+        inside = np.concatenate([b_world[a_distances < step], a_world[b_distances < step]])
+        # Only the exact refinement may have seen the overlap with no sample within a cell of the other part,
+        # then the whole overlap of the bounding boxes gets filled
+        low, high = np.maximum(a_low, b_low), np.minimum(a_high, b_high)
+        if len(inside):
+            margin = max(a.spacing, b.spacing)
+            low = np.maximum(low, inside.min(axis=0) - margin)
+            high = np.minimum(high, inside.max(axis=0) + margin)
+        axes = [np.arange(lo + step / 2, hi, step) for lo, hi in zip(low, high)]
+        grid = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3)
+        # a random point in every cell instead of the middle, a thin overlap lined up with the grid
+        # would otherwise be hit by every cell or by none
+        grid += np.random.default_rng(0).uniform(-step / 2, step / 2, grid.shape)
+        in_a, in_b = _apply(grid, np.linalg.inv(a_matrix)), _apply(grid, np.linalg.inv(b_matrix))
+        maybe = (a.approximate_distance(in_a) < a.step) & (b.approximate_distance(in_b) < b.step)
+        maybe[maybe] = a.inside(in_a[maybe])
+        maybe[maybe] = b.inside(in_b[maybe])
+        interference = float(maybe.sum() * step ** 3)
+
+    regions = []
+    if min_clearance < required:
+        # only worth the exact queries when something's wrong, the grid alone misses thin features
+        near_b = b_world[a_distances < required + a.step]
+        near_a = a_world[b_distances < required + b.step]
+        points = np.concatenate([near_b, near_a])
+        distances = np.concatenate([a.signed_distance(_apply(near_b, np.linalg.inv(a_matrix))),
+                                    b.signed_distance(_apply(near_a, np.linalg.inv(b_matrix)))])
+        close = distances < required
+        regions = _regions(points[close], distances[close], max(a.spacing, b.spacing))
+    return Clearance(a.name, b.name, min_clearance, interference, regions)
+
+
+def check_assembly(placed: dict[str, tuple[Body, Location | None]], required: float = 0) -> list[Clearance]:
+    # Every pair of parts, name -> (body, location)
+    return [
+        check(a, b, a_location, b_location, required)
+        for (a, a_location), (b, b_location) in itertools.combinations(placed.values(), 2)
+    ]
+
+
+def socket_seat(core: Workplane, socket, wall_thickness: float) -> Location:
+    # Where a built core ends up sitting on the stop ring of a CoreSocket built with wall_thickness
+    bb = core.val().BoundingBox()
+    bottom = -socket.height / 2 + wall_thickness * 2
+    return Location(Vector(-bb.center.x, -bb.center.y, bottom - bb.zmin))
+
+
+if __name__ == "__main__":
+    from parts.mvp.mvp import core, socket, wall_thickness
+    from parts.mvp.mvp_housing import MVPHousing
+    from parts.shared.battery_holder import battery_holder_21700
+
+    parser = argparse.ArgumentParser(
+        usage="Check the fits in the MVP: the core seated in its socket and the battery holder next to the socket, "
+              "e.g. python -m pipeline.clearance --required 0.1")
+    parser.add_argument('--required', type=float, default=0, help='Smallest gap in mm that counts as clear')
+    parser.add_argument('--spacing', type=float, default=1, help='Distance between surface sample points')
+    parser.add_argument('--resolution', type=float, default=0.5, help='Signed distance grid size')
+    parser.add_argument('--quality', default='print', choices=QUALITIES, help='Tessellation quality')
+    args = parser.parse_args()
+
+    housing = MVPHousing(core_socket=socket, battery_holder=battery_holder_21700())
+    built_core = core.build()
+    parts = {
+        'core': built_core,
+        'socket': socket.build(wall_thickness),
+        'battery holder': housing.battery_holder.build(wall_thickness),
+    }
+    start = time.perf_counter()
+    bodies = {name: prepare(name, part, args.quality, args.spacing, args.resolution) for name, part in parts.items()}
+    print(f'Prepared {len(bodies)} parts in {time.perf_counter() - start:.2f}s')
+    holder_location = Location(Vector(*housing.battery_holder_offset(wall_thickness)))
+    placed = {
+        'core': (bodies['core'], socket_seat(built_core, socket, wall_thickness)),
+        'socket': (bodies['socket'], None),
+        'battery holder': (bodies['battery holder'], holder_location),
+    }
+    start = time.perf_counter()
+    reports = check_assembly(placed, args.required)
+    seconds = time.perf_counter() - start
+    for report in reports:
+        print(report)
+    print(f'{len(reports)} checks in {seconds * 1000:.1f}ms')
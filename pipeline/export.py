@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+
+import numpy as np
+from cadquery import BoundBox, Compound, Shape, Workplane, exporters
+from OCP.Bnd import Bnd_Box
+from OCP.BRep import BRep_Tool
+from OCP.BRepBndLib import BRepBndLib
+from OCP.BRepMesh import BRepMesh_IncrementalMesh
+from OCP.BRepTools import BRepTools
+from OCP.StlAPI import StlAPI_Writer
+from OCP.TopLoc import TopLoc_Location
+
+from pipeline.quality import QUALITIES, Quality
+
+
+MESHED_FORMATS = ('stl', 'ply', '3mf', 'amf', 'vrml', 'tjs')
+
+# Coordinates closer than this (mm) count as the same geometry when deciding whether to skip an export
+FINGERPRINT_TOLERANCE = 1e-4
+
+
+@dataclass
+class ExportReport:
+    filename: str
+    quality: str
+    triangles: int
+    size: int
+    tessellate_seconds: float
+    write_seconds: float
+    decimate_seconds: float = 0.0
+    fingerprint_seconds: float = 0.0
+    # the file was already there from the same geometry and settings, so it wasn't touched
+    skipped: bool = False
+
+    def __str__(self):
+        if self.skipped:
+            return (f'{self.filename} [{self.quality}] unchanged, skipped ({self.triangles} triangles, '
+                    f'{self.size / 1024:.0f}KiB, fingerprinted in {self.fingerprint_seconds:.2f}s)')
+        decimated = f', decimated in {self.decimate_seconds:.2f}s' if self.decimate_seconds else ''
+        return (f'{self.filename} [{self.quality}] {self.triangles} triangles, {self.size / 1024:.0f}KiB, '
+                f'tessellated in {self.tessellate_seconds:.2f}s{decimated}, written in {self.write_seconds:.2f}s')
+
+
+def to_shape(part: Workplane | Shape) -> Shape:
+    if isinstance(part, Shape):
+        return part
+    shapes = part.vals()
+    return shapes[0] if len(shapes) == 1 else Compound.makeCompound(shapes)
+
+
+def exact_bounds(shape: Shape) -> BoundBox:
+    # BoundingBox() goes by the triangles once a shape has been meshed, they can be inside or outside by the deflection
+    box = Bnd_Box()
+    BRepBndLib.AddOptimal_s(shape.wrapped, box, False)
+    return BoundBox(box)
+
+
+# the last part fingerprinted, the same part usually goes out in a few formats in a row
+_last_fingerprint: tuple[list[Shape], float, str] = ([], 0.0, '')
+
+
+def _contents(shape: Shape) -> list[Shape]:
+    # to_shape makes a new Compound every time for a Workplane with several objects, the shapes in it are the same
+    return list(shape) if isinstance(shape, Compound) else [shape]
+
+
+def _same_shapes(a: list[Shape], b: list[Shape]) -> bool:
+    # same underlying geometry at the same location
+    return len(a) == len(b) and all(x.wrapped.IsEqual(y.wrapped) for x, y in zip(a, b))
+
+
+def geometry_fingerprint(shape: Shape, tolerance: float = FINGERPRINT_TOLERANCE) -> str:
+    # Topology counts, volume to 9 significant figures, the bounding box and every B-rep vertex rounded to
+    # tolerance. A rebuild of the same part gets the same one, for a fraction of what tessellating costs.
+    global _last_fingerprint
+    last, last_tolerance, digest = _last_fingerprint
+    contents = _contents(shape)
+    if last and _same_shapes(last, contents) and last_tolerance == tolerance:
+        return digest
+    # the quick box from the curves' control points, exact_bounds takes as long as everything else put together
+    box = Bnd_Box()
+    BRepBndLib.Add_s(shape.wrapped, box, False)
+    summary = [
+        len(shape.Solids()), len(shape.Faces()), len(shape.Edges()), len(shape.Vertices()),
+        f'{shape.Volume():.9g}', [round(v / tolerance) for v in box.Get()],
+    ]
+    vertices = np.round(np.array([v.toTuple() for v in shape.Vertices()]).reshape(-1, 3) / tolerance)
+    vertices = vertices.astype(np.int64)[np.lexsort(vertices.T[::-1])]
+    digest = hashlib.sha256(json.dumps(summary).encode())
+    digest.update(vertices.tobytes())
+    _last_fingerprint = (contents, tolerance, digest.hexdigest())
+    return _last_fingerprint[2]
+
+
+def quality_record(quality: str) -> dict:
+    # The profile's numbers as well as its name, so changing a profile's deflections re-exports what was made with it
+    return {'quality': quality, 'deflection': asdict(QUALITIES[quality])}
+
+
+def sidecar(filename: str, directory: str | None = None) -> str:
+    # Next to the file unless it goes out somewhere the sidecars shouldn't, like the site's served models
+    if directory is None:
+        return f'{filename}.fingerprint'
+    return os.path.join(directory, f'{os.path.basename(filename)}.fingerprint')
+
+
+def previous_export(filename: str, record: dict, sidecar_dir: str | None = None) -> dict | None:
+    # What was saved about filename the last time it was exported, if that was the same geometry with the
+    # same settings and the file hasn't been touched since
+    try:
+        with open(sidecar(filename, sidecar_dir)) as f:
+            previous = json.load(f)
+        size = os.path.getsize(filename)
+    except (OSError, ValueError):
+        return None
+    if previous.get('size') != size or any(previous.get(key) != value for key, value in record.items()):
+        return None
+    return previous
+
+
+def save_export(filename: str, record: dict, report: 'ExportReport', sidecar_dir: str | None = None):
+    if sidecar_dir is not None:
+        os.makedirs(sidecar_dir, exist_ok=True)
+    with open(sidecar(filename, sidecar_dir), 'w') as f:
+        json.dump({**record, 'size': report.size, 'triangles': report.triangles}, f, indent=2)
+
+
+def skipped(filename: str, quality: str, previous: dict, fingerprint_seconds: float) -> 'ExportReport':
+    return ExportReport(filename, quality, previous['triangles'], previous['size'], 0.0, 0.0,
+                        fingerprint_seconds=fingerprint_seconds, skipped=True)
+
+
+def triangle_count(shape: Shape) -> int:
+    count = 0
+    for face in shape.Faces():
+        triangulation = BRep_Tool.Triangulation_s(face.wrapped, TopLoc_Location())
+        if triangulation is not None:
+            count += triangulation.NbTriangles()
+    return count
+
+
+def tessellate(shape: Shape, quality: Quality):
+    # Drop whatever mesh is already on the shape first, OCCT keeps an existing finer mesh around
+    # which would make a preview after an archival export just as heavy
+    BRepTools.Clean_s(shape.wrapped)
+    BRepMesh_IncrementalMesh(shape.wrapped, quality.linear_deflection, False, quality.angular_deflection, True)
+
+
+def export(part: Workplane | Shape, filename: str, quality: str = 'print',
+           max_triangles: int | None = None, fingerprint: bool = True) -> ExportReport:
+    # With fingerprint on, a file exported from the same geometry with the same settings is left as it is,
+    # timestamp and all, so nothing downstream thinks it changed
+    shape = to_shape(part)
+    if not fingerprint:
+        return _export(shape, filename, quality, max_triangles)
+    start = time.perf_counter()
+    record = {'geometry': geometry_fingerprint(shape), **quality_record(quality), 'max_triangles': max_triangles}
+    fingerprint_seconds = time.perf_counter() - start
+    previous = previous_export(filename, record)
+    if previous is not None:
+        return skipped(filename, quality, previous, fingerprint_seconds)
+    report = _export(shape, filename, quality, max_triangles)
+    report.fingerprint_seconds = fingerprint_seconds
+    save_export(filename, record, report)
+    return report
+
+
+def _export(shape: Shape, filename: str, quality: str, max_triangles: int | None) -> ExportReport:
+    profile = QUALITIES[quality]
+    fmt = os.path.splitext(filename)[1][1:].lower()
+    tessellate_seconds = 0.0
+    triangles = 0
+    if fmt in MESHED_FORMATS:
+        start = time.perf_counter()
+        tessellate(shape, profile)
+        tessellate_seconds = time.perf_counter() - start
+        triangles = triangle_count(shape)
+    if fmt == 'ply' or (fmt == 'stl' and max_triangles):
+        return _export_array_mesh(shape, filename, quality, max_triangles, tessellate_seconds)
+    start = time.perf_counter()
+    if fmt == 'stl':
+        # exportStl meshes again with the relative flag on, write the mesh we just made as is
+        writer = StlAPI_Writer()
+        writer.ASCIIMode = False
+        writer.Write(shape.wrapped, filename)
+    else:
+        exporters.export(shape, filename, tolerance=profile.linear_deflection,
+                         angularTolerance=profile.angular_deflection)
+    write_seconds = time.perf_counter() - start
+    return ExportReport(filename, quality, triangles, os.path.getsize(filename), tessellate_seconds, write_seconds)
+
+
+def _export_array_mesh(shape: Shape, filename: str, quality: str, max_triangles: int | None,
+                       tessellate_seconds: float) -> ExportReport:
+    # The mesh as numpy arrays, decimated if asked, written in one go
+    from pipeline.mesh import decimate, triangulated, write_ply, write_stl
+
+    start = time.perf_counter()
+    part_mesh = triangulated(shape)
+    decimate_seconds = 0.0
+    if max_triangles:
+        decimate_start = time.perf_counter()
+        part_mesh = decimate(part_mesh, max_triangles)
+        decimate_seconds = time.perf_counter() - decimate_start
+    write = write_ply if filename.lower().endswith('.ply') else write_stl
+    write(part_mesh, filename)
+    write_seconds = time.perf_counter() - start - decimate_seconds
+    return ExportReport(filename, quality, len(part_mesh.triangles), os.path.getsize(filename), tessellate_seconds,
+                        write_seconds, decimate_seconds)
@@ -0,0 +1,194 @@
+import argparse
+import gzip
+import json
+import math
+import os
+import struct
+import time
+
+import numpy as np
+
+from pipeline.export import (ExportReport, geometry_fingerprint, previous_export, quality_record, save_export,
+                             skipped, tessellate, to_shape)
+from pipeline.mesh import Mesh, decimate, triangulated
+from pipeline.quality import QUALITIES
+
+# Triangle budgets per level of detail, coarsest first. 0 is the full mesh at the export quality
+LODS = [2500, 20000, 0]
+
+# CAD is z up, glTF is y up: a quarter turn about x
+Z_UP_TO_Y_UP = [-math.sqrt(0.5), 0.0, 0.0, math.sqrt(0.5)]
+
+# glTF component types
+SHORT, UNSIGNED_SHORT, UNSIGNED_INT = 5122, 5123, 5125
+
+
+def _y_up(point) -> list[float]:
+    x, y, z = point
+    return [float(x), float(z), float(-y)]
+
+
+def _padded(data: bytes, fill: bytes = b'\0') -> bytes:
+    return data + fill * (-len(data) % 4)
+
+
+def glb(part_mesh: Mesh, name: str) -> bytes:
+    # One node, one mesh, one primitive. Positions are int16 (KHR_mesh_quantization) with the node's scale and
+    # translation turning them back into mm, a quarter of the size of floats for about a micron per 30mm.
+    # No normals, viewers have to flat shade a primitive without them which is what a CAD part should look like.
+    low, high = part_mesh.vertices.min(axis=0), part_mesh.vertices.max(axis=0)
+    scale = max(float((high - low).max()), 1e-9) / 65535
+    center = (low + high) / 2
+    quantized = np.zeros((len(part_mesh.vertices), 4), dtype='<i2')
+    quantized[:, :3] = np.clip(np.round((part_mesh.vertices - center) / scale), -32767, 32767)
+    # every vertex padded to 8 bytes, attributes have to be 4 byte aligned
+    positions = quantized.tobytes()
+    index_type = UNSIGNED_SHORT if len(part_mesh.vertices) < 65536 else UNSIGNED_INT
+    indices = _padded(part_mesh.triangles.astype('<u2' if index_type == UNSIGNED_SHORT else '<u4').tobytes())
+    document = {
+        'asset': {'version': '2.0', 'generator': 'mcweed pipeline.gltf'},
+        'extensionsUsed': ['KHR_mesh_quantization'],
+        'extensionsRequired': ['KHR_mesh_quantization'],
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{
+            'name': name, 'mesh': 0, 'rotation': Z_UP_TO_Y_UP, 'scale': [scale] * 3, 'translation': _y_up(center),
+        }],
+        'meshes': [{'name': name, 'primitives': [{'attributes': {'POSITION': 0}, 'indices': 1, 'material': 0}]}],
+        'materials': [{
+            'name': 'part',
+            'pbrMetallicRoughness': {'baseColorFactor': [0.9, 0.88, 0.84, 1], 'metallicFactor': 0,
+                                     'roughnessFactor': 0.8},
+        }],
+        'accessors': [
+            {'bufferView': 0, 'componentType': SHORT, 'count': len(quantized), 'type': 'VEC3',
+             'min': quantized[:, :3].min(axis=0).tolist(), 'max': quantized[:, :3].max(axis=0).tolist()},
+            {'bufferView': 1, 'componentType': index_type, 'count': part_mesh.triangles.size, 'type': 'SCALAR'},
+        ],
+        'bufferViews': [
+            {'buffer': 0, 'byteOffset': 0, 'byteLength': len(positions), 'byteStride': 8, 'target': 34962},
+            {'buffer': 0, 'byteOffset': len(positions), 'byteLength': part_mesh.triangles.size
+             * (2 if index_type == UNSIGNED_SHORT else 4), 'target': 34963},
+        ],
+        'buffers': [{'byteLength': len(positions) + len(indices)}],
+    }
+    content = _padded(json.dumps(document, separators=(',', ':')).encode(), b' ')
+    binary = positions + indices
+    return b''.join([
+        struct.pack('<III', 0x46546C67, 2, 12 + 8 + len(content) + 8 + len(binary)),
+        struct.pack('<II', len(content), 0x4E4F534A), content,
+        struct.pack('<II', len(binary), 0x004E4942), binary,
+    ])
+
+
+def load_seconds(size: int, bandwidth: float, latency: float) -> float:
+    # bandwidth in Mbit/s, latency in ms
+    return latency / 1000 + size * 8 / (bandwidth * 1e6)
+
+
+def export_lods(name: str, part, out_dir: str, lods: list[int], quality: str = 'print', bandwidth: float = 10,
+                latency: float = 100, sidecar_dir: str | None = None) -> tuple[dict, list[ExportReport]]:
+    # Every level of detail of one part plus its manifest entry. Levels are only rebuilt when the part changed,
+    # the fingerprints that tell go in sidecar_dir so out_dir can be served as it is.
+    shape = to_shape(part)
+    start = time.perf_counter()
+    geometry = geometry_fingerprint(shape)
+    fingerprint_seconds = time.perf_counter() - start
+    full, tessellate_seconds = None, 0.0
+    entry, reports = {'lods': []}, []
+    for i, budget in enumerate(lods):
+        filename = os.path.join(out_dir, f'{name}.lod{i}.glb')
+        record = {'geometry': geometry, **quality_record(quality), 'max_triangles': budget}
+        previous = previous_export(filename, record, sidecar_dir)
+        if previous is not None:
+            report = skipped(filename, quality, previous, fingerprint_seconds)
+            bounds = previous['bounds']
+        else:
+            if full is None:
+                start = time.perf_counter()
+                tessellate(shape, QUALITIES[quality])
+                full = triangulated(shape)
+                tessellate_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            lod = decimate(full, budget) if budget and len(full.triangles) > budget else full
+            decimate_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            with open(filename, 'wb') as f:
+                f.write(glb(lod, name))
+            report = ExportReport(filename, quality, len(lod.triangles), os.path.getsize(filename),
+                                  tessellate_seconds, time.perf_counter() - start, decimate_seconds,
+                                  fingerprint_seconds)
+            # the viewer's y up frame, so the page can place the camera before anything's loaded
+            bounds = [_y_up(full.vertices.min(axis=0)), _y_up(full.vertices.max(axis=0))]
+            bounds = np.sort(np.array(bounds), axis=0).tolist()
+            save_export(filename, {**record, 'bounds': bounds}, report, sidecar_dir)
+        with open(filename, 'rb') as f:
+            compressed = len(gzip.compress(f.read(), 6))
+        entry['bounds'] = bounds
+        reports.append(report)
+        if entry['lods'] and entry['lods'][-1]['triangles'] == report.triangles:
+            # small parts come in under the coarser budgets, no point listing the same mesh twice
+            continue
+        entry['lods'].append({
+            'file': os.path.basename(filename),
+            'triangles': report.triangles,
+            'bytes': report.size,
+            'gzip_bytes': compressed,
+            'load_seconds': round(load_seconds(report.size, bandwidth, latency), 3),
+        })
+    return entry, reports
+
+
+if __name__ == "__main__":
+    from parts.cache import CACHE_DIR
+    from pipeline.registry import PARTS
+
+    parser = argparse.ArgumentParser(
+        usage="Export registered parts as quantized GLBs at several levels of detail plus a manifest, for a viewer "
+              "to load lods[0] first and a finer one when it's wanted. site/www/models is not checked in, the site's "
+              "build (npm run build in site/) runs this before it's deployed, "
+              "e.g. python -m pipeline.gltf core mvp --lod 1000 --lod 10000 --lod 0")
+    parser.add_argument('names', nargs='*', help='Parts to export, defaults to every registered part')
+    parser.add_argument('--out', default='site/www/models', help='Directory for the GLBs and manifest.json')
+    parser.add_argument('--lod', dest='lods', type=int, action='append',
+                        help=f"Triangle budget of a level, coarsest first, 0 is the full mesh. "
+                             f"Can be repeated, defaults to {' '.join(map(str, LODS))}")
+    parser.add_argument('--fingerprints', default=os.path.join(CACHE_DIR, 'gltf'),
+                        help='Directory for the fingerprints that skip unchanged levels, kept out of --out')
+    parser.add_argument('--quality', default='print', choices=QUALITIES, help='Tessellation quality of the full mesh')
+    parser.add_argument('--bandwidth', type=float, default=10, help='Mbit/s the load time estimates assume')
+    parser.add_argument('--latency', type=float, default=100, help='ms of latency the load time estimates assume')
+    args = parser.parse_args()
+
+    names = args.names or list(PARTS)
+    unknown = [name for name in names if name not in PARTS]
+    if unknown:
+        parser.error(f"unknown parts: {', '.join(unknown)} (see `python -m pipeline list`)")
+    os.makedirs(args.out, exist_ok=True)
+    manifest_path = os.path.join(args.out, 'manifest.json')
+    manifest = {'parts': {}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    manifest.update({'bandwidth_mbps': args.bandwidth, 'latency_ms': args.latency})
+
+    for name in names:
+        part = PARTS[name]
+        start = time.perf_counter()
+        built = part.build()
+        print(f'{name}: built in {time.perf_counter() - start:.2f}s')
+        entry, reports = export_lods(part.filename, built, args.out, args.lods or LODS, args.quality,
+                                     args.bandwidth, args.latency, args.fingerprints)
+        manifest['parts'][name] = {'description': part.description, **entry}
+        listed = {lod['file']: lod for lod in entry['lods']}
+        for report in reports:
+            lod = listed.get(os.path.basename(report.filename))
+            print(f'  {report}')
+            if lod is None:
+                print('    same as the level before, left out of the manifest')
+            else:
+                print(f"    {lod['gzip_bytes'] / 1024:.0f}KiB gzipped, "
+                      f"~{lod['load_seconds']:.2f}s at {args.bandwidth:g}Mbit/s")
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f'Wrote {manifest_path}')
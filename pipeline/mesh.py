@@ -0,0 +1,123 @@
+import os
+import tempfile
+from dataclasses import dataclass
+
+import numpy as np
+from cadquery import Shape, Workplane
+from OCP.StlAPI import StlAPI_Writer
+
+from pipeline.export import exact_bounds, tessellate, to_shape
+from pipeline.quality import QUALITIES
+
+
+@dataclass
+class Mesh:
+    vertices: np.ndarray  # (n, 3) float
+    triangles: np.ndarray  # (m, 3) int, counter clockwise seen from outside
+
+    def transformed(self, matrix: np.ndarray) -> 'Mesh':
+        return Mesh(self.vertices @ matrix[:3, :3].T + matrix[:3, 3], self.triangles)
+
+    def areas(self) -> np.ndarray:
+        a, b, c = (self.vertices[self.triangles[:, i]] for i in range(3))
+        return np.linalg.norm(np.cross(b - a, c - a), axis=1) / 2
+
+    def sample(self, spacing: float, seed: int = 0) -> np.ndarray:
+        # Random points spread evenly over the surface, about one per spacing^2
+        areas = self.areas()
+        count = max(1, int(areas.sum() / spacing ** 2))
+        rng = np.random.default_rng(seed)
+        picked = rng.choice(len(self.triangles), size=count, p=areas / areas.sum())
+        u, v = rng.random((2, count))
+        flip = u + v > 1
+        u[flip], v[flip] = 1 - u[flip], 1 - v[flip]
+        a, b, c = (self.vertices[self.triangles[picked, i]] for i in range(3))
+        return a + (b - a) * u[:, None] + (c - a) * v[:, None]
+
+
+# Binary STL record: normal, three corners, attribute bytes. numpy reads and writes a whole file of these at once
+STL_TRIANGLE = np.dtype([('normal', '<f4', 3), ('corners', '<f4', (3, 3)), ('attribute', '<u2')])
+PLY_FACE = np.dtype([('count', 'u1'), ('indices', '<i4', 3)])
+# Corners closer than this in mm are the same vertex, well under any quality's linear deflection
+WELD_TOLERANCE = 1e-4
+
+
+def triangulated(shape: Shape) -> Mesh:
+    # The mesh already on the shape as arrays. OCCT's own STL writer walks the triangulation in C++, reading
+    # its output back is far quicker than pulling every node and triangle through the Python bindings
+    handle, path = tempfile.mkstemp(suffix='.stl')
+    os.close(handle)
+    try:
+        writer = StlAPI_Writer()
+        writer.ASCIIMode = False
+        writer.Write(shape.wrapped, path)
+        corners = np.fromfile(path, dtype=STL_TRIANGLE, offset=84)['corners'].reshape(-1, 3).astype(float)
+    finally:
+        os.remove(path)
+    # STL repeats every corner per triangle and every face has its own copy of the nodes along its edges,
+    # those only agree to float32 rounding
+    points, index = weld(corners, WELD_TOLERANCE)
+    return Mesh(points, index.reshape(-1, 3).astype(np.int32))
+
+
+def weld(points: np.ndarray, tolerance: float) -> tuple[np.ndarray, np.ndarray]:
+    # Merges points in the same tolerance sized grid cell, then does it again on a grid shifted by half a cell
+    # for the pairs a cell wall went between. Returns the kept points and, for every input, its kept point
+    index = np.arange(len(points))
+    for shift in (0, 0.5):
+        keys = np.floor(points / tolerance + shift).astype(np.int64)
+        _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        points, index = points[first], inverse.reshape(-1)[index]
+    return points, index
+
+
+def mesh(part: Workplane | Shape, quality: str = 'print') -> Mesh:
+    shape = to_shape(part)
+    tessellate(shape, QUALITIES[quality])
+    return triangulated(shape)
+
+
+def unflipped(points: np.ndarray, built: Workplane | Shape) -> np.ndarray:
+    # The cores' build() turns them over about their center of mass c. Before the flip a core is centered on the
+    # origin, so after it the middle of the built core's bounding box is M = 2c and a point p lands on R p + M,
+    # R being the half turn about y. R is its own inverse, so the same goes the other way: a point in the built
+    # core was at R p + M before the flip.
+    bb = exact_bounds(to_shape(built))
+    return points * [-1, 1, -1] + [(bb.xmin + bb.xmax) / 2, 0, (bb.zmin + bb.zmax) / 2]
+
+
+def decimate(part_mesh: Mesh, max_triangles: int) -> Mesh:
+    # Quadric decimation down to a triangle budget, for previews and the website more than for printing
+    if len(part_mesh.triangles) <= max_triangles:
+        return part_mesh
+    import open3d as o3d
+
+    full = o3d.geometry.TriangleMesh(o3d.utility.Vector3dVector(part_mesh.vertices),
+                                     o3d.utility.Vector3iVector(part_mesh.triangles))
+    simplified = full.simplify_quadric_decimation(target_number_of_triangles=max_triangles)
+    simplified.remove_unreferenced_vertices()
+    return Mesh(np.asarray(simplified.vertices), np.asarray(simplified.triangles, dtype=np.int32))
+
+
+def write_stl(part_mesh: Mesh, filename: str):
+    a, b, c = (part_mesh.vertices[part_mesh.triangles[:, i]] for i in range(3))
+    normals = np.cross(b - a, c - a)
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    records = np.zeros(len(part_mesh.triangles), STL_TRIANGLE)
+    records['normal'] = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+    records['corners'] = np.stack([a, b, c], axis=1)
+    header = b'mcweed'.ljust(80, b' ') + np.uint32(len(records)).tobytes()
+    with open(filename, 'wb') as f:
+        f.write(header + records.tobytes())
+
+
+def write_ply(part_mesh: Mesh, filename: str):
+    # Indexed, so every vertex is stored once instead of ~6 times like in an STL
+    faces = np.zeros(len(part_mesh.triangles), PLY_FACE)
+    faces['count'] = 3
+    faces['indices'] = part_mesh.triangles
+    header = (f'ply\nformat binary_little_endian 1.0\n'
+              f'element vertex {len(part_mesh.vertices)}\nproperty float x\nproperty float y\nproperty float z\n'
+              f'element face {len(faces)}\nproperty list uchar int vertex_indices\nend_header\n')
+    with open(filename, 'wb') as f:
+        f.write(header.encode() + part_mesh.vertices.astype('<f4').tobytes() + faces.tobytes())
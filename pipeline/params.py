@@ -0,0 +1,9 @@
+import json
+
+
+def parse_value(value: str):
+    # JSON where it parses (numbers, null, lists), the plain string otherwise
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
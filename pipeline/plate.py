@@ -0,0 +1,250 @@
+import argparse
+import math
+import os
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import open3d as o3d
+from cadquery import Assembly, Location, Vector, Workplane
+
+from pipeline.clearance import raycasting_scene
+from pipeline.export import exact_bounds, to_shape
+from pipeline.mesh import mesh
+from pipeline.quality import QUALITIES
+
+
+@dataclass
+class Footprint:
+    # A part's shadow on the bed for every quarter turn that looks different, cells are resolution x resolution
+    # with rows along y. padded is the mask grown by the spacing, that's what has to land on empty bed.
+    name: str
+    rotations: list[int]
+    masks: list[np.ndarray]
+    padded: list[np.ndarray]
+    # corner of cell (0, 0) in the turned part's coordinates, and the bottom of the part
+    corners: list[tuple[float, float]]
+    zmin: float
+    spectra: list[np.ndarray] = field(default_factory=list)
+
+    def area(self) -> int:
+        return int(self.masks[0].sum())
+
+
+def _turn(points: np.ndarray, quarter_turns: int) -> np.ndarray:
+    # rotate xy by 90 degrees quarter_turns times, the same as Location(..., (0, 0, 1), 90 * quarter_turns)
+    x, y = points[..., 0], points[..., 1]
+    for _ in range(quarter_turns % 4):
+        x, y = -y, x
+    return np.stack([x, y, *([points[..., 2]] if points.shape[-1] == 3 else [])], axis=-1)
+
+
+def _grow(mask: np.ndarray, cells: int) -> np.ndarray:
+    # Dilate by a disc of radius cells
+    grown = np.zeros((mask.shape[0] + cells * 2, mask.shape[1] + cells * 2), dtype=bool)
+    rows, columns = mask.shape
+    for dy in range(-cells, cells + 1):
+        for dx in range(-cells, cells + 1):
+            if dx * dx + dy * dy <= cells * cells:
+                grown[cells + dy:cells + dy + rows, cells + dx:cells + dx + columns] |= mask
+    return grown
+
+
+def footprint(name: str, part: Workplane, resolution: float = 1, spacing: float = 2,
+              outline: bool = True) -> Footprint:
+    # outline=False is the bounding box. Otherwise it's rays straight down through a 2x2 grid in every cell,
+    # any hit and the cell's taken, so something lying in the bounding box's corners can be packed into.
+    # Extents come from the exact bounding box, the mesh is only for the rays.
+    bb = exact_bounds(to_shape(part))
+    corners = np.array([[bb.xmin, bb.ymin], [bb.xmax, bb.ymax]])
+    grow = spacing
+    if outline:
+        part_mesh = mesh(part, 'preview')
+        scene = raycasting_scene(part_mesh)
+        # the triangles are up to this far inside curved faces
+        grow += QUALITIES['preview'].linear_deflection
+    result = Footprint(name, [], [], [], [], bb.zmin)
+    for quarter_turns in range(4 if outline else 2):
+        turned = _turn(corners, quarter_turns)
+        low, high = turned.min(axis=0), turned.max(axis=0)
+        columns, rows = np.maximum(1, np.ceil((high - low) / resolution - 1e-9)).astype(int)
+        if outline:
+            sub = (np.arange(2) + 0.5) * resolution / 2
+            ys = low[1] + (np.arange(rows)[:, None] * resolution + sub).ravel()
+            xs = low[0] + (np.arange(columns)[:, None] * resolution + sub).ravel()
+            y, x = np.meshgrid(ys, xs, indexing='ij')
+            # back into the part's own frame
+            xy = _turn(np.stack([x.ravel(), y.ravel()], axis=1), -quarter_turns)
+            rays = np.column_stack([xy, np.full(len(xy), bb.zmax + 1), np.tile([0, 0, -1], (len(xy), 1))])
+            hit = scene.test_occlusions(o3d.core.Tensor(rays, dtype=o3d.core.float32)).numpy()
+            mask = hit.reshape(rows, 2, columns, 2).any(axis=(1, 3))
+        else:
+            mask = np.ones((rows, columns), dtype=bool)
+        if any(mask.shape == seen.shape and (mask == seen).all() for seen in result.masks):
+            continue
+        result.rotations.append(quarter_turns)
+        result.masks.append(mask)
+        result.padded.append(_grow(mask, math.ceil(grow / resolution)))
+        result.corners.append((float(low[0]), float(low[1])))
+    return result
+
+
+@dataclass
+class Placement:
+    name: str
+    # where the corner of the footprint's cell (0, 0) is on the bed, and the turn about z
+    x: float
+    y: float
+    rotation: int
+    location: Location
+
+
+@dataclass
+class Plate:
+    size: tuple[float, float]
+    resolution: float
+    occupied: np.ndarray
+    placements: list[Placement] = field(default_factory=list)
+    # footprints that have already not fit, the plate only ever gets fuller
+    full: set[str] = field(default_factory=set)
+    _spectrum: np.ndarray | None = None
+
+    def fill(self) -> float:
+        return float(self.occupied.mean())
+
+    def spectrum(self) -> np.ndarray:
+        if self._spectrum is None:
+            self._spectrum = np.fft.rfft2(self.occupied)
+        return self._spectrum
+
+    def place(self, part: Footprint) -> tuple[int, int, int] | None:
+        # Lowest row then leftmost column where the padded mask misses everything, over every rotation.
+        # How much of the plate each spot overlaps is a correlation, one FFT for all spots at once.
+        best = None
+        for i, padded in enumerate(part.padded):
+            rows, columns = padded.shape
+            if rows > self.occupied.shape[0] or columns > self.occupied.shape[1]:
+                continue
+            overlap = np.fft.irfft2(self.spectrum() * part.spectra[i], s=self.occupied.shape)
+            free = overlap[:self.occupied.shape[0] - rows + 1, :self.occupied.shape[1] - columns + 1] < 0.5
+            spot = int(np.argmax(free))
+            if not free.flat[spot]:
+                continue
+            row, column = divmod(spot, free.shape[1])
+            if best is None or (row, column) < best[1:]:
+                best = (i, row, column)
+        return best
+
+    def add(self, part: Footprint, i: int, row: int, column: int):
+        grown = (part.padded[i].shape[0] - part.masks[i].shape[0]) // 2
+        rows, columns = part.masks[i].shape
+        row, column = row + grown, column + grown
+        self.occupied[row:row + rows, column:column + columns] |= part.masks[i]
+        self._spectrum = None
+        x, y = column * self.resolution, row * self.resolution
+        corner_x, corner_y = part.corners[i]
+        angle = 90 * part.rotations[i]
+        location = Location(Vector(x - corner_x, y - corner_y, -part.zmin), Vector(0, 0, 1), angle)
+        self.placements.append(Placement(part.name, x, y, angle, location))
+
+    def build(self, parts: dict[str, Workplane]) -> Workplane:
+        # Every copy of a part is the same shape moved, nothing's copied or rebuilt
+        return Workplane().add([
+            shape.moved(placement.location)
+            for placement in self.placements
+            for shape in parts[placement.name].vals()
+        ])
+
+    def assembly(self, parts: dict[str, Workplane], name: str = 'plate') -> Assembly:
+        # Same as build, for formats that store each part once and place it by reference
+        assembly = Assembly(name=name)
+        for i, placement in enumerate(self.placements):
+            assembly.add(parts[placement.name], name=f'{placement.name}_{i}', loc=placement.location)
+        return assembly
+
+    def __str__(self):
+        counts = {}
+        for placement in self.placements:
+            counts[placement.name] = counts.get(placement.name, 0) + 1
+        parts = ', '.join(f'{count}x {name}' for name, count in counts.items())
+        return f'{self.fill() * 100:.0f}% full: {parts}'
+
+
+def pack(parts: dict[str, Workplane], quantities: dict[str, int], bed: tuple[float, float] = (256, 256),
+         spacing: float = 2, resolution: float = 1, outline: bool = True) -> list[Plate]:
+    # Biggest parts first, each onto the first plate it fits on, a new plate when it fits on none
+    shape = (int(bed[1] // resolution), int(bed[0] // resolution))
+    footprints = {name: footprint(name, parts[name], resolution, spacing, outline) for name in quantities}
+    for part in footprints.values():
+        part.spectra = [np.conj(np.fft.rfft2(padded, s=shape)) for padded in part.padded]
+    plates = []
+    for name in sorted(quantities, key=lambda name: -footprints[name].area()):
+        part = footprints[name]
+        for _ in range(quantities[name]):
+            for plate in plates:
+                if name in plate.full:
+                    continue
+                spot = plate.place(part)
+                if spot is not None:
+                    plate.add(part, *spot)
+                    break
+                plate.full.add(name)
+            else:
+                plate = Plate(bed, resolution, np.zeros(shape, dtype=bool))
+                spot = plate.place(part)
+                if spot is None:
+                    raise ValueError(f"{name} doesn't fit on a {bed[0]:g}x{bed[1]:g}mm bed "
+                                     f'with {spacing:g}mm spacing')
+                plate.add(part, *spot)
+                plates.append(plate)
+    return plates
+
+
+def parse_quantity(value: str) -> tuple[str, int]:
+    name, _, count = value.partition('=')
+    try:
+        return name, int(count or 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected name or name=count, got {value!r}')
+
+
+if __name__ == "__main__":
+    from pipeline.assembly import ASSEMBLY_FORMATS, export_assembly
+    from pipeline.export import export
+    from pipeline.registry import PARTS
+
+    parser = argparse.ArgumentParser(
+        usage="Pack registered parts onto as few build plates as fit them and export one file per plate, "
+              "e.g. python -m pipeline.plate core-socket=6 casting-tube=4 wire-sizer=12 --bed 256 256")
+    parser.add_argument('parts', nargs='+', type=parse_quantity, help='Registered part and how many, name=count')
+    parser.add_argument('--bed', type=float, nargs=2, default=[256, 256], metavar=('X', 'Y'),
+                        help='Bed size in mm')
+    parser.add_argument('--spacing', type=float, default=2, help='Least gap between parts in mm')
+    parser.add_argument('--resolution', type=float, default=1, help='Packing grid size in mm')
+    parser.add_argument('--footprint', default='outline', choices=['outline', 'box'],
+                        help="What has to stay clear, the part's shadow on the bed or its bounding box")
+    parser.add_argument('--format', default='stl', choices=['stl', 'ply', 'step', '3mf'], help='Output format')
+    parser.add_argument('--out', default='.', help='Directory to export the plates into')
+    parser.add_argument('--quality', default='print', choices=QUALITIES, help='Tessellation quality for meshes')
+    args = parser.parse_args()
+
+    quantities = {}
+    for name, count in args.parts:
+        if name not in PARTS:
+            parser.error(f'unknown part {name} (see `python -m pipeline list`)')
+        quantities[name] = quantities.get(name, 0) + count
+
+    start = time.perf_counter()
+    built = {name: PARTS[name].build() for name in quantities}
+    print(f'Built {len(built)} parts in {time.perf_counter() - start:.2f}s')
+    start = time.perf_counter()
+    plates = pack(built, quantities, tuple(args.bed), args.spacing, args.resolution, args.footprint == 'outline')
+    print(f'Packed {sum(quantities.values())} parts onto {len(plates)} plates in {time.perf_counter() - start:.2f}s')
+    os.makedirs(args.out, exist_ok=True)
+    for i, plate in enumerate(plates, 1):
+        print(f'plate {i}: {plate}')
+        filename = os.path.join(args.out, f'plate_{i}.{args.format}')
+        if args.format in ASSEMBLY_FORMATS:
+            print(f'  {export_assembly(plate.assembly(built, f"plate_{i}"), filename, args.quality)}')
+        else:
+            print(f'  {export(plate.build(built), filename, args.quality)}')
@@ -0,0 +1,159 @@
+import argparse
+import inspect
+import os
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import wraps
+
+from cadquery import Shape, Workplane
+
+from parts.cache import ROOT
+
+# Bookkeeping calls that would only add noise to the profile
+IGNORED = {'val', 'vals', 'size', 'first', 'last', 'item', 'end', 'all', 'newObject', 'findSolid', 'findFace',
+           'toOCC', 'tag', 'export', 'toSvg', 'exportSvg', 'largestDimension'}
+
+# Frames from these files are plumbing, leave them out of the stacks
+SKIPPED_FILES = {os.path.abspath(__file__), os.path.join(ROOT, 'parts', 'cache.py')}
+
+
+@dataclass
+class Step:
+    operation: str
+    filename: str
+    line: int
+    stack: tuple[str, ...]
+    seconds: float
+    faces: int
+    edges: int
+
+    @property
+    def source(self):
+        return f'{os.path.relpath(self.filename, ROOT)}:{self.line}'
+
+
+class BuildProfiler:
+    # Times every Workplane operation called while active. Operations that Workplane calls internally
+    # (hole() calling cutEach() etc.) are folded into the outer call, so each step is one line of part code.
+    # The build cache is turned off while profiling, a cache hit would hide everything underneath it.
+
+    def __init__(self, use_cache: bool = False):
+        self.use_cache = use_cache
+        self.steps: list[Step] = []
+        self._originals = {}
+        self._depth = 0
+        self._previous_cache_setting = None
+
+    def __enter__(self):
+        for name, fn in list(vars(Workplane).items()):
+            if name.startswith('_') or name in IGNORED or not inspect.isfunction(fn):
+                continue
+            self._originals[name] = fn
+            setattr(Workplane, name, self._wrap(name, fn))
+        if not self.use_cache:
+            self._previous_cache_setting = os.environ.get('MCWEED_NO_CACHE')
+            os.environ['MCWEED_NO_CACHE'] = '1'
+        return self
+
+    def __exit__(self, *exc):
+        for name, fn in self._originals.items():
+            setattr(Workplane, name, fn)
+        self._originals.clear()
+        if not self.use_cache:
+            if self._previous_cache_setting is None:
+                os.environ.pop('MCWEED_NO_CACHE', None)
+            else:
+                os.environ['MCWEED_NO_CACHE'] = self._previous_cache_setting
+
+    def _wrap(self, name, fn):
+        profiler = self
+
+        @wraps(fn)
+        def timed(*args, **kwargs):
+            caller = sys._getframe(1)
+            if profiler._depth or os.path.abspath(caller.f_code.co_filename) in SKIPPED_FILES:
+                return fn(*args, **kwargs)
+            profiler._depth += 1
+            try:
+                start = time.perf_counter()
+                result = fn(*args, **kwargs)
+                seconds = time.perf_counter() - start
+            finally:
+                profiler._depth -= 1
+            faces = edges = 0
+            if isinstance(result, Workplane):
+                for obj in result.objects:
+                    if isinstance(obj, Shape):
+                        faces += len(obj.Faces())
+                        edges += len(obj.Edges())
+            profiler.steps.append(
+                Step(name, caller.f_code.co_filename, caller.f_lineno, call_stack(caller), seconds, faces, edges))
+            return result
+
+        return timed
+
+    def by_source(self) -> list[tuple[str, str, int, float, int, int]]:
+        # (source, operation, calls, total seconds, faces, edges) per line of part code, slowest first
+        totals = defaultdict(lambda: [0, 0.0, 0, 0])
+        for step in self.steps:
+            total = totals[(step.source, step.operation)]
+            total[0] += 1
+            total[1] += step.seconds
+            total[2], total[3] = step.faces, step.edges
+        rows = [(source, operation, *total) for (source, operation), total in totals.items()]
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+    def table(self, top: int | None = None) -> str:
+        rows = self.by_source()[:top]
+        total = sum(step.seconds for step in self.steps)
+        width = max([len(row[0]) for row in rows] + [6])
+        lines = [f"{'source':<{width}}  {'operation':<20}{'calls':>6}{'seconds':>10}{'%':>7}{'faces':>8}{'edges':>8}"]
+        for source, operation, calls, seconds, faces, edges in rows:
+            percent = seconds / total * 100 if total else 0
+            lines.append(f'{source:<{width}}  {operation:<20}{calls:>6}{seconds:>10.3f}{percent:>6.1f}%{faces:>8}{edges:>8}')
+        lines.append(f'{len(self.steps)} operations, {total:.3f}s in total')
+        return '\n'.join(lines)
+
+    def write_flamegraph(self, path: str):
+        # Collapsed stack format (flamegraph.pl, speedscope, inferno), weights are microseconds
+        weights = defaultdict(int)
+        for step in self.steps:
+            weights[';'.join(step.stack + (f'{step.operation} ({step.source})',))] += round(step.seconds * 1e6)
+        with open(path, 'w') as f:
+            for stack, weight in weights.items():
+                f.write(f'{stack} {weight}\n')
+
+
+def call_stack(frame) -> tuple[str, ...]:
+    # Names of the repo functions that led to this call, outermost first
+    names = []
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        # skip <frozen runpy> and friends, abspath would put them under the cwd
+        filename = '' if filename.startswith('<') else os.path.abspath(filename)
+        if filename.startswith(ROOT + os.sep) and filename not in SKIPPED_FILES:
+            names.append(getattr(frame.f_code, 'co_qualname', frame.f_code.co_name))
+        frame = frame.f_back
+    return tuple(reversed(names))
+
+
+if __name__ == "__main__":
+    from pipeline.registry import PARTS
+
+    parser = argparse.ArgumentParser(
+        usage="Build a registered part with every Workplane operation timed, e.g. python -m pipeline.profiler battery-holder")
+    parser.add_argument('name', choices=PARTS, help='Registered part to profile, see `python -m pipeline list`')
+    parser.add_argument('--top', type=int, default=25, help='How many of the slowest lines to show')
+    parser.add_argument('--flamegraph', help='Write collapsed stacks for flamegraph.pl/speedscope to this file')
+    parser.add_argument('--cache', default=False, action='store_true',
+                        help='Leave the build cache on, cached sub parts will show up as free')
+    args = parser.parse_args()
+
+    with BuildProfiler(use_cache=args.cache) as profiler:
+        PARTS[args.name].build()
+    print(profiler.table(args.top))
+    if args.flamegraph:
+        profiler.write_flamegraph(args.flamegraph)
+        print(f'Wrote {args.flamegraph}')
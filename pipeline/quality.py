@@ -0,0 +1,18 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class Quality:
+    name: str
+    # max distance in mm between the surface and its triangles
+    linear_deflection: float
+    # max angle in radians between neighbouring triangles along a curve
+    angular_deflection: float
+
+
+QUALITIES = {
+    # fast and small, good enough to eyeball a sweep or queue a slicer preview
+    'preview': Quality('preview', linear_deflection=0.1, angular_deflection=0.5),
+    'print': Quality('print', linear_deflection=0.01, angular_deflection=0.1),
+    'archival': Quality('archival', linear_deflection=0.005, angular_deflection=0.05),
+}
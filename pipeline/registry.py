@@ -0,0 +1,180 @@
+from dataclasses import dataclass
+from typing import Callable
+
+# Parts that can be exported by name with `python -m pipeline`. Builders import their modules lazily
+# so listing parts (or exporting one of them) never imports or builds anything it doesn't need.
+
+
+@dataclass
+class RegisteredPart:
+    name: str
+    description: str
+    filename: str
+    build: Callable
+    # the same thing as a cadquery Assembly, for formats that can store a part once and place it several times
+    assembly: Callable | None = None
+
+
+PARTS: dict[str, RegisteredPart] = {}
+
+
+def register(name: str, description: str, filename: str | None = None):
+    def decorator(fn):
+        PARTS[name] = RegisteredPart(name, description, filename or name.replace('-', '_'), fn)
+        return fn
+
+    return decorator
+
+
+def register_assembly(name: str):
+    def decorator(fn):
+        PARTS[name].assembly = fn
+        return fn
+
+    return decorator
+
+
+@register('core', 'McWeed ceramic filament printable core from the MVP')
+def core():
+    from parts.mvp.mvp import core
+
+    return core.build()
+
+
+@register('core-socket', 'Vented socket the core sits in', 'socket')
+def core_socket():
+    from parts.mvp.mvp import socket, wall_thickness
+
+    return socket.build(wall_thickness)
+
+
+@register('battery-holder', '21700 battery holder with BMS and thermal cutoff holders')
+def battery_holder():
+    from parts.mvp.mvp import wall_thickness
+    from parts.shared.battery_holder import battery_holder_21700
+
+    return battery_holder_21700().build(wall_thickness)
+
+
+@register('thermal-cutoff-holder', 'Stand alone thermal cutoff holder')
+def thermal_cutoff_holder():
+    from parts.mvp.mvp import wall_thickness
+    from parts.shared.thermal_cutoff import ThermalCutoffHolder, ThermalCutoffSocket
+
+    return ThermalCutoffHolder(ThermalCutoffSocket(15.91), 15.91).build(wall_thickness)
+
+
+@register('mvp-housing', 'Core socket and battery holder')
+def mvp_housing():
+    from parts.mvp.mvp import socket, wall_thickness
+    from parts.mvp.mvp_housing import MVPHousing
+    from parts.shared.battery_holder import battery_holder_21700
+
+    return MVPHousing(core_socket=socket, battery_holder=battery_holder_21700()).build(wall_thickness)
+
+
+@register_assembly('mvp-housing')
+def mvp_housing_assembly():
+    from parts.mvp.mvp import socket, wall_thickness
+    from parts.mvp.mvp_housing import MVPHousing
+    from parts.shared.battery_holder import battery_holder_21700
+
+    return MVPHousing(core_socket=socket, battery_holder=battery_holder_21700()).assembly(wall_thickness)
+
+
+@register('mvp', 'Full MVP, housing plus core')
+def mvp():
+    from parts.mvp.mvp import MVP, core, socket, wall_thickness
+    from parts.mvp.mvp_housing import MVPHousing
+    from parts.shared.battery_holder import battery_holder_21700
+
+    housing = MVPHousing(core_socket=socket, battery_holder=battery_holder_21700())
+    return MVP(core=core, housing=housing, wall_thickness=wall_thickness).build()
+
+
+@register_assembly('mvp')
+def mvp_assembly():
+    from parts.mvp.mvp import MVP, core, socket, wall_thickness
+    from parts.mvp.mvp_housing import MVPHousing
+    from parts.shared.battery_holder import battery_holder_21700
+
+    housing = MVPHousing(core_socket=socket, battery_holder=battery_holder_21700())
+    return MVP(core=core, housing=housing, wall_thickness=wall_thickness).assembly()
+
+
+@register('pressable-core', 'Pressable ceramic core')
+def pressable_core():
+    from core_press.single_manual_core_press import core
+
+    return core.build()
+
+
+@register('press-bottom', 'Bottom half of the single manual core press')
+def press_bottom():
+    from core_press.single_manual_core_press import core, mold_thickness, press_bottom
+
+    return press_bottom(core, mold_thickness)
+
+
+@register('multi-cavity-mold', '16 cavity pressable core mold', 'mold_16_grid')
+def multi_cavity_mold():
+    from core_press.multi_cavity_mold import multi_cavity_mold
+
+    return multi_cavity_mold(16, 'grid').build()
+
+
+@register('multi-cavity-tubes', 'Casting tubes for the 16 cavity mold', 'mold_16_grid_tubes')
+def multi_cavity_tubes():
+    from core_press.multi_cavity_mold import multi_cavity_mold
+
+    return multi_cavity_mold(16, 'grid').casting_tubes()
+
+
+@register_assembly('multi-cavity-tubes')
+def multi_cavity_tubes_assembly():
+    from core_press.multi_cavity_mold import multi_cavity_mold
+
+    return multi_cavity_mold(16, 'grid').tubes_assembly()
+
+
+@register('casting-tube', 'Core casting tube jig', 'tube')
+def casting_tube():
+    from jigs.core_casting_tube import casting_tube
+
+    return casting_tube()
+
+
+@register('mold-ring', 'Single core mold ring', 'single_core_mold_ring')
+def mold_ring():
+    from parts.misc.single_core_mold_ring import mold_ring
+
+    return mold_ring()
+
+
+@register('wire-sizer', '200mm x 1mm (22 AWG) wire sizer')
+def wire_sizer():
+    from wire_sizer.wire_sizer import WireSizer
+
+    return WireSizer(wire_length=200, wire_diameter=1, wall_thickness=2, wiggle=0.1, text_depth=0.65, font='mono',
+                     label='22 AWG').build()
+
+
+@register('socket-fit-coupon', 'Core socket bore at 10 clearances around the nominal one')
+def socket_fit_coupon():
+    from parts.misc.fit_coupon import fit_coupon
+
+    return fit_coupon('socket').build()
+
+
+@register('wire-fit-coupon', 'Wire sizer channel at 10 clearances around the nominal one')
+def wire_fit_coupon():
+    from parts.misc.fit_coupon import fit_coupon
+
+    return fit_coupon('wire').build()
+
+
+@register('battery-fit-coupon', 'Battery holder bore at 10 clearances around the nominal one')
+def battery_fit_coupon():
+    from parts.misc.fit_coupon import fit_coupon
+
+    return fit_coupon('battery').build()
@@ -0,0 +1,404 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import resource
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from pipeline.quality import QUALITIES
+
+FORMATS = {
+    'stl': 'model/stl',
+    'ply': 'application/ply',
+    'step': 'model/step',
+    '3mf': 'model/3mf',
+}
+
+
+# Same as the registered wire-sizer
+WIRE_SIZER = {'wire_length': 200, 'wire_diameter': 1, 'wall_thickness': 2, 'wiggle': 0.1, 'text_depth': 0.65,
+              'font': 'mono', 'label': '22 AWG'}
+
+
+def defaults() -> dict[str, dict]:
+    # What a request can change for each part, anything it leaves out is the MVP's. core takes the dotted
+    # names pipeline.sweep uses, e.g. {"kind": "pressable", "airway.count": 12}
+    from dataclasses import asdict
+
+    from parts.mvp.mvp import socket, wall_thickness
+    from pipeline.sweep import DEFAULTS
+
+    return {
+        'wire-sizer': WIRE_SIZER,
+        'core': DEFAULTS,
+        'core-socket': {**asdict(socket), 'wall_thickness': wall_thickness},
+    }
+
+
+def _wire_sizer(params: dict):
+    from wire_sizer.wire_sizer import WireSizer
+
+    return WireSizer(**{**WIRE_SIZER, **params}).build()
+
+
+def _core(params: dict):
+    from pipeline.sweep import make_core
+
+    return make_core(params).build()
+
+
+def _core_socket(params: dict):
+    from parts.shared.core_socket import CoreSocket
+
+    params = {**defaults()['core-socket'], **params}
+    wall_thickness = params.pop('wall_thickness')
+    return CoreSocket(**params).build(wall_thickness)
+
+
+BUILDERS = {'wire-sizer': _wire_sizer, 'core': _core, 'core-socket': _core_socket}
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _worker(jobs, results, memory_cap_mb: float):
+    # Everything slow to import gets imported before the first job shows up
+    import cadquery  # noqa: F401
+    import pipeline.sweep  # noqa: F401
+    import wire_sizer.wire_sizer  # noqa: F401
+    from pipeline.export import export
+
+    # jobs is this worker's own queue, the service hands a job to a worker only once it's idle
+    pid = os.getpid()
+    results.put(('ready', pid, None))
+    with tempfile.TemporaryDirectory() as out_dir:
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            key, kind, params, fmt, quality = job
+            try:
+                path = os.path.join(out_dir, f'part.{fmt}')
+                # the result cache is in here, not next to a file that's deleted straight after
+                export(BUILDERS[kind](params), path, quality, fingerprint=False)
+                with open(path, 'rb') as f:
+                    data, error = f.read(), None
+                os.remove(path)
+            except Exception as e:
+                data, error = None, f'{type(e).__name__}: {e}'
+            # OCCT never gives memory back, a worker that's gotten too big is replaced by a fresh one. Said
+            # before the result so the service doesn't hand it another job.
+            rss = _peak_rss_mb()
+            if rss > memory_cap_mb:
+                results.put(('recycle', pid, rss))
+            results.put(('done', pid, (key, data, error)))
+            if rss > memory_cap_mb:
+                return
+
+
+class BuildService:
+    # A pool of warm worker processes behind a queue. Identical requests that are already queued or building
+    # share one job, finished parts are kept in memory (up to cache_mb) and parts come from the on disk build
+    # cache inside the workers too.
+
+    def __init__(self, workers: int = 2, memory_cap_mb: float = 2048, cache_mb: float = 256):
+        self.worker_count = workers
+        self.memory_cap_mb = memory_cap_mb
+        self.cache_bytes = cache_mb * 1024 * 1024
+        self._context = multiprocessing.get_context('spawn')
+        self._results = self._context.Queue()
+        self._workers: dict[int, tuple[multiprocessing.Process, multiprocessing.Queue]] = {}
+        # Jobs wait here until a worker is idle, then go to that worker's own queue. Which worker has which key
+        # is known here from the moment it's handed out, a worker that dies can't take its job with it.
+        self._backlog: deque[tuple] = deque()
+        self._building: dict[int, str] = {}  # pid -> key it's been given
+        self._idle: set[int] = set()
+        self._retiring: set[int] = set()
+        self._ready: set[int] = set()
+        self._pending: dict[str, Future] = {}
+        self._cache: OrderedDict[str, bytes] = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        self._running = False
+        self._started = time.time()
+        self._latencies = deque(maxlen=2000)  # (finished at, seconds)
+        self._counts = {'requests': 0, 'cache_hits': 0, 'coalesced': 0, 'built': 0, 'failed': 0, 'queued': 0,
+                        'recycled': 0, 'crashed': 0}
+
+    def start(self, wait: bool = True):
+        self._running = True
+        for _ in range(self.worker_count):
+            self._spawn()
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+        if wait:
+            # every worker has finished importing
+            while self._running and len(self._ready) < self.worker_count:
+                time.sleep(0.1)
+
+    def stop(self):
+        self._running = False
+        # the collector respawns and forgets workers, it has to be done before they're stopped
+        self._collector.join()
+        for _, jobs in self._workers.values():
+            jobs.put(None)
+        for process, _ in self._workers.values():
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    def _spawn(self):
+        jobs = self._context.Queue()
+        process = self._context.Process(target=_worker, args=(jobs, self._results, self.memory_cap_mb), daemon=True)
+        # registered before the collector can see it say it's ready
+        with self._lock:
+            process.start()
+            self._workers[process.pid] = (process, jobs)
+
+    def _dispatch(self):
+        # call with the lock held
+        while self._backlog and self._idle:
+            pid = self._idle.pop()
+            job = self._backlog.popleft()
+            self._building[pid] = job[0]
+            self._workers[pid][1].put(job)
+
+    def submit(self, kind: str, params: dict, fmt: str = 'stl', quality: str = 'print') -> tuple[Future, str]:
+        # returns the future for the file's bytes and how it was served: cache, coalesced or queued
+        if kind not in BUILDERS:
+            raise KeyError(kind)
+        key = hashlib.sha256(json.dumps([kind, params, fmt, quality], sort_keys=True).encode()).hexdigest()
+        with self._lock:
+            self._counts['requests'] += 1
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self._counts['cache_hits'] += 1
+                future = Future()
+                future.set_result(self._cache[key])
+                return future, 'cache'
+            if key in self._pending:
+                self._counts['coalesced'] += 1
+                return self._pending[key], 'coalesced'
+            future = Future()
+            self._pending[key] = future
+            self._counts['queued'] += 1
+            self._backlog.append((key, kind, params, fmt, quality))
+            self._dispatch()
+        return future, 'queued'
+
+    def expire(self, future: Future):
+        # A request gave up waiting. Later identical requests queue a job of their own instead of waiting on
+        # this one, whatever happened to it.
+        with self._lock:
+            for key, pending in list(self._pending.items()):
+                if pending is future:
+                    del self._pending[key]
+
+    def record_latency(self, seconds: float):
+        with self._lock:
+            self._latencies.append((time.time(), seconds))
+
+    def _finish(self, key: str, data: bytes | None, error: str | None):
+        with self._lock:
+            future = self._pending.pop(key, None)
+            if error is None:
+                self._counts['built'] += 1
+                self._cache[key] = data
+                self._cached_bytes += len(data)
+                while self._cached_bytes > self.cache_bytes and self._cache:
+                    _, dropped = self._cache.popitem(last=False)
+                    self._cached_bytes -= len(dropped)
+            else:
+                self._counts['failed'] += 1
+        if future is not None:
+            if error is None:
+                future.set_result(data)
+            else:
+                future.set_exception(RuntimeError(error))
+
+    def _available(self, pid: int):
+        # call with the lock held. A worker that's dead or on its way out doesn't get another job.
+        process, _ = self._workers.get(pid, (None, None))
+        if process is not None and process.is_alive() and pid not in self._retiring:
+            self._idle.add(pid)
+            self._dispatch()
+
+    def _handle(self, kind: str | None, pid: int, payload):
+        if kind == 'ready':
+            with self._lock:
+                self._ready.add(pid)
+                self._available(pid)
+        elif kind == 'done':
+            with self._lock:
+                self._building.pop(pid, None)
+                self._available(pid)
+            self._finish(*payload)
+        elif kind == 'recycle':
+            with self._lock:
+                self._retiring.add(pid)
+                self._counts['recycled'] += 1
+            print(f'worker {pid} hit {payload:.0f}MB, replacing it', flush=True)
+
+    def _collect(self):
+        # One thread reads everything the workers send back and keeps the pool at full strength
+        while self._running:
+            try:
+                self._handle(*self._results.get(timeout=0.5))
+            except queue.Empty:
+                pass
+            dead = [(pid, process) for pid, (process, _) in list(self._workers.items()) if not process.is_alive()]
+            if not dead:
+                continue
+            # whatever the dead workers sent before they went counts, a result can still be queued behind others
+            while True:
+                try:
+                    self._handle(*self._results.get_nowait())
+                except queue.Empty:
+                    break
+            for pid, process in dead:
+                process.join()
+                with self._lock:
+                    del self._workers[pid]
+                    self._ready.discard(pid)
+                    self._idle.discard(pid)
+                    self._retiring.discard(pid)
+                    lost = self._building.pop(pid, None)
+                    if lost is not None:
+                        self._counts['crashed'] += 1
+                if lost is not None:
+                    # killed with a job, most likely by the OOM killer
+                    self._finish(lost, None, f'worker died with exit code {process.exitcode} while building')
+                if self._running:
+                    self._spawn()
+
+    def metrics(self) -> dict:
+        now = time.time()
+        with self._lock:
+            latencies = sorted(seconds for _, seconds in self._latencies)
+            recent = sum(1 for finished, _ in self._latencies if finished > now - 60)
+            counts = dict(self._counts)
+            backlog = len(self._backlog)
+            building = len(self._building)
+            cached = len(self._cache), self._cached_bytes
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else None
+
+        return {
+            **counts,
+            'uptime_seconds': now - self._started,
+            'throughput_per_minute': recent,
+            'queue_depth': backlog,
+            'building': building,
+            'workers': sum(1 for process, _ in list(self._workers.values()) if process.is_alive()),
+            'p50_seconds': percentile(0.5),
+            'p99_seconds': percentile(0.99),
+            'cached_parts': cached[0],
+            'cached_mb': cached[1] / 1024 / 1024,
+        }
+
+
+def handler(service: BuildService, timeout: float):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: bytes, content_type: str, headers: dict | None = None):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            # the site/www front end is served from somewhere else
+            self.send_header('Access-Control-Allow-Origin', '*')
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _json(self, status: int, value):
+            self._send(status, json.dumps(value, indent=2).encode(), 'application/json')
+
+        def do_OPTIONS(self):
+            self.send_response(204)
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+            self.end_headers()
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == '/metrics':
+                self._json(200, service.metrics())
+            elif path == '/parts':
+                self._json(200, defaults())
+            else:
+                self._json(404, {'error': 'try POST /build/<part>, GET /parts or GET /metrics'})
+
+        def do_POST(self):
+            start = time.perf_counter()
+            url = urlparse(self.path)
+            kind = url.path.removeprefix('/build/')
+            if not url.path.startswith('/build/') or kind not in BUILDERS:
+                return self._json(404, {'error': f"unknown part, one of: {', '.join(BUILDERS)}"})
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            fmt, quality = query.get('format', 'stl'), query.get('quality', 'print')
+            if fmt not in FORMATS or quality not in QUALITIES:
+                return self._json(400, {'error': f"format is one of {', '.join(FORMATS)}, "
+                                                 f"quality one of {', '.join(QUALITIES)}"})
+            try:
+                params = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+                if not isinstance(params, dict):
+                    raise ValueError('expected a JSON object')
+            except ValueError as e:
+                return self._json(400, {'error': f'bad parameters: {e}'})
+            future, served = service.submit(kind, params, fmt, quality)
+            try:
+                data = future.result(timeout=timeout)
+            except TimeoutError:
+                service.expire(future)
+                return self._json(504, {'error': f'not built within {timeout:.0f}s, it is still queued or building'})
+            except RuntimeError as e:
+                return self._json(422, {'error': str(e)})
+            service.record_latency(time.perf_counter() - start)
+            self._send(200, data, FORMATS[fmt], {
+                'X-Served-From': served,
+                'Content-Disposition': f'attachment; filename="{kind}.{fmt}"',
+            })
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        usage="Serve part builds over HTTP, e.g. python -m pipeline.service --workers 2 then "
+              "curl -d '{\"wire_length\": 150}' 'localhost:8765/build/wire-sizer?format=stl' -o sizer.stl")
+    parser.add_argument('--host', default='127.0.0.1', help='Interface to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    parser.add_argument('--workers', type=int, default=2, help='Worker processes building parts')
+    parser.add_argument('--memory_cap', type=float, default=2048,
+                        help='MB of peak memory after which a worker is replaced by a fresh one')
+    parser.add_argument('--cache_mb', type=float, default=256, help='MB of finished parts to keep in memory')
+    parser.add_argument('--timeout', type=float, default=600, help='Seconds a request waits for its part')
+    args = parser.parse_args()
+
+    service = BuildService(args.workers, args.memory_cap, args.cache_mb)
+    start = time.perf_counter()
+    service.start()
+    print(f'{args.workers} workers warmed up in {time.perf_counter() - start:.1f}s, '
+          f'serving {", ".join(BUILDERS)} on http://{args.host}:{args.port}', flush=True)
+    server = ThreadingHTTPServer((args.host, args.port), handler(service, args.timeout))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
@@ -0,0 +1,348 @@
+import argparse
+import math
+import time
+
+import numpy as np
+
+from parts.shared.mcweed_ceramic_filament_printable_core import McWeedBowl
+from pipeline.sweep import CORES, DEFAULTS, make_core, parse_grid_arg
+
+# Closed form stand ins for what pipeline.airflow measures on a built core, from nothing but the core's fields.
+# Every airway's horizontal slice is the same ellipse whatever the level: the pressable ones are straight and a
+# printable one is a flat profile swept with a Frenet frame along a helix, which is a screw motion about the core's
+# axis, so each slice is the profile rotated. That makes the open area and the walls plain geometry of n ellipses
+# spread around a circle. Works on numpy arrays, a whole grid of candidates is one call.
+
+# Gauss-Legendre nodes for integrating the airways' angular coverage over their radial extent
+NODES, WEIGHTS = np.polynomial.legendre.leggauss(48)
+
+# the fields the solver searches over, (low, high, rounded to)
+SEARCH = {
+    'airway.count': (3, 24, 1),
+    'airway.inner_diameter': (0.75, 3, 0.05),
+    'airway.turns': (0.05, 1, 0.01),
+    'airway.height': (10, 40, 0.25),
+}
+
+ESTIMATES = ('core_height', 'throat_area', 'outer_wall', 'bowl_wall', 'airway_wall', 'airway_length')
+
+
+def _coverage(r, rc, a, b):
+    # Half the angle of the circle of radius r that's inside an ellipse centered at (rc, 0) with semi axes a (along
+    # x) and b. Solves the ellipse's equation for cos(angle), a > b so the inside is the larger root and above.
+    A = r ** 2 * (1 / a ** 2 - 1 / b ** 2)
+    B = -2 * r * rc / a ** 2
+    C = rc ** 2 / a ** 2 + r ** 2 / b ** 2 - 1
+    u = (-B - np.sqrt(np.maximum(B ** 2 - 4 * A * C, 0))) / (2 * A)
+    return np.arccos(np.clip(u, -1, 1))
+
+
+def _airway_area(r_low, r_high, outer, a, b, count):
+    # Open area of one level between two radii: n copies of an airway's angular coverage, capped where neighbours
+    # overlap
+    r_low, r_high = np.maximum(r_low, outer - 2 * a), np.minimum(r_high, outer)
+    half = np.maximum(r_high - r_low, 0)[..., None] / 2
+    r = (r_low + r_high)[..., None] / 2 + half * NODES
+    coverage = _coverage(r, (outer - a)[..., None], a[..., None], b[..., None])
+    covered = np.minimum(count[..., None] * 2 * coverage, 2 * np.pi)
+    return (half * WEIGHTS * covered * r).sum(axis=-1)
+
+
+def _span(low, high, start, stop):
+    # length and middle of the overlap of two ranges
+    low, high = np.maximum(low, start), np.minimum(high, stop)
+    return np.maximum(high - low, 0), (low + high) / 2
+
+
+def estimate(kind, bowl_height, bowl_inner_diameter, bowl_outer_diameter, inner_diameter, turns, height, count,
+             wire_ring_depth=1.75, cutoff_z=3.25) -> dict[str, np.ndarray]:
+    # Same names as AirflowReport.summary where they mean the same thing. Levels are measured from the bowl's floor
+    # into the airway section (s below), walls in horizontal slices like airflow's.
+    bowl_height, inner_diameter, turns, height, count = np.broadcast_arrays(
+        *(np.asarray(v, dtype=float) for v in (bowl_height, inner_diameter, turns, height, count)))
+    # The core itself with arrays for fields, everything about its shape comes from its own methods
+    core_cls, airway_cls = CORES[kind]
+    core = core_cls(bowl=McWeedBowl(bowl_height, bowl_inner_diameter, bowl_outer_diameter),
+                    airway=airway_cls(inner_diameter=inner_diameter, turns=turns, height=height, count=count),
+                    wire_ring_depth=wire_ring_depth, cutoff_offset=(0, 0, cutoff_z))
+    radius, bowl_radius = bowl_outer_diameter / 2, bowl_inner_diameter / 2
+    # ellipseArc puts the ellipse's start, its outermost point, where the airway's workplane is centered
+    outer, a, b = core.airway.profile(core.bowl)
+    rc = outer - a
+    total = core.height()
+    with np.errstate(divide='ignore'):
+        pitch = np.broadcast_to(core.airway.pitch(), height.shape)
+    ring = core.wire_ring_radius()
+
+    # where the airway tool starts and stops, in z of the unflipped body (centered on 0, bowl at the bottom) and in s
+    floor = bowl_height - total / 2
+    z_low, z_high = core.airway.z_range()
+    low, high = z_low - floor, z_high - floor
+
+    area = _airway_area(0, radius, outer, a, b, count)
+    # What's under the bowl's wall, for the bit of airway running out into the bowl section
+    wall_area = _airway_area(bowl_radius, radius, outer, a, b, count)
+
+    # build() flips the core about its center of mass before cutting the wire rings, so where they land needs that.
+    # Body less the bowl, the airways and the thermal cutoff socket (a cylinder with a dome, flipped about its own
+    # center so the dome faces the bowl), every piece a volume times the middle of its span.
+    pieces = [(radius ** 2 * np.pi * total, 0), (-bowl_radius ** 2 * np.pi * bowl_height, (floor - total / 2) / 2)]
+    length, middle = _span(z_low, z_high, floor, total / 2)
+    pieces.append((-area * length, middle))
+    length, middle = _span(z_low, z_high, -total / 2, floor)
+    pieces.append((-wall_area * length, middle))
+    socket = core.thermal_cutoff()
+    fuse_radius = socket.fuse_radius
+    cylinder, dome = np.pi * fuse_radius ** 2 * (socket.height - fuse_radius), 2 / 3 * np.pi * fuse_radius ** 3
+    socket_center = (cylinder * -fuse_radius / 2 + dome * (socket.height / 2 - fuse_radius * 5 / 8)) / (cylinder + dome)
+    tip = 2 * socket_center - socket.height / 2 + core.cutoff_level()
+    pieces.append((-dome, tip + fuse_radius * 3 / 8))
+    length, middle = _span(tip + fuse_radius, np.inf, -np.inf, total / 2)
+    pieces.append((-np.pi * fuse_radius ** 2 * length, middle))
+    center = sum(volume * z for volume, z in pieces) / sum(volume for volume, _ in pieces)
+    # the middle of each ring in s, the far end and bowl side, off where wire_rings() puts them in the flipped core
+    end_ring, bowl_ring = (2 * center - level - bowl_height / 2 + height / 2 for level in core.wire_ring_levels())
+
+    # Airways that stop short of an end of the section don't go anywhere, unless that end's wire ring runs over them
+    # and out of the section
+    crosses = (ring > outer - 2 * a) & (ring - wire_ring_depth < outer)
+    half = wire_ring_depth / 2
+    bowl_open = (low <= 0) | (crosses & (bowl_ring - half <= 0) & (low <= bowl_ring + half))
+    end_open = (high >= height) | (crosses & (end_ring + half >= height) & (high >= end_ring - half))
+
+    # Thinnest material between neighbours, twice the gap from an ellipse to the line halfway between them.
+    # Negative where they overlap.
+    s, c = np.sin(np.pi / count), np.cos(np.pi / count)
+    k = np.sqrt(a ** 2 * s ** 2 + b ** 2 * c ** 2)
+    gap = 2 * (rc * s - k)
+    # A helix leans the walls over, the thickness square to them is less than across the slice. x, y is the point
+    # that's closest to the neighbour, the wall's normal there is square to the line between them.
+    x, y = rc - a ** 2 * s / k, b ** 2 * c / k
+    r_wall = np.hypot(x, y)
+    along = np.abs(y * s + x * c) / r_wall
+    lean = along * 2 * np.pi * r_wall / np.hypot(np.where(np.isinf(pitch), 1, pitch), 2 * np.pi * r_wall)
+    airway_wall = gap * np.sqrt(1 - np.where(np.isinf(pitch), 0, lean) ** 2)
+
+    # Only airways running out past the bowl's wall have a bowl wall, measured from the bowl's inside corner to the
+    # nearest bit of airway in the section like airflow does. NaN where there isn't one.
+    bowl_wall = np.where(outer > bowl_radius,
+                         np.hypot(np.maximum(outer - 2 * a - bowl_radius, 0), np.maximum(low, 0)), np.nan)
+    return {
+        'core_height': total,
+        'throat_area': np.where(bowl_open & end_open, area, 0),
+        # the wire rings are open too, thin airways have them outside the airways
+        'outer_wall': radius - np.maximum(outer, ring),
+        'bowl_wall': bowl_wall,
+        'airway_wall': airway_wall,
+        # along the middle of an airway through the section, longer airways are more resistance for the same area
+        'airway_length': height * np.sqrt(1 + (2 * np.pi * rc / pitch) ** 2),
+    }
+
+
+def estimate_params(params: dict) -> dict[str, float]:
+    # One core with sweep's dotted names
+    params = {**DEFAULTS, **params}
+    values = estimate(params['kind'], params['bowl.height'], params['bowl.inner_diameter'],
+                      params['bowl.outer_diameter'], params['airway.inner_diameter'], params['airway.turns'],
+                      params['airway.height'], params['airway.count'], params['wire_ring_depth'],
+                      params['cutoff_offset'][2])
+    return {key: None if math.isnan(value) else float(value) for key, value in values.items()}
+
+
+def airway_area(core, z: float, thickness: float = 0.02) -> float:
+    # Exact open area of the airways alone at a level of the core before the flip, off the volume of a thin disc of
+    # the core's circle with every airway cut out of it. The cutoff's socket and the wire rings don't come into it.
+    from cadquery import Workplane
+
+    from parts.shapes.pattern import pattern_cut
+
+    radius = core.bowl.outer_diameter / 2
+    disc = Workplane().cylinder(height=thickness, radius=radius).translate((0, 0, z))
+    left = pattern_cut(disc, core.airway_tool(), core.airway.count).val().Volume() / thickness
+    return math.pi * radius ** 2 - left
+
+
+def measure(params: dict, resolution: float = 0.1) -> dict[str, float]:
+    # The same numbers off a real build. airflow finds the throat and the walls it has, its mesh and pixels read the
+    # area a few percent low so the throat's area is an exact slice through the airways at its level. OCCT's
+    # distance between two neighbouring airway tools is the wall between airways.
+    from parts.shapes.instance import Instance
+    from pipeline.airflow import analyze
+    from pipeline.export import exact_bounds
+    from pipeline.mesh import unflipped
+
+    params = {**DEFAULTS, **params}
+    core = make_core(params)
+    start = time.perf_counter()
+    built = core.build()
+    build_seconds = time.perf_counter() - start
+    report = analyze(core, built, levels=math.ceil(core.airway.height / (resolution * 2)), resolution=resolution)
+    tool = Instance(core.airway_tool())
+    neighbour = tool.rotate((0, 0, 0), (0, 0, 1), core.airway.angle())
+    throat = unflipped(np.array([[0, 0, report.throat_level]]), built)[0, 2]
+    box = exact_bounds(built.val())
+    return {
+        'core_height': box.zlen,
+        'throat_area': airway_area(core, throat),
+        'outer_wall': report.min_outer_wall,
+        'bowl_wall': report.min_bowl_wall,
+        'airway_wall': tool.val().distance(neighbour.val()),
+        'build_seconds': build_seconds,
+        'resolution': resolution,
+    }
+
+
+def sample(bounds: dict, samples: int, rng: np.random.Generator) -> dict[str, np.ndarray]:
+    candidates = {}
+    for key, (low, high, step) in bounds.items():
+        values = rng.uniform(low, high, samples)
+        candidates[key] = np.clip(np.round(np.round(values / step) * step, 6), low, high)
+    return candidates
+
+
+def thinnest_wall(values: dict[str, np.ndarray]) -> np.ndarray:
+    walls = np.minimum(values['outer_wall'], values['airway_wall'])
+    return np.where(np.isnan(values['bowl_wall']), walls, np.minimum(walls, values['bowl_wall']))
+
+
+def score(values: dict[str, np.ndarray], targets: dict[str, float], min_wall: float) -> np.ndarray:
+    # Sum of squared relative misses, inf for anything that breaks a wall or doesn't open at both ends
+    error = sum(((values[key] - target) / target) ** 2 for key, target in targets.items())
+    return np.where((thinnest_wall(values) >= min_wall) & (values['throat_area'] > 0), error, np.inf)
+
+
+def solve(targets: dict[str, float], min_wall: float, base: dict | None = None, bounds: dict | None = None,
+          samples: int = 200000, top: int = 5, seed: int = 0) -> tuple[list[dict], int, float]:
+    # Random search over the bounds then again in a box a tenth the size around the best so far. Candidates that
+    # score the same go to the one with the thickest walls, and ones that only differ in something there's no target
+    # for (turns, when it's just area and height) are listed once.
+    # Returns the best candidates with their estimates, how many were evaluated and how long it took.
+    params = {**DEFAULTS, **(base or {})}
+    bounds = {**SEARCH, **(bounds or {})}
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    pool = {key: np.empty(0) for key in bounds}
+    evaluated = 0
+    for stage in range(2):
+        if stage:
+            best = {key: pool[key][0] for key in bounds}
+            bounds = {key: (max(low, best[key] - (high - low) / 20), min(high, best[key] + (high - low) / 20), step)
+                      for key, (low, high, step) in bounds.items()}
+        candidates = sample(bounds, samples, rng)
+        candidates = {key: np.concatenate([pool[key], candidates[key]]) for key in bounds}
+        fields = {**params, **candidates}
+        values = estimate(params['kind'], fields['bowl.height'], fields['bowl.inner_diameter'],
+                          fields['bowl.outer_diameter'], fields['airway.inner_diameter'], fields['airway.turns'],
+                          fields['airway.height'], fields['airway.count'], fields['wire_ring_depth'],
+                          fields['cutoff_offset'][2])
+        evaluated += samples
+        scores = score(values, targets, min_wall)
+        order = np.lexsort((-thinnest_wall(values), scores))
+        order = order[np.isfinite(scores[order])]
+        if not len(order):
+            return [], evaluated, time.perf_counter() - start
+        # keep a good few, later rounds only ever improve on them
+        pool = {key: candidates[key][order[:top * 20]] for key in bounds}
+    seconds = time.perf_counter() - start
+
+    results, seen = [], set()
+    for i in order:
+        estimates = {name: None if np.isnan(values[name][i]) else float(values[name][i]) for name in ESTIMATES}
+        key = tuple(round(estimates[name], 2) for name in targets)
+        if key in seen:
+            continue
+        seen.add(key)
+        point = {key: float(candidates[key][i]) for key in bounds}
+        point['airway.count'] = int(point['airway.count'])
+        results.append({'params': {**(base or {}), **point}, 'score': float(scores[i]), 'estimate': estimates})
+        if len(results) == top:
+            break
+    return results, evaluated, seconds
+
+
+def _mm(value) -> str:
+    return '-' if value is None else f'{value:.2f}'
+
+
+def compare(estimated: dict, measured: dict) -> str:
+    return '  '.join(f"{key} {_mm(estimated[key])}/{_mm(measured[key])}"
+                     for key in ('core_height', 'throat_area', 'outer_wall', 'bowl_wall', 'airway_wall'))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        usage="Estimate a core's airway area and walls without building it, check the estimates against real builds, "
+              "or search for airway parameters that hit targets and confirm the best few with real builds, "
+              "e.g. python -m pipeline.surrogate solve --throat_area 50 --core_height 32 --min_wall 1")
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in [('estimate', 'Estimate one core'), ('validate', 'Compare estimates with real builds'),
+                            ('solve', 'Search airway parameters for targets')]:
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('--set', dest='params', type=parse_grid_arg, action='append', default=[],
+                             help='Change a core parameter from the MVP defaults, key=value using dotted names')
+    commands.choices['validate'].add_argument('--samples', type=int, default=8,
+                                              help='Random cores from the search bounds to build and compare')
+    commands.choices['validate'].add_argument('--seed', type=int, default=1, help='Random seed for the cores')
+    solver = commands.choices['solve']
+    solver.add_argument('--throat_area', type=float, help='Target area of the narrowest airway level, mm^2')
+    solver.add_argument('--core_height', type=float, help='Target overall core height, mm')
+    solver.add_argument('--airway_length', type=float, help='Target length of an airway through the section, mm')
+    solver.add_argument('--min_wall', type=float, default=1, help='Thinnest wall allowed anywhere around the airways')
+    solver.add_argument('--bound', type=parse_grid_arg, action='append', default=[],
+                        help=f"Search range of a field, key=low,high. Defaults to "
+                             f"{', '.join(f'{k}={lo},{hi}' for k, (lo, hi, _) in SEARCH.items())}")
+    solver.add_argument('--samples', type=int, default=200000, help='Candidates per search round')
+    solver.add_argument('--top', type=int, default=5, help='Best candidates to list')
+    solver.add_argument('--confirm', type=int, default=3, help='How many of the best to build and measure for real')
+    solver.add_argument('--seed', type=int, default=0, help='Random seed for the search')
+    args = parser.parse_args()
+
+    base = {key: values[0] for key, values in args.params}
+    unknown = set(base) - set(DEFAULTS)
+    if unknown:
+        parser.error(f"unknown core parameters: {', '.join(sorted(unknown))}")
+
+    if args.command == 'estimate':
+        for key, value in estimate_params(base).items():
+            print(f'{key:>14}: {_mm(value)}')
+    elif args.command == 'validate':
+        rng = np.random.default_rng(args.seed)
+        bounds = {key: SEARCH[key] for key in SEARCH if key not in base}
+        points = sample(bounds, args.samples, rng)
+        print('estimated/measured, walls in horizontal slices like airflow, airway_wall square to the walls')
+        for i in range(args.samples):
+            params = {**base, **{key: float(points[key][i]) for key in bounds}}
+            if 'airway.count' in bounds:
+                params['airway.count'] = int(params['airway.count'])
+            changed = {k: v for k, v in params.items() if DEFAULTS.get(k) != v}
+            try:
+                measured = measure(params)
+            except Exception as e:
+                print(f'{changed} failed to build: {type(e).__name__}: {e}')
+                continue
+            print(f"{changed} built in {measured['build_seconds']:.2f}s\n  "
+                  f"{compare(estimate_params(params), measured)}")
+    else:
+        targets = {key: getattr(args, key) for key in ('throat_area', 'core_height', 'airway_length')
+                   if getattr(args, key) is not None}
+        if not targets:
+            parser.error('give at least one of --throat_area, --core_height or --airway_length')
+        bounds = {}
+        for key, values in args.bound:
+            if key not in SEARCH or len(values) != 2:
+                parser.error(f"--bound takes one of {', '.join(SEARCH)} and a low,high, not {key}")
+            bounds[key] = (*values, SEARCH[key][2])
+        results, evaluated, seconds = solve(targets, args.min_wall, base, bounds, args.samples, args.top,
+                                            args.seed)
+        print(f'{evaluated} candidates in {seconds:.2f}s ({evaluated / seconds:.0f}/s)')
+        if not results:
+            print(f'Nothing in the bounds opens at both ends with {args.min_wall}mm walls')
+        for i, result in enumerate(results):
+            changed = {k: v for k, v in result['params'].items() if DEFAULTS.get(k) != v}
+            estimated = result['estimate']
+            print(f"#{i} {changed} score {result['score']:.2g}\n  " + '  '.join(
+                f'{key} {_mm(estimated[key])}' for key in ESTIMATES))
+            if i < args.confirm:
+                measured = measure(result['params'])
+                print(f"  built in {measured['build_seconds']:.2f}s, estimated/measured: "
+                      f"{compare(estimated, measured)}")
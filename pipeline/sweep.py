@@ -0,0 +1,224 @@
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, fields
+from functools import lru_cache
+
+from core_press.mcweed_pressable_core import McWeedPressableCore, McWeedPressableCoreAirway
+from parts.shared.mcweed_ceramic_filament_printable_core import McWeedBowl, McWeedCeramicFilamentPrintableCore, \
+    McWeedCoreAirway
+from pipeline.export import export
+from pipeline.params import parse_value
+from pipeline.quality import QUALITIES
+
+CORES = {
+    'printable': (McWeedCeramicFilamentPrintableCore, McWeedCoreAirway),
+    'pressable': (McWeedPressableCore, McWeedPressableCoreAirway),
+}
+
+# Same core as parts/mvp/mvp.py, every variant starts from here
+DEFAULTS = {
+    'kind': 'printable',
+    'bowl.height': 11,
+    'bowl.inner_diameter': 15.5,
+    'bowl.outer_diameter': 18,
+    'airway.inner_diameter': 1.75,
+    'airway.turns': 0.33,
+    'airway.height': 19,
+    'airway.count': 8,
+    'airway.path_tolerance': None,
+    'airway.path_segments_per_turn': 16,
+    'wire_ring_depth': 1.75,
+    'cutoff_offset': (-0.5, 0, 3.25),
+}
+
+
+def make_core(params: dict):
+    params = {**DEFAULTS, **params}
+    unknown = set(params) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown core parameters: {', '.join(sorted(unknown))}")
+    core_cls, airway_cls = CORES[params['kind']]
+
+    def section(prefix):
+        return {key[len(prefix) + 1:]: value for key, value in params.items() if key.startswith(prefix + '.')}
+
+    # the pressable airways are straight, they have no path to approximate
+    airway_fields = {f.name for f in fields(airway_cls)}
+    return core_cls(
+        bowl=McWeedBowl(**section('bowl')),
+        airway=airway_cls(**{key: value for key, value in section('airway').items() if key in airway_fields}),
+        wire_ring_depth=params['wire_ring_depth'],
+        cutoff_offset=tuple(params['cutoff_offset']),
+    )
+
+
+def expand(spec: dict) -> list[dict]:
+    # A spec is a base, a list of variants and/or a grid. Every variant is crossed with every grid point.
+    #   {"base": {"kind": "pressable"}, "grid": {"airway.count": [8, 16], "airway.turns": [0.25, 0.33]}}
+    base = spec.get('base', {})
+    variants = spec.get('variants') or [{}]
+    grid = spec.get('grid', {})
+    keys = list(grid)
+    points = [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+    return [{**base, **variant, **point} for variant in variants for point in points]
+
+
+@lru_cache(maxsize=None)
+def mvp_socket():
+    # Prepared once per worker, every variant gets checked against the same socket
+    from parts.mvp.mvp import socket, wall_thickness
+    from pipeline.clearance import prepare
+
+    return socket, wall_thickness, prepare('socket', socket.build(wall_thickness))
+
+
+def socket_fit(built) -> dict:
+    # Seat the core in the MVP's socket and see if it still goes in
+    from pipeline.clearance import check, prepare, socket_seat
+
+    socket, wall_thickness, socket_body = mvp_socket()
+    report = check(prepare('core', built), socket_body, socket_seat(built, socket, wall_thickness))
+    return {'min_clearance': report.min_clearance, 'interference_volume': report.interference_volume,
+            'fits': report.fits(max_interference=0)}
+
+
+def cutoff_heating(core, built) -> dict:
+    # How warm the thermal cutoff gets with the heater on, on a coarse grid so it's a few seconds a variant
+    from pipeline.thermal import CORE_POWER, core_model, steady_state, transient
+
+    model = core_model(core, built, step=0.3)
+    return {'cutoff_after_60s': transient(model, CORE_POWER, 60).probe[-1],
+            'cutoff_steady': steady_state(model, CORE_POWER).probe[0]}
+
+
+@dataclass
+class VariantOptions:
+    # How every variant in a sweep gets exported and what gets checked before it is
+    fmt: str = 'stl'
+    quality: str = 'print'
+    check_fit: bool = False
+    # thresholds for AirflowReport.passes, variants that miss them aren't exported
+    airflow: dict | None = None
+    thermal: bool = False
+
+
+def build_variant(index: int, params: dict, out_dir: str, options: VariantOptions | None = None) -> dict:
+    # Runs in a worker process, any failure is reported in the manifest instead of killing the sweep.
+    options = options or VariantOptions()
+    record = {'index': index, 'params': {**DEFAULTS, **params}}
+    try:
+        core = make_core(params)
+        start = time.perf_counter()
+        built = core.build()
+        record['build_seconds'] = time.perf_counter() - start
+        record['volume'] = sum(shape.Volume() for shape in built.vals())
+        if options.check_fit:
+            record['socket_fit'] = socket_fit(built)
+        if options.thermal:
+            record['thermal'] = cutoff_heating(core, built)
+        if options.airflow is not None:
+            from pipeline.airflow import analyze
+
+            report = analyze(core, built)
+            record['airflow'] = report.summary()
+            if not report.passes(**options.airflow):
+                record['rejected'] = 'airflow'
+                return record
+        filename = os.path.join(out_dir, f"{record['params']['kind']}_core_{index:03d}.{options.fmt}")
+        report = export(built, filename, options.quality)
+        record['export_seconds'] = report.tessellate_seconds + report.write_seconds
+        record['triangles'] = report.triangles
+        record['file'] = filename
+    except Exception as e:
+        record['error'] = f'{type(e).__name__}: {e}'
+    return record
+
+
+def run_sweep(variants: list[dict], out_dir: str, options: VariantOptions | None = None,
+              workers: int | None = None):
+    # OCCT holds the GIL for the whole boolean so threads are no use, every variant gets a process.
+    # Records are yielded (and appended to manifest.jsonl) as soon as each variant finishes.
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, 'manifest.jsonl')
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool, open(manifest_path, 'w') as manifest:
+        futures = [pool.submit(build_variant, i, params, out_dir, options) for i, params in enumerate(variants)]
+        for future in as_completed(futures):
+            record = future.result()
+            manifest.write(json.dumps(record) + '\n')
+            manifest.flush()
+            yield record
+
+
+def parse_grid_arg(value: str) -> tuple[str, list]:
+    key, _, values = value.partition('=')
+    if not values:
+        raise argparse.ArgumentTypeError(f"Expected key=value[,value...], got {value!r}")
+    return key, [parse_value(v) for v in values.split(',')]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        usage="Build and export a grid of core variants across every cpu, e.g. "
+              "python -m pipeline.sweep --grid airway.count=8,12,16 --grid airway.turns=0.25,0.33")
+    parser.add_argument('spec', nargs='?', help='JSON file with a base, variants and/or grid')
+    parser.add_argument('--grid', type=parse_grid_arg, action='append', default=[],
+                        help='Add a grid axis, key=value[,value...] using dotted names like airway.count')
+    parser.add_argument('--kind', choices=CORES, help='Which core to build, defaults to the spec or printable')
+    parser.add_argument('--out', default='sweep_output', help='Directory for exported variants and the manifest')
+    parser.add_argument('--format', default='stl', choices=['stl', 'step'], help='Export format')
+    parser.add_argument('--quality', default='preview', choices=QUALITIES, help='Tessellation quality for meshes')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes, defaults to every cpu')
+    parser.add_argument('--check_fit', default=False, action='store_true',
+                        help="Check every variant still goes into the MVP's core socket")
+    parser.add_argument('--airflow', default=False, action='store_true',
+                        help='Slice every variant for airway open area and wall thickness, see pipeline.airflow')
+    parser.add_argument('--min_throat_area', type=float, default=0,
+                        help="With --airflow, don't export variants whose narrowest airway level is under this mm^2")
+    parser.add_argument('--min_wall', type=float, default=0,
+                        help="With --airflow, don't export variants with a wall around the airways thinner than this")
+    parser.add_argument('--thermal', default=False, action='store_true',
+                        help='Simulate the heater warming up every variant and record the thermal cutoff temperature')
+    args = parser.parse_args()
+
+    spec = {}
+    if args.spec:
+        with open(args.spec) as f:
+            spec = json.load(f)
+    spec.setdefault('grid', {}).update(dict(args.grid))
+    if args.kind:
+        spec.setdefault('base', {})['kind'] = args.kind
+
+    variants = expand(spec)
+    print(f'Building {len(variants)} variants into {args.out}')
+    start = time.perf_counter()
+    records = []
+    airflow = {'min_throat_area': args.min_throat_area, 'min_wall': args.min_wall} if args.airflow else None
+    options = VariantOptions(fmt=args.format, quality=args.quality, check_fit=args.check_fit, airflow=airflow,
+                             thermal=args.thermal)
+    for record in run_sweep(variants, args.out, options, args.workers):
+        records.append(record)
+        changed = {k: v for k, v in record['params'].items() if DEFAULTS.get(k) != v}
+        if 'error' in record:
+            print(f"[{len(records)}/{len(variants)}] #{record['index']} {changed} failed: {record['error']}")
+        else:
+            fit = ''
+            if 'socket_fit' in record:
+                fit = ' fits' if record['socket_fit']['fits'] else " DOESN'T FIT the socket"
+            if 'airflow' in record:
+                flow = record['airflow']
+                walls = [w for w in (flow['min_outer_wall'], flow['min_bowl_wall']) if w is not None]
+                fit += f" throat {flow['throat_area']:.1f}mm^2"
+                if walls:
+                    fit += f' wall {min(walls):.2f}mm'
+            if 'thermal' in record:
+                fit += f" cutoff {record['thermal']['cutoff_after_60s']:.0f}C after 60s"
+            result = 'rejected' if 'rejected' in record else record['file']
+            print(f"[{len(records)}/{len(variants)}] #{record['index']} {changed} "
+                  f"{record['build_seconds']:.2f}s {record['volume']:.1f}mm^3{fit} -> {result}")
+    with open(os.path.join(args.out, 'manifest.json'), 'w') as f:
+        json.dump(sorted(records, key=lambda r: r['index']), f, indent=2)
+    print(f'Done in {time.perf_counter() - start:.1f}s')
@@ -0,0 +1,371 @@
+import argparse
+import math
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import open3d as o3d
+from cadquery import Shape, Workplane
+
+from pipeline.clearance import fused, raycasting_scene
+from pipeline.export import to_shape
+from pipeline.mesh import mesh, unflipped
+
+
+@dataclass
+class Material:
+    conductivity: float  # W/(m K)
+    density: float  # kg/m^3
+    specific_heat: float  # J/(kg K)
+
+
+# Ballpark numbers, good for comparing placements against each other more than for predicting exact trip times
+MATERIALS = {
+    'ceramic': Material(2.5, 2200, 850),
+    'pla': Material(0.13, 1240, 1800),
+    'nichrome': Material(11.3, 8400, 450),
+    # a metal cased cutoff and its leads
+    'cutoff': Material(15, 6000, 500),
+    # a 21700 averaged over the jelly roll
+    'cell': Material(3, 2700, 1000),
+}
+
+# Default heat going in: the core's heater wire, and a 21700 being worked hard
+CORE_POWER = 15
+CELL_POWER = 2
+
+# neighbour pairs along each axis, the low side and the high side of every face between two voxels
+_FACES = [
+    (tuple(slice(0, -1) if i == axis else slice(None) for i in range(3)),
+     tuple(slice(1, None) if i == axis else slice(None) for i in range(3)))
+    for axis in range(3)
+]
+
+
+@dataclass
+class ThermalModel:
+    # A voxel grid of materials. Air isn't simulated, every face between a voxel and air loses heat to the
+    # ambient through the convection coefficient, which also stands in for air getting pulled through the airways.
+    materials: np.ndarray  # (nx, ny, nz) int8 index into MATERIALS, -1 is air
+    heater: np.ndarray  # bool, where the power goes in
+    probe: np.ndarray  # bool, the thermal cutoff
+    origin: np.ndarray  # center of the first voxel, mm
+    step: float  # mm
+
+    def centers(self) -> np.ndarray:
+        axes = [self.origin[i] + np.arange(n) * self.step for i, n in enumerate(self.materials.shape)]
+        return np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3)
+
+    def fill(self, where: np.ndarray, material: str) -> np.ndarray:
+        # put a material into the air voxels of `where`, returns the voxels it went into
+        where = where.reshape(self.materials.shape) & (self.materials < 0)
+        self.materials[where] = list(MATERIALS).index(material)
+        return where
+
+
+@dataclass
+class ThermalResult:
+    times: list[float]  # s, inf for a steady state
+    probe: list[float]  # mean temperature of the cutoff at each time, C
+    temperature: np.ndarray = field(repr=False)  # the field at the last time, C, air is ambient
+    iterations: int = 0
+    seconds: float = 0.0
+
+    def time_to(self, temperature: float) -> float | None:
+        # first time the cutoff gets to a temperature, i.e. when it trips
+        for t, probe in zip(self.times, self.probe):
+            if probe >= temperature:
+                return t
+        return None
+
+
+def _inside(part: Workplane | Shape, points: np.ndarray, quality: str = 'preview') -> np.ndarray:
+    # Only the points in the part's bounding box get a ray test
+    part_mesh = mesh(fused(part), quality)
+    low, high = part_mesh.vertices.min(axis=0), part_mesh.vertices.max(axis=0)
+    near = np.flatnonzero(((points >= low) & (points <= high)).all(axis=1))
+    result = np.zeros(len(points), bool)
+    if len(near):
+        scene = raycasting_scene(part_mesh)
+        tensor = o3d.core.Tensor(points[near], dtype=o3d.core.float32)
+        result[near] = scene.compute_occupancy(tensor, nsamples=3).numpy() > 0.5
+    return result
+
+
+def voxelize(part: Workplane | Shape, material: str, step: float, quality: str = 'preview') -> ThermalModel:
+    # A layer of air all the way around so every outside face sees air
+    bb = to_shape(part).BoundingBox()
+    low = np.array([bb.xmin, bb.ymin, bb.zmin]) - step / 2
+    counts = np.ceil((np.array([bb.xmax, bb.ymax, bb.zmax]) + step / 2 - low) / step).astype(int) + 1
+    empty = np.zeros(counts, bool)
+    model = ThermalModel(np.full(counts, -1, np.int8), empty, empty.copy(), low, step)
+    model.fill(_inside(part, model.centers(), quality), material)
+    return model
+
+
+def core_model(core, built: Workplane | None = None, step: float = 0.2, quality: str = 'preview') -> ThermalModel:
+    # A printable or pressable core in ceramic, the heater wire filling its ring countersinks and the cutoff
+    # filling its socket. Everything is in the coordinates of the built (flipped) core.
+    built = built if built is not None else core.build()
+    model = voxelize(built, 'ceramic', step, quality)
+    centers = model.centers()
+    rings = np.zeros(len(centers), bool)
+    for ring in core.wire_rings():
+        rings |= _inside(ring, centers, quality)
+    model.heater = model.fill(rings, 'nichrome')
+    # The socket is cut before the core is flipped, so it's tested against where the voxels were before the flip
+    before_flip = unflipped(centers, built)
+    socket = core.cutoff_socket()
+    model.fill(_inside(socket, before_flip, quality), 'cutoff')
+    # the probe is the cutoff's body, not its leads
+    model.probe = _inside(socket.vals()[0], before_flip, quality).reshape(model.materials.shape) \
+        & (model.materials == list(MATERIALS).index('cutoff'))
+    return model
+
+
+def holder_model(holder, wall_thickness: float, built: Workplane | None = None, step: float = 0.3,
+                 quality: str = 'preview') -> ThermalModel:
+    # A BatteryHolder in PLA with a warm cell in it and the cutoff in the hole that touches the cell
+    built = built if built is not None else holder.build(wall_thickness)
+    model = voxelize(built, 'pla', step, quality)
+    centers = model.centers()
+    cell = (np.hypot(centers[:, 0], centers[:, 1]) < holder.battery_diameter / 2) \
+        & (np.abs(centers[:, 2]) < holder.battery_height / 2)
+    model.heater = model.fill(cell, 'cell')
+    model.probe = model.fill(_inside(holder.thermal_cutoff_hole(wall_thickness), centers, quality), 'cutoff')
+    return model
+
+
+def _system(model: ThermalModel, power: float, convection: float):
+    # Finite volumes on the voxel grid in SI units: conductance through every face between two voxels,
+    # convection through every face to air, heat capacity and heat input of every voxel
+    h = model.step / 1000
+    solid = model.materials >= 0
+    table = list(MATERIALS.values())
+    conductivity = np.array([m.conductivity for m in table] + [0], np.float32)[model.materials]
+    capacity = np.array([m.density * m.specific_heat for m in table] + [0], np.float32)[model.materials] * h ** 3
+    faces_to_air = np.zeros(model.materials.shape, np.float32)
+    conductances = []
+    for lo, hi in _FACES:
+        a, b = conductivity[lo], conductivity[hi]
+        # harmonic mean of the two conductivities, zero if either side is air
+        conductances.append(np.where(solid[lo] & solid[hi], 2 * a * b / np.maximum(a + b, 1e-12), 0) * h)
+        faces_to_air[lo] += solid[lo] & ~solid[hi]
+        faces_to_air[hi] += solid[hi] & ~solid[lo]
+    # the outermost layer of the grid is air, so nothing's lost through the grid's own boundary
+    diagonal = faces_to_air * convection * h ** 2
+    for (lo, hi), g in zip(_FACES, conductances):
+        diagonal[lo] += g
+        diagonal[hi] += g
+    # air is pinned to the ambient, a row that's just 1 * x = 0
+    diagonal[~solid] = 1
+    heat = np.zeros(model.materials.shape, np.float32)
+    heat[model.heater] = power / max(model.heater.sum(), 1)
+    return diagonal, [g.astype(np.float32) for g in conductances], capacity, heat
+
+
+def _multiply(x: np.ndarray, diagonal: np.ndarray, conductances: list[np.ndarray]) -> np.ndarray:
+    # The 7 point stencil, applied with whole array slices
+    y = diagonal * x
+    for (lo, hi), g in zip(_FACES, conductances):
+        y[lo] -= g * x[hi]
+        y[hi] -= g * x[lo]
+    return y
+
+
+def _even(array: np.ndarray, shape: tuple, fill: float) -> np.ndarray:
+    pad = [(0, n - m) for n, m in zip(shape, array.shape)]
+    return np.pad(array, pad, constant_values=fill) if any(after for _, after in pad) else array
+
+
+def _block_sum(array: np.ndarray) -> np.ndarray:
+    # sum of every 2x2x2 block, dimensions have to be even. Pairs of slices, a strided reduce is a lot slower
+    array = array[0::2] + array[1::2]
+    array = array[:, 0::2] + array[:, 1::2]
+    return array[:, :, 0::2] + array[:, :, 1::2]
+
+
+def _pair_sum(array: np.ndarray, skip: int) -> np.ndarray:
+    # sum neighbouring pairs along every axis except `skip`
+    for axis in range(3):
+        if axis != skip:
+            array = np.add(*np.split(array.reshape(array.shape[:axis] + (-1, 2) + array.shape[axis + 1:]), 2,
+                                     axis=axis + 1)).squeeze(axis + 1)
+    return array
+
+
+def _coarsen(diagonal: np.ndarray, conductances: list[np.ndarray], solid: np.ndarray):
+    # Merge the solid voxels of every 2x2x2 block into one, A_coarse = P^T A P with P piecewise constant over
+    # the solid part of the block. That's a 7 point stencil again: faces between blocks add up into the
+    # coarse faces, faces inside a block drop out. Air stays out of it, its rows of 1 would swamp everything.
+    shape = tuple(n + n % 2 for n in diagonal.shape)
+    coarse_diagonal = _block_sum(_even(np.where(solid, diagonal, 0), shape, 0))
+    coarse_conductances = []
+    for axis, g in enumerate(conductances):
+        g = _even(g, tuple(n - (i == axis) for i, n in enumerate(shape)), 0)
+        coarse_diagonal -= 2 * _pair_sum(g[_FACES[axis][0][:axis] + (slice(0, None, 2),)], axis)
+        coarse_conductances.append(_pair_sum(g[_FACES[axis][0][:axis] + (slice(1, None, 2),)], axis))
+    coarse_solid = _block_sum(_even(solid, shape, False).astype(np.int8)) > 0
+    coarse_diagonal[~coarse_solid] = 1
+    return coarse_diagonal, coarse_conductances, coarse_solid
+
+
+class _Multigrid:
+    # V-cycle over block merged grids, used as the preconditioner for CG. Damped Jacobi smoothing, the same
+    # number of sweeps before and after, keeps it symmetric. Merged blocks undershoot the correction,
+    # scaling it up makes up for most of that.
+    SWEEPS = 1
+    DAMPING = 0.8
+    OVERCORRECTION = 2.0
+    COARSEST = 4096
+
+    def __init__(self, diagonal: np.ndarray, conductances: list[np.ndarray], solid: np.ndarray):
+        self.levels = [(diagonal, conductances, solid)]
+        while diagonal.size > self.COARSEST and min(diagonal.shape) > 2:
+            diagonal, conductances, solid = _coarsen(diagonal, conductances, solid)
+            self.levels.append((diagonal, conductances, solid))
+
+    def _smooth(self, x, b, diagonal, conductances):
+        return x + self.DAMPING * (b - _multiply(x, diagonal, conductances)) / diagonal
+
+    def __call__(self, b: np.ndarray, level: int = 0) -> np.ndarray:
+        diagonal, conductances, solid = self.levels[level]
+        x = self.DAMPING * b / diagonal
+        if level == len(self.levels) - 1:
+            for _ in range(19):
+                x = self._smooth(x, b, diagonal, conductances)
+            return x
+        for _ in range(self.SWEEPS - 1):
+            x = self._smooth(x, b, diagonal, conductances)
+        residual = np.where(solid, b - _multiply(x, diagonal, conductances), 0)
+        shape = tuple(n + n % 2 for n in b.shape)
+        correction = self(_block_sum(_even(residual, shape, 0)), level + 1)
+        for axis in range(3):
+            correction = np.repeat(correction, 2, axis=axis)
+        x += np.where(solid, self.OVERCORRECTION * correction[:b.shape[0], :b.shape[1], :b.shape[2]], 0)
+        for _ in range(self.SWEEPS):
+            x = self._smooth(x, b, diagonal, conductances)
+        return x
+
+
+def _conjugate_gradient(diagonal, conductances, b, x, tolerance: float, max_iterations: int,
+                        preconditioner=None) -> tuple[np.ndarray, int]:
+    # The system is symmetric positive definite. Preconditioned with multigrid, or just the diagonal.
+    preconditioner = preconditioner or (lambda v: v / diagonal)
+    r = b - _multiply(x, diagonal, conductances)
+    z = preconditioner(r)
+    p = z.copy()
+    rz = float(np.vdot(r, z))
+    limit = tolerance * max(float(np.linalg.norm(b)), 1e-30)
+    for i in range(max_iterations):
+        if np.linalg.norm(r) <= limit:
+            return x, i
+        q = _multiply(p, diagonal, conductances)
+        alpha = rz / float(np.vdot(p, q))
+        x += alpha * p
+        r -= alpha * q
+        z = preconditioner(r)
+        rz, previous = float(np.vdot(r, z)), rz
+        p *= rz / previous
+        p += z
+    return x, max_iterations
+
+
+def steady_state(model: ThermalModel, power: float, ambient: float = 25, convection: float = 15,
+                 tolerance: float = 1e-5, max_iterations: int = 500) -> ThermalResult:
+    # Where everything ends up with `power` watts going into the heater for ever
+    start = time.perf_counter()
+    diagonal, conductances, _, heat = _system(model, power, convection)
+    multigrid = _Multigrid(diagonal, conductances, model.materials >= 0)
+    rise, iterations = _conjugate_gradient(diagonal, conductances, heat, np.zeros_like(heat), tolerance,
+                                           max_iterations, multigrid)
+    probe = float(rise[model.probe].mean()) + ambient
+    return ThermalResult([math.inf], [probe], rise + ambient, iterations, time.perf_counter() - start)
+
+
+def transient(model: ThermalModel, power: float, duration: float, dt: float = 1, ambient: float = 25,
+              convection: float = 15, tolerance: float = 1e-3, max_iterations: int = 200) -> ThermalResult:
+    # Heating up from ambient with `power` watts switched on at t=0. Backward Euler steps, so dt only has to
+    # be small enough for the curve, not for stability, and every step starts its solve from the last one.
+    start = time.perf_counter()
+    diagonal, conductances, capacity, heat = _system(model, power, convection)
+    diagonal = diagonal + capacity / dt
+    multigrid = _Multigrid(diagonal, conductances, model.materials >= 0)
+    rise = previous = np.zeros_like(heat)
+    times, probe = [0.0], [ambient]
+    total = 0
+    for step in range(1, math.ceil(duration / dt) + 1):
+        # starting from where the last two steps were heading saves a good part of the iterations
+        guess = 2 * rise - previous
+        previous = rise
+        rise, iterations = _conjugate_gradient(diagonal, conductances, capacity / dt * rise + heat, guess,
+                                               tolerance, max_iterations, multigrid)
+        total += iterations
+        times.append(step * dt)
+        probe.append(float(rise[model.probe].mean()) + ambient)
+    return ThermalResult(times, probe, rise + ambient, total, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    from dataclasses import replace
+
+    parser = argparse.ArgumentParser(
+        usage="Heat up a core (or the battery holder) and print the temperature at the thermal cutoff over time, "
+              "e.g. python -m pipeline.thermal core --power 15 --cutoff_offset -0.5,0,3.25 --cutoff_offset -0.5,0,5")
+    parser.add_argument('part', choices=['core', 'holder'], help="The MVP's core or its battery holder")
+    parser.add_argument('--power', type=float, help=f'Watts into the heater wire (or the cell), {CORE_POWER} for '
+                                                    f'the core and {CELL_POWER} for the cell by default')
+    parser.add_argument('--duration', type=float, default=120, help='Seconds to simulate')
+    parser.add_argument('--dt', type=float, default=2, help='Seconds per time step')
+    parser.add_argument('--step', type=float, help='Voxel size in mm, 0.2 for the core and 0.3 for the holder')
+    parser.add_argument('--ambient', type=float, default=25, help='Starting and surrounding temperature in C')
+    parser.add_argument('--convection', type=float, default=15, help='Heat transfer coefficient to air, W/(m^2 K)')
+    parser.add_argument('--trip', type=float, help='Cutoff rating in C, prints when each placement would trip')
+    parser.add_argument('--cutoff_offset', action='append', default=[],
+                        type=lambda value: tuple(float(v) for v in value.split(',')),
+                        help='x,y,z of the cutoff in the core, can be repeated to compare placements')
+    parser.add_argument('--steady', default=False, action='store_true', help='Also solve the steady state')
+    args = parser.parse_args()
+
+    if args.part == 'core':
+        from parts.mvp.mvp import core
+
+        cores = [replace(core, cutoff_offset=offset) for offset in args.cutoff_offset] or [core]
+        models = {}
+        for variant in cores:
+            start = time.perf_counter()
+            models[f'cutoff at {variant.cutoff_offset}'] = core_model(variant, step=args.step or 0.2)
+            print(f'cutoff at {variant.cutoff_offset}: built and voxelized in {time.perf_counter() - start:.2f}s')
+        power = args.power or CORE_POWER
+    else:
+        from parts.mvp.mvp import wall_thickness
+        from parts.shared.battery_holder import battery_holder_21700
+
+        start = time.perf_counter()
+        models = {'battery holder': holder_model(battery_holder_21700(), wall_thickness, step=args.step or 0.3)}
+        print(f'battery holder: built and voxelized in {time.perf_counter() - start:.2f}s')
+        power = args.power or CELL_POWER
+
+    results = {}
+    for name, model in models.items():
+        results[name] = transient(model, power, args.duration, args.dt, args.ambient, args.convection)
+        voxels = model.materials.size
+        print(f'{name}: {voxels / 1e6:.2f}M voxels ({(model.materials >= 0).sum() / 1e6:.2f}M solid), '
+              f'{results[name].iterations} iterations in {results[name].seconds:.2f}s')
+        if args.steady:
+            steady = steady_state(model, power, args.ambient, args.convection)
+            print(f'  steady state {steady.probe[0]:.1f}C at the cutoff, {steady.iterations} iterations in '
+                  f'{steady.seconds:.2f}s')
+
+    names = list(results)
+    print(f"{'t s':>6}" + ''.join(f'{i:>10}' for i in range(len(names))))
+    every = max(1, len(results[names[0]].times) // 20)
+    for row, t in enumerate(results[names[0]].times):
+        if row % every == 0 or row == len(results[names[0]].times) - 1:
+            print(f'{t:>6.0f}' + ''.join(f'{results[name].probe[row]:>10.1f}' for name in names))
+    for i, name in enumerate(names):
+        trip = ''
+        if args.trip is not None:
+            tripped = results[name].time_to(args.trip)
+            trip = f', trips at {tripped:.0f}s' if tripped is not None else f", doesn't reach {args.trip:.0f}C"
+        print(f'{i}: {name}{trip}')
@@ -0,0 +1,128 @@
+import argparse
+import importlib
+import os
+import sys
+import time
+import traceback
+
+from parts import cache
+from parts.cache import ROOT
+from pipeline.export import export
+from pipeline.quality import QUALITIES
+from pipeline.registry import PARTS
+
+WATCHED = ['parts', 'core_press', 'jigs', 'wire_sizer']
+
+
+def source_files() -> dict[str, float]:
+    # path -> mtime of every python file we watch
+    found = {}
+    for directory in WATCHED:
+        for dirpath, dirnames, filenames in os.walk(os.path.join(ROOT, directory)):
+            dirnames[:] = [d for d in dirnames if not d.startswith(('.', '__'))]
+            for filename in filenames:
+                if filename.endswith('.py'):
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        found[path] = os.stat(path).st_mtime
+                    except FileNotFoundError:
+                        pass
+    return found
+
+
+def loaded_modules() -> dict[str, str]:
+    # file -> module name of everything from this repo that's been imported so far
+    modules = {}
+    for name, module in list(sys.modules.items()):
+        filename = getattr(module, '__file__', None)
+        if filename and os.path.abspath(filename).startswith(ROOT + os.sep) and name != '__main__':
+            modules[os.path.abspath(filename)] = name
+    return modules
+
+
+def reload_order(changed: set[str], modules: dict[str, str]) -> list[str]:
+    # The changed modules plus everything that imports them, dependencies before the modules using them
+    imports = {path: set(cache.local_imports(path)) & modules.keys() for path in modules}
+    affected = set(changed) & modules.keys()
+    grew = True
+    while grew:
+        dependents = {path for path, uses in imports.items() if uses & affected} - affected
+        affected |= dependents
+        grew = bool(dependents)
+    order = []
+    seen = set()
+
+    def visit(path):
+        if path in seen:
+            return
+        seen.add(path)
+        for dependency in sorted(imports[path] & affected):
+            visit(dependency)
+        order.append(path)
+
+    for path in sorted(affected):
+        visit(path)
+    return [modules[path] for path in order]
+
+
+def rebuild(names: list[str], formats: list[str], out_dir: str, quality: str) -> dict[str, float]:
+    timings = {'build': 0.0, 'export': 0.0}
+    for name in names:
+        part = PARTS[name]
+        start = time.perf_counter()
+        built = part.build()
+        timings['build'] += time.perf_counter() - start
+        start = time.perf_counter()
+        for fmt in formats:
+            export(built, os.path.join(out_dir, f'{part.filename}.{fmt}'), quality)
+        timings['export'] += time.perf_counter() - start
+    return timings
+
+
+def watch(names: list[str], formats: list[str], out_dir: str, quality: str, interval: float):
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+    rebuild(names, formats, out_dir, quality)
+    print(f"Built {', '.join(names)} in {time.perf_counter() - start:.2f}s, watching {', '.join(WATCHED)} for changes")
+    mtimes = source_files()
+    while True:
+        time.sleep(interval)
+        current = source_files()
+        changed = {path for path, mtime in current.items() if mtimes.get(path) != mtime}
+        mtimes = current
+        if not changed:
+            continue
+        saved_at = max(current[path] for path in changed)
+        print(f"{', '.join(os.path.relpath(path, ROOT) for path in sorted(changed))} changed")
+        try:
+            start = time.perf_counter()
+            cache.forget_sources()
+            reloaded = reload_order(changed, loaded_modules())
+            for module in reloaded:
+                importlib.reload(sys.modules[module])
+            reload_seconds = time.perf_counter() - start
+            timings = rebuild(names, formats, out_dir, quality)
+        except Exception:
+            # a half typed edit shouldn't kill the warm process, the next save tries again
+            traceback.print_exc()
+            continue
+        print(f'  updated {time.time() - saved_at:.2f}s after save (reloaded {len(reloaded)} modules in '
+              f"{reload_seconds:.2f}s, build {timings['build']:.2f}s, export {timings['export']:.2f}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        usage="Keep a warm process that reloads edited part modules and re-exports parts on every save, "
+              "e.g. python -m pipeline.watch core-socket --out build")
+    parser.add_argument('names', nargs='+', choices=PARTS, help='Registered parts to rebuild, see `python -m pipeline list`')
+    parser.add_argument('--format', dest='formats', action='append', choices=['stl', 'ply', 'step', '3mf'],
+                        help='Export format, can be repeated, defaults to stl')
+    parser.add_argument('--out', default='.', help='Directory to export into, point a viewer that reloads files at it')
+    parser.add_argument('--quality', default='preview', choices=QUALITIES, help='Tessellation quality for meshes')
+    parser.add_argument('--interval', type=float, default=0.1, help='Seconds between checks for changed files')
+    args = parser.parse_args()
+
+    try:
+        watch(args.names, args.formats or ['stl'], args.out, args.quality, args.interval)
+    except KeyboardInterrupt:
+        pass
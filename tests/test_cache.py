@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip('cadquery')
+
+from dataclasses import replace
+
+from parts import cache
+from parts.mvp.mvp import socket, wall_thickness
+from parts.mvp.mvp_housing import MVPHousing
+from parts.shared.battery_holder import BatteryHolder, battery_holder_21700
+from parts.shared.core_socket import CoreSocket
+
+
+def test_socket_change_rebuilds_only_the_socket(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, 'CACHE_DIR', str(tmp_path))
+    monkeypatch.delenv('MCWEED_NO_CACHE', raising=False)
+    cache.clear_memory()
+    holder = battery_holder_21700()
+    MVPHousing(core_socket=socket, battery_holder=holder).build(wall_thickness)
+
+    # every build that runs stores its result, every one that doesn't was a hit
+    stored, hits = [], []
+    store, load = cache.store, cache.load
+    monkeypatch.setattr(cache, 'store', lambda key, result: (stored.append(key), store(key, result))[1])
+
+    def recording_load(key):
+        result = load(key)
+        if result is not None:
+            hits.append(key)
+        return result
+
+    monkeypatch.setattr(cache, 'load', recording_load)
+    wider = replace(socket, outer_diameter=socket.outer_diameter + 1)
+    MVPHousing(core_socket=wider, battery_holder=holder).build(wall_thickness)
+
+    assert stored == [cache.cache_key(CoreSocket.build.uncached, wider, wall_thickness)]
+    assert hits == [cache.cache_key(BatteryHolder.build.uncached, holder, wall_thickness)]
@@ -0,0 +1,23 @@
+import pytest
+
+pytest.importorskip('cadquery')
+pytest.importorskip('open3d')
+
+from pipeline.surrogate import estimate_params, measure
+
+
+@pytest.mark.parametrize('params', [{}, {'kind': 'pressable'}, {'airway.count': 6, 'airway.inner_diameter': 2}])
+def test_estimate_matches_a_real_build(params):
+    # The surrogate reads everything about the core's shape off the core classes, a change to them that it
+    # doesn't follow shows up here
+    estimated = estimate_params(params)
+    measured = measure(params)
+    assert estimated['core_height'] == pytest.approx(measured['core_height'], abs=1e-3)
+    assert estimated['throat_area'] == pytest.approx(measured['throat_area'], rel=0.03)
+    assert estimated['airway_wall'] == pytest.approx(measured['airway_wall'], abs=0.05)
+    # airflow's walls are off its pixels
+    assert estimated['outer_wall'] == pytest.approx(measured['outer_wall'], abs=2 * measured['resolution'])
+    if estimated['bowl_wall'] is None:
+        assert measured['bowl_wall'] is None
+    else:
+        assert estimated['bowl_wall'] == pytest.approx(measured['bowl_wall'], abs=2 * measured['resolution'])
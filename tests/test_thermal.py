@@ -0,0 +1,29 @@
+import pytest
+
+pytest.importorskip('cadquery')
+pytest.importorskip('open3d')
+
+import numpy as np
+from cadquery import Vector
+
+from parts.mvp.mvp import core
+from pipeline.export import exact_bounds, to_shape
+from pipeline.thermal import core_model
+
+
+def test_probe_is_in_the_cutoff_socket():
+    # The cutoff fills its socket: empty space inside the built core, under the bowl rather than in it
+    built = core.build()
+    model = core_model(core, built, step=0.3)
+    probe = model.centers()[model.probe.ravel()]
+    assert len(probe) > 0
+
+    shape = to_shape(built)
+    bb = exact_bounds(shape)
+    r = np.hypot(probe[:, 0] - (bb.xmin + bb.xmax) / 2, probe[:, 1] - (bb.ymin + bb.ymax) / 2)
+    assert (r < core.bowl.outer_diameter / 2).all()
+    # build() flips the core so the bowl is the top bowl.height of it
+    assert (probe[:, 2] < bb.zmax - core.bowl.height).all()
+    # voxels are filled off the preview mesh, a few right at the socket's wall can go either way
+    in_ceramic = sum(shape.isInside(Vector(*point)) for point in probe)
+    assert in_ceramic <= 0.05 * len(probe)
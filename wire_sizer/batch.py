@@ -0,0 +1,111 @@
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import fields
+from io import BytesIO
+
+from cadquery import Shape, Workplane
+
+from pipeline.export import export
+from pipeline.params import parse_value
+from pipeline.quality import QUALITIES
+from wire_sizer.wire_sizer import WireSizer
+
+SIZER_FIELDS = {f.name for f in fields(WireSizer)}
+
+
+def read_specs(path: str) -> list[dict]:
+    # A JSON list of objects or a CSV with a header row, both using the WireSizer field names.
+    # Anything left out (or left blank in the CSV) falls back to the same defaults as the cli.
+    with open(path, newline='') as f:
+        if path.endswith('.json'):
+            specs = json.load(f)
+        else:
+            specs = [
+                {key: value if key == 'label' else parse_value(value) for key, value in row.items() if value != ''}
+                for row in csv.DictReader(f)
+            ]
+    for spec in specs:
+        unknown = set(spec) - SIZER_FIELDS
+        if unknown:
+            raise ValueError(f"Unknown wire sizer fields: {', '.join(sorted(unknown))}")
+    return specs
+
+
+def build_sizer(spec: dict, out_dir: str, quality: str, keep_shape: bool) -> dict:
+    # Runs in a worker process. The built shape is sent back as BREP when it's needed for a plate.
+    sizer = WireSizer(**spec)
+    start = time.perf_counter()
+    built = sizer.build()
+    record = {'spec': spec, 'build_seconds': time.perf_counter() - start}
+    record['report'] = str(export(built, os.path.join(out_dir, sizer.filename()), quality))
+    if keep_shape:
+        brep = BytesIO()
+        built.val().exportBrep(brep)
+        record['brep'] = brep.getvalue()
+    return record
+
+
+def layout_plates(shapes: list[Shape], plate_width: float, plate_depth: float, spacing: float) -> list[Workplane]:
+    # Sizers are long thin bars, so stack them along Y and start a new column once a column is full
+    # and a new plate once the plate is full. Everything is dropped flat onto z=0.
+    plates = [Workplane()]
+    x = y = column_width = 0
+    for shape in shapes:
+        bb = shape.BoundingBox()
+        if bb.xlen > plate_width or bb.ylen > plate_depth:
+            raise ValueError(f'A {bb.xlen:.1f}x{bb.ylen:.1f}mm sizer does not fit on the plate')
+        if y + bb.ylen > plate_depth:
+            x, y, column_width = x + column_width + spacing, 0, 0
+        if x + bb.xlen > plate_width:
+            plates.append(Workplane())
+            x = y = column_width = 0
+        plates[-1].add(shape.translate((x - bb.xmin, y - bb.ymin, -bb.zmin)))
+        y += bb.ylen + spacing
+        column_width = max(column_width, bb.xlen)
+    return plates
+
+
+def parse_plate_size(value: str) -> tuple[float, float]:
+    width, _, depth = value.partition('x')
+    return float(width), float(depth or width)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        usage="Build a whole family of wire sizers from a CSV or JSON list of specs in one go, "
+              "e.g. python -m wire_sizer.batch sizers.csv --plate")
+    parser.add_argument('specs', help='CSV (with a header) or JSON list of wire sizer specs')
+    parser.add_argument('--out', default='.', help='Directory to export the sizers into')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes, defaults to every cpu')
+    parser.add_argument('--quality', default='print', choices=QUALITIES, help='Tessellation quality of the STLs')
+    parser.add_argument('--plate', default=False, action='store_true',
+                        help='Also lay every sizer out on build plates and export each plate as one STL')
+    parser.add_argument('--plate_size', type=parse_plate_size, default=(256, 256),
+                        help='Build plate size in mm, WIDTHxDEPTH')
+    parser.add_argument('--spacing', type=float, default=3, help='Gap between sizers on a plate')
+    args = parser.parse_args()
+
+    specs = read_specs(args.specs)
+    os.makedirs(args.out, exist_ok=True)
+    start = time.perf_counter()
+    records = [None] * len(specs)
+    with ProcessPoolExecutor(max_workers=args.workers or os.cpu_count()) as pool:
+        futures = {pool.submit(build_sizer, spec, args.out, args.quality, args.plate): i for i, spec in enumerate(specs)}
+        for future in as_completed(futures):
+            record = future.result()
+            records[futures[future]] = record
+            print(f"built in {record['build_seconds']:.2f}s, {record['report']}")
+
+    if args.plate:
+        shapes = [Shape.importBrep(BytesIO(record['brep'])) for record in records]
+        try:
+            plates = layout_plates(shapes, *args.plate_size, args.spacing)
+        except ValueError as e:
+            parser.error(str(e))
+        for i, plate in enumerate(plates):
+            print(export(plate, os.path.join(args.out, f'wire_sizer_plate_{i + 1}.stl'), args.quality))
+    print(f'{len(specs)} sizers in {time.perf_counter() - start:.1f}s')
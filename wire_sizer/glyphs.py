@@ -0,0 +1,97 @@
+from collections import OrderedDict
+from functools import lru_cache
+
+from cadquery import Compound, Location, Plane, Shape, Vector, Workplane
+from OCP.BRepPrimAPI import BRepPrimAPI_MakePrism
+from OCP.Font import Font_FA_Bold, Font_FA_Italic, Font_FA_Regular, Font_FontMgr, Font_TextFormatter
+from OCP.Graphic3d import Graphic3d_HTA_CENTER, Graphic3d_HTA_LEFT, Graphic3d_HTA_RIGHT, Graphic3d_VTA_BOTTOM, \
+    Graphic3d_VTA_CENTER, Graphic3d_VTA_TOP
+from OCP.NCollection import NCollection_Utf8String
+from OCP.StdPrs import StdPrs_BRepFont
+from OCP.TCollection import TCollection_AsciiString
+
+# Same lookups cadquery's Compound.makeText uses, so the glyphs land exactly where text() puts them
+FONT_KINDS = {'regular': Font_FA_Regular, 'bold': Font_FA_Bold, 'italic': Font_FA_Italic}
+HALIGN = {'left': Graphic3d_HTA_LEFT, 'center': Graphic3d_HTA_CENTER, 'right': Graphic3d_HTA_RIGHT}
+VALIGN = {'bottom': Graphic3d_VTA_BOTTOM, 'center': Graphic3d_VTA_CENTER, 'top': Graphic3d_VTA_TOP}
+
+
+@lru_cache(maxsize=16)
+def brep_font(font: str, kind: str, fontsize: float) -> StdPrs_BRepFont:
+    font_t = Font_FontMgr.GetInstance_s().FindFont(TCollection_AsciiString(font), FONT_KINDS[kind])
+    return StdPrs_BRepFont(NCollection_Utf8String(font_t.FontName().ToCString()), FONT_KINDS[kind], float(fontsize))
+
+
+@lru_cache(maxsize=256)
+def layout(txt: str, font: str, kind: str, fontsize: float, halign: str, valign: str) -> tuple:
+    # (char, x, y) of the bottom left of every visible character, straight from OCCT's text formatter
+    brep = brep_font(font, kind, fontsize)
+    formatter = Font_TextFormatter()
+    formatter.SetupAlignment(HALIGN[halign], VALIGN[valign])
+    formatter.Append(NCollection_Utf8String(txt), brep.FTFont())
+    formatter.Format()
+    # the formatter works in the units of the underlying FreeType font, not mm
+    scale = brep.Scale()
+    placed = []
+    for i, char in enumerate(txt):
+        corner = formatter.BottomLeft(i)
+        if not char.isspace():
+            placed.append((char, corner.x() * scale, corner.y() * scale))
+    return tuple(placed)
+
+
+class GlyphCache:
+    # LRU cache of extruded glyph solids, keyed by everything that changes their shape
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._glyphs: OrderedDict[tuple, Shape | None] = OrderedDict()
+
+    def __len__(self):
+        return len(self._glyphs)
+
+    def glyph(self, font: str, kind: str, fontsize: float, depth: float, char: str) -> Shape | None:
+        key = (font, kind, fontsize, depth, char)
+        if key in self._glyphs:
+            self.hits += 1
+            self._glyphs.move_to_end(key)
+            return self._glyphs[key]
+        self.misses += 1
+        outline = brep_font(font, kind, fontsize).RenderGlyph(char)
+        solid = None
+        if not outline.IsNull():
+            outline = Shape.cast(outline)
+            normal = outline.Faces()[0].normalAt() * depth
+            solid = Shape.cast(BRepPrimAPI_MakePrism(outline.wrapped, normal.wrapped).Shape())
+        self._glyphs[key] = solid
+        if len(self._glyphs) > self.maxsize:
+            self._glyphs.popitem(last=False)
+        return solid
+
+    def clear(self):
+        self._glyphs.clear()
+        self.hits = self.misses = 0
+
+
+glyph_cache = GlyphCache()
+
+
+def make_text(txt: str, fontsize: float, distance: float, font: str = 'Arial', kind: str = 'regular',
+              halign: str = 'center', valign: str = 'center', position: Plane = Plane.XY()) -> Shape:
+    # Compound.makeText built out of cached glyphs, every repeat of a glyph is a located copy of the same solid
+    glyphs = []
+    for char, x, y in layout(txt, font, kind, fontsize, halign, valign):
+        solid = glyph_cache.glyph(font, kind, fontsize, distance, char)
+        if solid is not None:
+            glyphs.append(solid.moved(Location(Vector(x, y, 0))))
+    return Compound.makeCompound(glyphs).transformShape(position.rG)
+
+
+def text(workplane: Workplane, txt: str, fontsize: float, distance: float, font: str = 'Arial', kind: str = 'regular',
+         halign: str = 'center', valign: str = 'center', exact: bool = False) -> Workplane:
+    # Drop in for Workplane.text, cutting the text into the solid. exact=True (or flat text) just calls text().
+    if exact or distance == 0:
+        return workplane.text(txt, fontsize, distance, font=font, kind=kind, halign=halign, valign=valign)
+    return workplane.cut(make_text(txt, fontsize, distance, font, kind, halign, valign, workplane.plane))
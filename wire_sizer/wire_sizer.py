@@ -2,7 +2,8 @@ import argparse
 from copy import copy
 from dataclasses import dataclass
 from cadquery import Workplane
-from cadquery.vis import show_object
+
+from wire_sizer.glyphs import text
 
 
 # This function takes a float and returns it as a string. If the number is a whole number, 
@@ -15,12 +16,18 @@ def nice(number: float) -> str:
 class WireSizer:
     wire_length: float
     wire_diameter: float
-    wall_thickness: float
-    wiggle: float
+    wall_thickness: float = 2
+    wiggle: float = 0.1
     # Set text_depth to 0 to turn off text
-    text_depth: float
-    font: str
-    label: str | None
+    text_depth: float = 0.65
+    font: str = 'mono'
+    label: str | None = ''
+    # Use cadquery's own text() for the label instead of cached glyphs
+    exact_text: bool = False
+
+    def filename(self) -> str:
+        label = self.label or ''
+        return f'{label.replace(' ', '_')}{'_' if label else ''}{float(self.wire_length)}mm_{float(self.wire_diameter)}mm_{self.wall_thickness}-wall_{self.wiggle}-wiggle_wire_sizer.stl'
 
     def build(self) -> Workplane:
         outside_width = self.wire_diameter + self.wall_thickness * 2
@@ -31,10 +38,11 @@ class WireSizer:
             .box(self.wire_length+self.wall_thickness, outside_width, outside_height)
             .faces(">Z")
             .workplane(offset=-self.text_depth)
-            .text(f"{self.label} - {nice(self.wire_length)}mm x {nice(self.wire_diameter)}mm",
-                  fontsize=outside_width * 0.9,
-                  kind='bold',
-                  distance=self.text_depth)
+            .invoke(lambda top: text(top, f"{self.label} - {nice(self.wire_length)}mm x {nice(self.wire_diameter)}mm",
+                                     fontsize=outside_width * 0.9,
+                                     kind='bold',
+                                     distance=self.text_depth,
+                                     exact=self.exact_text))
             .cut(
                 Workplane()
                 .box(length=self.wire_length, width=with_wiggle, height=with_wiggle)
@@ -44,6 +52,9 @@ class WireSizer:
 
 
 if __name__ == "__main__":
+    from pipeline.export import export
+    from pipeline.quality import QUALITIES
+
     parser = argparse.ArgumentParser(
         usage="This tool can be used to create a re-usable wire sizer to quickly cut many wires of the same length and diameter. After printing, cover one with with a finger, stick the wire in, cut, and dump the wire out.")
     parser.add_argument("--wall_thickness", type=float, default=2, help="The wall thickness of the sizer")
@@ -53,6 +64,10 @@ if __name__ == "__main__":
     parser.add_argument('--font', type=str, default='mono', help='The font to use for the label')
     parser.add_argument('--label', type=str, default='',
                         help='The label to print on the wire sizer, if not specified it defaults to wire_length x wire_diameter')
+    parser.add_argument('--quality', default='print', choices=QUALITIES,
+                        help='Tessellation quality of the exported STL, preview is much smaller and faster')
+    parser.add_argument('--exact_text', default=False, action='store_true',
+                        help="Build the label with cadquery's text() instead of cached glyphs")
     parser.add_argument('--show_wires', default=False, action='store_true',
                         help='Whether to show the wire sizer wireframe after it is created')
     parser.add_argument("wire_length", type=float, help="The length of the wire to size")
@@ -60,15 +75,14 @@ if __name__ == "__main__":
     args = parser.parse_args()
     sizer_args = copy(vars(args))
     del sizer_args['show_wires']
+    del sizer_args['quality']
 
-    filename = f'{args.label.replace(' ', '_')}{'_' if args.label else ''}{args.wire_length}mm_{args.wire_diameter}mm_{args.wall_thickness}-wall_{args.wiggle}-wiggle_wire_sizer.stl'
     wire_sizer = WireSizer(**sizer_args)
     sizer = wire_sizer.build()
-    sizer.export(filename)
+    print(export(sizer, wire_sizer.filename(), args.quality))
     if args.show_wires:
+        from cadquery.vis import show_object
+
         show_object(sizer.wires())
 
-# sizer(100, 1).export('10cm_wire_sizer.stl')
-# sizer(95, 1).export('95mm_wire_sizer.stl')
-# sizer(100, 2).export('1mm_fiberglass_sleeve_sizer.stl')
-# sizer(140, 3.5).export('2mm_fiberglass_sleeve_sizer.stl')
+# The usual set lives in sizers.csv, see batch.py to build them all at once